@@ -0,0 +1,450 @@
+"""
+Compact binary request log (`.hpb`).
+
+Layout: a file is a sequence of *segments*. Each segment starts with a
+header record and carries its own string dictionaries, so it can be decoded
+on its own. Records are:
+
+- `S` segment header: magic + format version.
+- `D` dictionary entry: kind (ip / endpoint / user agent / method / request
+  id / username), id and UTF-8 bytes. Emitted the first time a string is
+  seen in the segment.
+- `U` username (version 2): a username dictionary id for the next event
+  only (login attempts), so other events stay fixed-width.
+- `E` event: fixed-width (57 bytes) with an epoch-microsecond timestamp,
+  dictionary ids, status, auth flag, sizes and the request id as raw UUID
+  bytes.
+
+Version 1 files (no usernames) read unchanged.
+
+A sidecar `<path>.segments` lists segment start offsets (little-endian
+u64), so a reader can resume at any byte offset by re-reading only the
+dictionary records of the current segment.
+
+A crash can leave a partial record at the end of the file. The writer cuts
+it off before appending again (`repair_tail`); a reader that still meets
+garbage skips to the next segment header instead of giving up.
+
+CLI converter (run from `backend/`):
+
+    python -m app.core.binlog to-binary logs/requests.jsonl logs/requests.hpb
+    python -m app.core.binlog to-jsonl logs/requests.hpb logs/requests.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import uuid
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+BINARY_SUFFIX = ".hpb"
+SEGMENTS_SUFFIX = ".segments"
+
+_MAGIC = b"HPB1"
+_VERSION = 2
+
+# Dictionary kinds.
+_K_IP, _K_ENDPOINT, _K_UA, _K_METHOD, _K_RID, _K_USER = range(6)
+_KINDS = 6
+
+# Request-id encodings (event `flags`).
+_RID_UUID, _RID_DICT, _RID_NONE = 0, 1, 2
+
+_SEG = struct.Struct("<c4sH")
+_DICT = struct.Struct("<cBIH")
+_USER = struct.Struct("<cI")
+# type, ts_us, ip, endpoint, ua, method, status, auth, response_ms, payload, request_id, flags
+_EVENT = struct.Struct("<cqIIIIHbIQ16sB")
+
+_E = ord("E")
+_U = ord("U")
+_SEG_PREFIX = b"S" + _MAGIC
+
+_AUTH_ENC = {None: -1, False: 0, True: 1}
+_AUTH_DEC = {-1: None, 0: False, 1: True}
+
+_MAX_STR = 0xFFFF
+_MAX_U32 = 0xFFFFFFFF
+
+
+def _ts_us(value: Any) -> int:
+    if isinstance(value, (int, float)):
+        return int(value * 1_000_000)
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1_000_000)
+    except Exception:
+        return int(datetime.now(timezone.utc).timestamp() * 1_000_000)
+
+
+def iso_from_us(ts_us: int) -> str:
+    return datetime.fromtimestamp(ts_us / 1_000_000, timezone.utc).isoformat()
+
+
+class BinaryLogEncoder:
+    """
+    Stateful encoder used by `LogWriter` (and the converter).
+
+    Keeps the current segment's dictionaries; starts a new segment every
+    `segment_records` events and whenever the writer (re)opens the file.
+    """
+
+    def __init__(self, segment_records: int = 65536) -> None:
+        self.segment_records = max(1, segment_records)
+        self._dicts: List[Dict[str, int]] = []
+        self._in_segment = 0
+        self._new_segments: List[int] = []
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Start a new segment (fresh dictionaries) with the next event: on a
+        new file, or after a failed write, when ids assigned by the lost
+        output would otherwise be referenced without their D records.
+        """
+        self._dicts = [{} for _ in range(_KINDS)]
+        self._in_segment = -1  # forces a segment header on the next event
+        self._new_segments = []  # starts of segments that never reached disk
+
+    def _intern(self, out: bytearray, kind: int, value: str) -> int:
+        d = self._dicts[kind]
+        sid = d.get(value)
+        if sid is None:
+            sid = len(d)
+            d[value] = sid
+            raw = value.encode("utf-8", "surrogatepass")[:_MAX_STR]
+            out += _DICT.pack(b"D", kind, sid, len(raw))
+            out += raw
+        return sid
+
+    def encode(self, events: Iterable[Dict[str, Any]], start_offset: int) -> bytes:
+        out = bytearray()
+        for e in events:
+            if self._in_segment < 0 or self._in_segment >= self.segment_records:
+                self._dicts = [{} for _ in range(_KINDS)]
+                self._in_segment = 0
+                self._new_segments.append(start_offset + len(out))
+                out += _SEG.pack(b"S", _MAGIC, _VERSION)
+            self._in_segment += 1
+
+            rid = e.get("request_id")
+            flags = _RID_NONE
+            rid_bytes = bytes(16)
+            if rid:
+                try:
+                    rid_bytes = uuid.UUID(str(rid)).bytes
+                    flags = _RID_UUID
+                except ValueError:
+                    rid_bytes = self._intern(out, _K_RID, str(rid)).to_bytes(16, "little")
+                    flags = _RID_DICT
+
+            ip_id = self._intern(out, _K_IP, str(e.get("ip") or "unknown"))
+            ep_id = self._intern(out, _K_ENDPOINT, str(e.get("endpoint") or ""))
+            ua_id = self._intern(out, _K_UA, str(e.get("user_agent") or ""))
+            m_id = self._intern(out, _K_METHOD, str(e.get("method") or ""))
+            username = e.get("username")
+            if username is not None:
+                out += _USER.pack(b"U", self._intern(out, _K_USER, str(username)))
+            out += _EVENT.pack(
+                b"E",
+                _ts_us(e.get("timestamp")),
+                ip_id,
+                ep_id,
+                ua_id,
+                m_id,
+                min(0xFFFF, max(0, int(e.get("status_code") or 0))),
+                _AUTH_ENC.get(e.get("auth_success"), -1),
+                min(_MAX_U32, max(0, int(e.get("response_time_ms") or 0))),
+                max(0, int(e.get("payload_size") or 0)),
+                rid_bytes,
+                flags,
+            )
+        return bytes(out)
+
+    def repair(self, path: str) -> None:
+        """Called before (re)opening `path` for appending: see `repair_tail`."""
+        repair_tail(path)
+
+    def written(self, path: str) -> None:
+        """Called once `encode()` output is on disk: records new segment starts."""
+        if not self._new_segments:
+            return
+        with open(path + SEGMENTS_SUFFIX, "ab") as f:
+            f.write(array("Q", self._new_segments).tobytes())
+        self._new_segments = []
+
+
+def segment_starts(path: str) -> array:
+    starts = array("Q")
+    side = path + SEGMENTS_SUFFIX
+    if os.path.exists(side):
+        with open(side, "rb") as f:
+            raw = f.read()
+        starts.frombytes(raw[: len(raw) - len(raw) % 8])
+    return starts
+
+
+def repair_tail(path: str) -> int:
+    """
+    Truncate `path` after its last complete record (and drop sidecar segment
+    starts beyond that point). Appending after a torn record would make
+    everything written afterwards undecodable. Only the last segment is
+    scanned. Returns the number of bytes cut off.
+    """
+    if not os.path.exists(path):
+        return 0
+    size = os.path.getsize(path)
+    starts = segment_starts(path)
+    pos = 0
+    for s in starts:
+        if s <= size:
+            pos = max(pos, s)
+    good = pos
+    if size:
+        dicts: List[List[str]] = [[] for _ in range(_KINDS)]
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            while pos < size:
+                tag = mm[pos]
+                try:
+                    pos, ok = BinaryLogReader._skip_or_define(mm, pos, size, dicts)
+                except (ValueError, IndexError):
+                    break
+                if not ok:
+                    break
+                if tag != _U:  # a username belongs to the event after it
+                    good = pos
+    if good < size:
+        with open(path, "r+b") as f:
+            f.truncate(good)
+    side = path + SEGMENTS_SUFFIX
+    if os.path.exists(side) and (os.path.getsize(side) % 8 or any(s >= good for s in starts)):
+        with open(side, "wb") as f:
+            f.write(array("Q", [s for s in starts if s < good]).tobytes())
+    return size - good
+
+
+class BinaryLogReader:
+    """
+    Decodes `.hpb` files from any record-aligned byte offset.
+
+    `read_from()` yields `(event, ts_s, end_offset)`. Events use the JSONL
+    schema except `timestamp`, which is left as None: callers that need the
+    ISO string use `iso_from_us(int(ts_s * 1e6))`, everyone else uses
+    `ts_s` and skips timestamp parsing altogether.
+
+    Undecodable bytes (unknown tag, bad header, out-of-range ids) are
+    skipped up to the next segment header; a partial record at the end is
+    left for the next read.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def read_from(self, offset: int = 0, with_timestamps: bool = False) -> Iterator[Tuple[Dict[str, Any], float, int]]:
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        starts = segment_starts(self.path)
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from self.read_buffer(mm, offset, starts, with_timestamps)
+
+    @classmethod
+    def read_buffer(
+        cls,
+        buf: Any,
+        offset: int = 0,
+        segment_starts: Iterable[int] = (),
+        with_timestamps: bool = False,
+    ) -> Iterator[Tuple[Dict[str, Any], float, int]]:
+        """Decode from an in-memory buffer (mmap, or a decompressed sealed segment)."""
+        size = len(buf)
+        dicts: List[List[str]] = [[] for _ in range(_KINDS)]
+        starts = list(segment_starts)
+
+        # Rebuild the dictionaries of the segment containing `offset`.
+        pos = 0
+        for s in starts:
+            if s <= offset:
+                pos = s
+            else:
+                break
+        while pos < offset:
+            try:
+                pos, ok = cls._skip_or_define(buf, pos, size, dicts)
+            except (ValueError, IndexError):
+                pos = cls._resync(buf, pos, starts)
+                ok = pos >= 0
+            if not ok:
+                return
+
+        unpack_event = _EVENT.unpack_from
+        event_size = _EVENT.size
+        ips, endpoints, uas, methods, rids, users = dicts
+        unpack_user = _USER.unpack_from
+        user_size = _USER.size
+        username: Optional[str] = None
+        while pos < size:
+            tag = buf[pos]
+            if tag == _U:
+                if pos + user_size > size:
+                    return
+                try:
+                    username = users[unpack_user(buf, pos)[1]]
+                except IndexError:
+                    pos = cls._resync(buf, pos, starts)
+                    if pos < 0:
+                        return
+                    continue
+                pos += user_size
+            elif tag == _E:
+                if pos + event_size > size:
+                    return  # partially written tail
+                (_, ts_us, ip_id, ep_id, ua_id, m_id, status, auth, rt, payload, rid_b, flags) = unpack_event(buf, pos)
+                try:
+                    if flags == _RID_UUID:
+                        h = rid_b.hex()
+                        rid: Optional[str] = f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+                    elif flags == _RID_DICT:
+                        rid = rids[int.from_bytes(rid_b, "little")]
+                    else:
+                        rid = None
+                    ev = {
+                        "timestamp": iso_from_us(ts_us) if with_timestamps else None,
+                        "ip": ips[ip_id],
+                        "endpoint": endpoints[ep_id],
+                        "method": methods[m_id],
+                        "status_code": status,
+                        "auth_success": _AUTH_DEC.get(auth),
+                        "response_time_ms": rt,
+                        "payload_size": payload,
+                        "user_agent": uas[ua_id],
+                        "request_id": rid,
+                    }
+                except (IndexError, ValueError, OverflowError, OSError):
+                    username = None
+                    pos = cls._resync(buf, pos, starts)
+                    if pos < 0:
+                        return
+                    continue
+                pos += event_size
+                if username is not None:
+                    ev["username"] = username
+                    username = None
+                yield ev, ts_us / 1_000_000, pos
+            else:
+                try:
+                    pos, ok = cls._skip_or_define(buf, pos, size, dicts)
+                except (ValueError, IndexError):
+                    username = None
+                    pos = cls._resync(buf, pos, starts)
+                    ok = pos >= 0
+                if not ok:
+                    return
+
+    @staticmethod
+    def _resync(buf: Any, pos: int, starts: List[int]) -> int:
+        """Offset of the next segment header after `pos`, or -1 if there is none."""
+        for s in starts:
+            if s > pos:
+                return s
+        return buf.find(_SEG_PREFIX, pos + 1)
+
+    @staticmethod
+    def _skip_or_define(mm: Any, pos: int, size: int, dicts: List[List[str]]) -> Tuple[int, bool]:
+        """Consume one non-event record (or skip one event). Returns (new_pos, ok)."""
+        tag = mm[pos : pos + 1]
+        if tag == b"E":
+            if pos + _EVENT.size > size:
+                return pos, False
+            return pos + _EVENT.size, True
+        if tag == b"U":
+            if pos + _USER.size > size:
+                return pos, False
+            return pos + _USER.size, True
+        if tag == b"S":
+            if pos + _SEG.size > size:
+                return pos, False
+            _, magic, _version = _SEG.unpack_from(mm, pos)
+            if magic != _MAGIC:
+                raise ValueError(f"corrupt binary log at offset {pos}")
+            for d in dicts:
+                d.clear()
+            return pos + _SEG.size, True
+        if tag == b"D":
+            if pos + _DICT.size > size:
+                return pos, False
+            _, kind, sid, n = _DICT.unpack_from(mm, pos)
+            end = pos + _DICT.size + n
+            if end > size:
+                return pos, False
+            d = dicts[kind]
+            value = mm[pos + _DICT.size : end].decode("utf-8", "surrogatepass")
+            if sid == len(d):
+                d.append(value)
+            return end, True
+        raise ValueError(f"corrupt binary log at offset {pos}")
+
+
+# -------------------------
+# Converter
+# -------------------------
+
+
+def jsonl_to_binary(src: str, dst: str, batch: int = 4096) -> int:
+    enc = BinaryLogEncoder()
+    n = 0
+    for p in (dst, dst + SEGMENTS_SUFFIX):
+        if os.path.exists(p):
+            os.remove(p)
+    with open(src, "rb") as fin, open(dst, "ab") as fout:
+        pending: List[Dict[str, Any]] = []
+        for line in fin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                pending.append(json.loads(line))
+            except Exception:
+                continue
+            if len(pending) >= batch:
+                fout.write(enc.encode(pending, fout.tell()))
+                n += len(pending)
+                pending = []
+        if pending:
+            fout.write(enc.encode(pending, fout.tell()))
+            n += len(pending)
+    enc.written(dst)
+    return n
+
+
+def binary_to_jsonl(src: str, dst: str) -> int:
+    n = 0
+    with open(dst, "w", encoding="utf-8") as fout:
+        for ev, _ts, _end in BinaryLogReader(src).read_from(0, with_timestamps=True):
+            fout.write(json.dumps(ev, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Convert request logs between JSONL and .hpb")
+    ap.add_argument("direction", choices=("to-binary", "to-jsonl"))
+    ap.add_argument("src")
+    ap.add_argument("dst")
+    args = ap.parse_args()
+    if args.direction == "to-binary":
+        n = jsonl_to_binary(args.src, args.dst)
+    else:
+        n = binary_to_jsonl(args.src, args.dst)
+    print(f"converted {n} events: {args.src} -> {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.core.binlog import BINARY_SUFFIX, BinaryLogReader
+
+# (event, epoch seconds or None when only the ISO timestamp is known, end offset)
+LogRecord = Tuple[Dict[str, Any], Optional[float], int]
+
+
+def iter_jsonl(f: BinaryIO, pos: int) -> Iterator[LogRecord]:
+    """
+    Parse complete JSONL lines from `f`, which is positioned at `pos`.
+
+    A trailing line without a newline is still being written and ends the
+    iteration; undecodable lines are skipped (but their bytes are consumed).
+    """
+    for line in f:
+        if not line.endswith(b"\n"):
+            return
+        pos += len(line)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except Exception:
+            continue
+        yield event, None, pos
+
+
+def read_log(source: Union[str, Any], offset: int = 0) -> Iterator[LogRecord]:
+    """
+    Records from `offset` onwards, for any request-log source:
+    a JSONL path, a binary `.hpb` path or a `SegmentedLog`.
+    """
+    if not isinstance(source, str):
+        yield from source.read_from(offset)
+        return
+    if not os.path.exists(source):
+        return
+    if source.endswith(BINARY_SUFFIX):
+        yield from BinaryLogReader(source).read_from(offset)
+        return
+    with open(source, "rb") as f:
+        f.seek(offset)
+        yield from iter_jsonl(f, offset)
+
+
+def read_batch(source: Union[str, Any], offset: int, max_events: int) -> List[LogRecord]:
+    """At most `max_events` records from `offset` (meant to run in a worker thread)."""
+    out: List[LogRecord] = []
+    if max_events <= 0:
+        return out
+    for rec in read_log(source, offset):
+        out.append(rec)
+        if len(out) >= max_events:
+            break
+    return out
+
+
+def log_end_offset(source: Union[str, Any]) -> int:
+    if not isinstance(source, str):
+        return source.end_offset
+    return os.path.getsize(source) if os.path.exists(source) else 0
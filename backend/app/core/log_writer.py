@@ -3,20 +3,44 @@ from __future__ import annotations
 import asyncio
 import json
 import os
+import time
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.metrics import REGISTRY
+
+# Called after every flushed batch with (events, start_offset, end_offset),
+# where offsets are byte positions in the log file.
+FlushListener = Callable[[List[Dict[str, Any]], int, int], None]
+
+
+_WRITE_SECONDS = REGISTRY.histogram("honeypot_log_write_seconds", "Time to write (and fsync) one log batch.")
+_BATCH_EVENTS = REGISTRY.histogram(
+    "honeypot_log_batch_events", "Events per flushed log batch.", buckets=(1, 4, 16, 64, 128, 256, 512, 1024)
+)
+_WRITE_ERRORS = REGISTRY.counter("honeypot_log_write_errors_total", "Log batches that failed to write.")
 
 
 def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+def _ts_us(value: Any) -> Optional[int]:
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp() * 1_000_000)
+    except Exception:
+        return None
+
+
 async def append_jsonl(path: str, event: Dict[str, Any]) -> None:
     """
     Append one JSON object as one line.
 
     - Windows-friendly (plain file append).
     - Async-friendly (write happens in a thread).
+
+    Kept for one-off writers (scripts, self-tests). The request path uses
+    `LogWriter`, which batches writes through a single open handle.
     """
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
@@ -32,3 +56,296 @@ async def append_jsonl(path: str, event: Dict[str, Any]) -> None:
 
     await asyncio.to_thread(_write)
 
+
+class JsonlEncoder:
+    """Default on-disk format: one JSON object per line."""
+
+    def reset(self) -> None:
+        pass
+
+    def repair(self, path: str) -> None:
+        """Cut a torn last line so the next batch does not get glued onto it."""
+        if not os.path.exists(path):
+            return
+        with open(path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(pos, 64 * 1024)
+                f.seek(pos - step)
+                i = f.read(step).rfind(b"\n")
+                if i >= 0:
+                    pos = pos - step + i + 1
+                    break
+                pos -= step
+            if pos < end:
+                f.truncate(pos)
+
+    def encode(self, events: List[Dict[str, Any]], start_offset: int) -> bytes:
+        return "".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in events).encode("utf-8")
+
+    def written(self, path: str) -> None:
+        pass
+
+
+# fsync policies:
+# - "never":    leave durability to the OS page cache (fastest).
+# - "batch":    fsync once after every flushed batch.
+# - "interval": fsync at most once every `fsync_interval_s` seconds.
+FSYNC_POLICIES = ("never", "batch", "interval")
+
+
+class LogWriter:
+    """
+    Long-lived, batched JSONL writer.
+
+    - Owns one open append handle for the lifetime of the app.
+    - Events go through a bounded in-memory queue (backpressure when full).
+    - A single background task flushes batches by size or by time.
+    - Each batch is written with one `asyncio.to_thread` call, not one per event.
+    - `stop()` drains everything still queued before closing the file.
+    - Listeners see each batch after it hit the file, with its byte range,
+      so consumers can track a durable position in the log.
+    - The on-disk format is pluggable (`JsonlEncoder` by default, or
+      `app.core.binlog.BinaryLogEncoder`).
+    - With a `store` (`app.core.segment_store.SegmentedLog`) batches go to
+      rotated segments instead of `path`; offsets stay global.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval_s: float = 0.05,
+        fsync: str = "never",
+        fsync_interval_s: float = 1.0,
+        encoder: Optional[Any] = None,
+        store: Optional[Any] = None,
+    ) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.fsync = fsync
+        self.fsync_interval_s = fsync_interval_s
+        self.encoder = encoder if encoder is not None else JsonlEncoder()
+        self.store = store
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fh = None
+        self._last_fsync: float = 0.0
+        self._listeners: List[FlushListener] = []
+
+        # Stats (read via `stats()`).
+        self._events_written: int = 0
+        self._batches: int = 0
+        self._last_batch_size: int = 0
+        self._max_batch_size: int = 0
+        self._write_errors: int = 0
+        self._listener_errors: int = 0
+        self._last_flush_ms: float = 0.0
+        self._max_flush_ms: float = 0.0
+        self._total_flush_ms: float = 0.0
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        if self.store is not None:
+            await asyncio.to_thread(self.store.open)
+        else:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # A crash may have left a partial record at the end of the file.
+            await asyncio.to_thread(self.encoder.repair, self.path)
+            self._fh = open(self.path, "ab")
+        self.encoder.reset()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name="log-writer")
+
+    async def drain(self) -> None:
+        """Wait until everything queued so far is written and seen by listeners."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """Drain the queue, flush the last batch and close the handle."""
+        if self._task is None:
+            return
+        assert self._queue is not None
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.store is not None:
+            await asyncio.to_thread(self.store.close)
+        if self._fh is not None:
+            fh = self._fh
+            self._fh = None
+            await asyncio.to_thread(self._close, fh)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def add_listener(self, listener: FlushListener) -> None:
+        self._listeners.append(listener)
+
+    # -------------------------
+    # Producer side
+    # -------------------------
+
+    async def write(self, event: Dict[str, Any]) -> None:
+        """
+        Queue one event for writing.
+
+        The timestamp is stamped here (enqueue time) so ordering in the file
+        matches the order requests finished. Events that already carry one
+        (forwarded by a worker process, see `app.services.detector_ipc`) keep
+        it. Falls back to a direct append when a JSONL writer has not been
+        started (scripts, tests).
+        """
+        if self._queue is None:
+            if self.store is not None or not isinstance(self.encoder, JsonlEncoder):
+                raise RuntimeError("LogWriter is not started")
+            await append_jsonl(self.path, event)
+            return
+        if not event.get("timestamp"):
+            event["timestamp"] = _utc_now_iso()
+        await self._queue.put(event)
+
+    # -------------------------
+    # Consumer side
+    # -------------------------
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        q = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Dict[str, Any]] = [await q.get()]
+            deadline = loop.time() + self.flush_interval_s
+            while len(batch) < self.batch_size:
+                if q.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(q.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(q.get_nowait())
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    q.task_done()
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        try:
+            start_offset, end_offset = await asyncio.to_thread(self._write_blocking, batch)
+        except Exception:
+            # Logging must never break the honeypot.
+            self._write_errors += 1
+            _WRITE_ERRORS.inc()
+            # The encoder may have assigned dictionary ids in output that
+            # never reached disk: the next batch starts a new segment.
+            self.encoder.reset()
+            return
+        elapsed = time.perf_counter() - start
+        elapsed_ms = elapsed * 1000
+        _WRITE_SECONDS.observe(elapsed)
+        _BATCH_EVENTS.observe(len(batch))
+
+        n = len(batch)
+        self._events_written += n
+        self._batches += 1
+        self._last_batch_size = n
+        self._max_batch_size = max(self._max_batch_size, n)
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+        for listener in self._listeners:
+            try:
+                listener(batch, start_offset, end_offset)
+            except Exception:
+                self._listener_errors += 1
+
+    def _write_blocking(self, batch: List[Dict[str, Any]]) -> Tuple[int, int]:
+        if self.store is not None:
+            return self._write_segmented(batch)
+        fh = self._fh
+        if fh is None:
+            raise RuntimeError("LogWriter is not started")
+        start_offset = fh.tell()
+        data = self.encoder.encode(batch, start_offset)
+        fh.write(data)
+        fh.flush()
+        self.encoder.written(self.path)
+        self._maybe_fsync(fh.fileno())
+        return start_offset, start_offset + len(data)
+
+    def _write_segmented(self, batch: List[Dict[str, Any]]) -> Tuple[int, int]:
+        store = self.store
+        if store.should_rotate():
+            store.rotate()
+            self.encoder.reset()  # binary dictionaries are per segment file
+        data = self.encoder.encode(batch, store.active_size)
+        start_offset, end_offset = store.append(data, _ts_us(batch[0].get("timestamp")))
+        self.encoder.written(store.active_path)
+        self._maybe_fsync(store.fileno())
+        return start_offset, end_offset
+
+    def _maybe_fsync(self, fd: int) -> None:
+        if self.fsync == "batch":
+            os.fsync(fd)
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval_s:
+                os.fsync(fd)
+                self._last_fsync = now
+
+    def _close(self, fh) -> None:
+        fh.flush()
+        if self.fsync != "never":
+            os.fsync(fh.fileno())
+        fh.close()
+
+    # -------------------------
+    # Introspection
+    # -------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._batches
+        return {
+            "queueDepth": self.queue_depth,
+            "queueCapacity": self.max_queue,
+            "eventsWritten": self._events_written,
+            "batches": batches,
+            "lastBatchSize": self._last_batch_size,
+            "maxBatchSize": self._max_batch_size,
+            "avgBatchSize": (self._events_written / batches) if batches else 0.0,
+            "lastFlushMs": round(self._last_flush_ms, 3),
+            "maxFlushMs": round(self._max_flush_ms, 3),
+            "avgFlushMs": round(self._total_flush_ms / batches, 3) if batches else 0.0,
+            "writeErrors": self._write_errors,
+            "listenerErrors": self._listener_errors,
+            "fsync": self.fsync,
+        }
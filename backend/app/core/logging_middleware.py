@@ -2,80 +2,163 @@ from __future__ import annotations
 
 import time
 import uuid
-from datetime import datetime, timezone
-from typing import Callable, Optional
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, Optional, Tuple
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from app.core import log_writer
+from app.core.log_writer import LogWriter
+from app.core.metrics import REGISTRY
 
+_REQUEST_SECONDS = REGISTRY.histogram(
+    "honeypot_request_duration_seconds", "Request latency by route template.", ("method", "route")
+)
+_KNOWN_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+_MIDDLEWARE_SECONDS = REGISTRY.histogram(
+    "honeypot_middleware_seconds", "Time spent in the telemetry middleware itself (excluding the app)."
+)
+# Attacker-supplied login names: cap what ends up in every log line.
+_MAX_USERNAME = 256
+USERNAME_MODES = ("plain", "hash", "off")
 
-def _get_client_ip(request: Request) -> str:
+
+def _get_client_ip(headers: Dict[bytes, bytes], scope: Scope) -> str:
     # If you later put this behind a proxy, X-Forwarded-For is commonly used.
-    xff = request.headers.get("x-forwarded-for")
+    xff = headers.get(b"x-forwarded-for")
     if xff:
         # Take the first IP in the list.
-        return xff.split(",")[0].strip()
-    if request.client and request.client.host:
-        return request.client.host
+        ip = xff.decode("latin-1").split(",")[0].strip()
+        if ip:
+            return ip
+    client = scope.get("client")
+    if client and client[0]:
+        return client[0]
     return "unknown"
 
 
-class StructuredRequestLoggingMiddleware(BaseHTTPMiddleware):
+def _header_map(raw: Iterable[Tuple[bytes, bytes]]) -> Dict[bytes, bytes]:
+    # ASGI header names are already lower-cased; first occurrence wins.
+    out: Dict[bytes, bytes] = {}
+    for k, v in raw:
+        out.setdefault(k, v)
+    return out
+
+
+def _username_field(username: str, mode: str) -> str:
+    if mode == "hash":
+        # Stable pseudonym: same account, same value (counting still works).
+        return "h:" + blake2b(username.encode("utf-8", "surrogatepass"), digest_size=8).hexdigest()
+    return username[:_MAX_USERNAME]
+
+
+def _content_length(headers: Dict[bytes, bytes]) -> Optional[int]:
+    raw = headers.get(b"content-length")
+    if not raw:
+        return None
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return None
+
+
+class StructuredRequestLoggingMiddleware:
     """
-    Non-negotiable telemetry layer:
-    - Logs every request as one JSON entry (JSONL).
+    Non-negotiable telemetry layer (pure ASGI):
+    - Logs every request as one JSON entry (JSONL) via the LogWriter.
     - Fields match the required schema from the project brief.
+    - Counts request body bytes as they stream through `receive` instead of
+      buffering the body; the status code is captured from `send`.
+    - Handlers share extra telemetry through `request.state`, which is
+      backed by `scope["state"]` (e.g. `auth_success`); the middleware puts
+      `request_id` and `client_ip` there for handlers.
+    - `login_username` becomes the optional `username` field: as sent
+      (`usernames="plain"`), as a stable BLAKE2b pseudonym ("hash") or
+      not at all ("off").
     """
 
-    def __init__(self, app, log_path: str):
-        super().__init__(app)
-        self.log_path = log_path
+    def __init__(self, app: ASGIApp, writer: LogWriter, usernames: str = "plain") -> None:
+        if usernames not in USERNAME_MODES:
+            raise ValueError(f"usernames must be one of {USERNAME_MODES} (got {usernames!r})")
+        self.app = app
+        self.writer = writer
+        self.usernames = usernames
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        entered = time.perf_counter()
         request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
+        headers = _header_map(scope.get("headers") or ())
+        ip = _get_client_ip(headers, scope)
+        state: Dict[str, Any] = scope.setdefault("state", {})
+        state["request_id"] = request_id
+        state["client_ip"] = ip
 
         start = time.perf_counter()
-
-        # Read body once; Starlette caches it so endpoints can read again.
-        body = await request.body()
-        payload_size = len(body) if body else 0
-
-        ip = _get_client_ip(request)
-        user_agent = request.headers.get("user-agent", "")
-
-        status_code: int = 500
-        auth_success: Optional[bool] = None
+        payload_size = 0
+        body_complete = False
+        status_code = 500
+
+        async def counting_receive() -> Message:
+            nonlocal payload_size, body_complete
+            message = await receive()
+            if message["type"] == "http.request":
+                payload_size += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    body_complete = True
+            return message
+
+        async def capturing_send(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
         try:
-            response = await call_next(request)
-            status_code = response.status_code
-            auth_success = getattr(request.state, "auth_success", None)
-            return response
+            await self.app(scope, counting_receive, capturing_send)
         finally:
-            duration_ms = int((time.perf_counter() - start) * 1000)
+            finished = time.perf_counter()
+            duration_ms = int((finished - start) * 1000)
+
+            if not body_complete:
+                # The handler never read (all of) the body: fall back to the
+                # declared length rather than reading it just to measure it.
+                declared = _content_length(headers)
+                if declared is not None:
+                    payload_size = max(payload_size, declared)
 
             # Required schema fields (do not remove/rename).
+            # The writer stamps the final timestamp at enqueue-time.
             event = {
-                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "timestamp": None,
                 "ip": ip,
-                "endpoint": str(request.url.path),
-                "method": request.method,
+                "endpoint": scope.get("path", ""),
+                "method": scope.get("method", ""),
                 "status_code": status_code,
-                "auth_success": auth_success,
+                "auth_success": state.get("auth_success"),
                 "response_time_ms": duration_ms,
                 "payload_size": payload_size,
-                "user_agent": user_agent,
+                "user_agent": headers.get(b"user-agent", b"").decode("latin-1"),
                 "request_id": request_id,
             }
+            username = state.get("login_username")
+            if username is not None and self.usernames != "off":
+                event["username"] = _username_field(str(username), self.usernames)
 
-            # Fire-and-forget; logging must not break request handling.
+            # The detector is fed from the writer's flush (see ingest_batch),
+            # so each event is processed exactly once.
             try:
-                await log_writer.append_jsonl(self.log_path, event)
+                await self.writer.write(event)
             except Exception:
                 # Intentionally swallow exceptions to avoid "fixing" the honeypot
                 # behavior at runtime due to logging failures.
                 pass
 
+            # Route templates, not raw paths: attackers control the latter.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            _REQUEST_SECONDS.labels(method if method in _KNOWN_METHODS else "OTHER", route).observe(finished - start)
+            _MIDDLEWARE_SECONDS.observe((start - entered) + (time.perf_counter() - finished))
+
@@ -0,0 +1,477 @@
+"""
+Segmented, rotated request-log store.
+
+The log is a directory of segment files named by the *global* byte offset
+they start at (`requests-00000000000001234567.jsonl`), so a position in the
+log is still a single integer that only grows, no matter how many segments
+were rotated, compressed or deleted since.
+
+- The active segment is rotated by size (`max_segment_bytes`) or age
+  (`max_segment_age_s`).
+- Sealed segments can be gzip-compressed (`.gz`); offsets always refer to
+  the uncompressed bytes.
+- Each segment has a sparse time index sidecar (`.tidx`: pairs of
+  epoch-microseconds and relative offset), used to seek straight to
+  "events since T" or "events between T1 and T2".
+- A retention policy deletes (or moves to `archive_dir`) the oldest sealed
+  segments by age and/or total size.
+- Sealed segments never change: their sizes and time indexes are cached by
+  file name (only the newest segment is looked at again on every call), and
+  the last decompressed `.gz` segments are kept in a small LRU, so a reader
+  polling its way through a sealed segment does not inflate it every time.
+
+Both on-disk formats work: JSONL (`.jsonl`) and binary (`.hpb`).
+"""
+
+from __future__ import annotations
+
+import bisect
+import gzip
+import io
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.binlog import BINARY_SUFFIX, SEGMENTS_SUFFIX, BinaryLogReader, iso_from_us, segment_starts
+from app.core.log_reader import iter_jsonl
+
+INDEX_SUFFIX = ".tidx"
+_INDEX_ENTRY = struct.Struct("<qQ")
+
+
+@dataclass
+class Segment:
+    base: int  # global offset of the first byte
+    path: str  # current file (".gz" once compressed)
+    name: str  # uncompressed file name (sidecars hang off this)
+    size: int  # uncompressed size in bytes
+    compressed: bool = False
+
+    @property
+    def end(self) -> int:
+        return self.base + self.size
+
+
+def _parse_ts_s(value: Any) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+class SegmentedLog:
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "requests",
+        suffix: str = ".jsonl",
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        max_segment_age_s: Optional[float] = 3600.0,
+        compress_sealed: bool = True,
+        index_interval_bytes: int = 64 * 1024,
+        retention_s: Optional[float] = None,
+        retention_bytes: Optional[int] = None,
+        archive_dir: Optional[str] = None,
+        decompressed_cache_bytes: int = 128 * 1024 * 1024,
+    ) -> None:
+        self.directory = directory
+        self.prefix = prefix
+        self.suffix = suffix
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age_s = max_segment_age_s
+        self.compress_sealed = compress_sealed
+        self.index_interval_bytes = index_interval_bytes
+        self.retention_s = retention_s
+        self.retention_bytes = retention_bytes
+        self.archive_dir = archive_dir
+        self.decompressed_cache_bytes = decompressed_cache_bytes
+
+        self._name_re = re.compile(re.escape(prefix) + r"-(\d{20})" + re.escape(suffix) + r"(\.gz)?$")
+        self._fh = None
+        self._active: Optional[Segment] = None
+        self._active_opened_s: float = 0.0
+        self._last_index_rel: int = -1
+
+        # Sealed segments, by file name (written by the writer, maintenance
+        # and reader threads alike).
+        self._cache_lock = threading.Lock()
+        self._sealed: Dict[str, Segment] = {}
+        self._indexes: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._newest_base: int = -1
+        self._inflated: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflated_bytes: int = 0
+
+        self._rotations: int = 0
+        self._compressed: int = 0
+        self._deleted: int = 0
+        self._archived: int = 0
+
+    @property
+    def binary(self) -> bool:
+        return self.suffix == BINARY_SUFFIX
+
+    # -------------------------
+    # Layout
+    # -------------------------
+
+    def _segment_name(self, base: int) -> str:
+        return f"{self.prefix}-{base:020d}{self.suffix}"
+
+    def segments(self) -> List[Segment]:
+        """All segments on disk, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        files: Dict[int, str] = {}
+        for fname in os.listdir(self.directory):
+            m = self._name_re.match(fname)
+            if not m:
+                continue
+            base = int(m.group(1))
+            # Both exist only mid-compression; the plain file is authoritative.
+            if base not in files or not m.group(2):
+                files[base] = fname
+        if not files:
+            return []
+        newest = max(files)
+        out: List[Segment] = []
+        with self._cache_lock:
+            self._newest_base = newest
+            for base in sorted(files):
+                fname = files[base]
+                seg = self._sealed.get(fname) if base != newest else None
+                if seg is None:
+                    try:
+                        seg = self._stat_segment(base, fname)
+                    except OSError:
+                        continue  # retired or compressed meanwhile
+                    if base != newest:
+                        self._sealed[fname] = seg
+                out.append(seg)
+            names = set(files.values())
+            for fname in [f for f in self._sealed if f not in names]:
+                del self._sealed[fname]
+                self._indexes.pop(self._sealed_name(fname), None)
+            for path in [p for p in self._inflated if os.path.basename(p) not in names]:
+                self._inflated_bytes -= len(self._inflated.pop(path))
+        return out
+
+    def _stat_segment(self, base: int, fname: str) -> Segment:
+        path = os.path.join(self.directory, fname)
+        compressed = fname.endswith(".gz")
+        size = self._uncompressed_size(path) if compressed else os.path.getsize(path)
+        return Segment(base, path, self._segment_name(base), size, compressed)
+
+    @staticmethod
+    def _sealed_name(fname: str) -> str:
+        return fname[:-3] if fname.endswith(".gz") else fname
+
+    def _uncompressed_size(self, gz_path: str) -> int:
+        # gzip stores the size mod 2**32 in its trailer; segments stay far below that.
+        with open(gz_path, "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            return struct.unpack("<I", f.read(4))[0]
+
+    @property
+    def end_offset(self) -> int:
+        if self._active is not None:
+            return self._active.end
+        segs = self.segments()
+        return segs[-1].end if segs else 0
+
+    @property
+    def start_offset(self) -> int:
+        segs = self.segments()
+        return segs[0].base if segs else 0
+
+    # -------------------------
+    # Writing (used by LogWriter, from its worker thread)
+    # -------------------------
+
+    def open(self) -> None:
+        """Resume appending to the newest uncompressed segment, or start one."""
+        os.makedirs(self.directory, exist_ok=True)
+        segs = self.segments()
+        if segs and not segs[-1].compressed and not self.binary:
+            seg = segs[-1]
+        else:
+            # Binary segments are always started fresh: the encoder's
+            # dictionaries do not survive a restart.
+            base = segs[-1].end if segs else 0
+            seg = Segment(base, os.path.join(self.directory, self._segment_name(base)), self._segment_name(base), 0)
+        self._open_active(seg)
+
+    def _open_active(self, seg: Segment) -> None:
+        self._fh = open(seg.path, "ab")
+        seg.size = self._fh.tell()
+        self._active = seg
+        self._active_opened_s = time.time()
+        self._last_index_rel = -1
+
+    def should_rotate(self, now_s: Optional[float] = None) -> bool:
+        seg = self._active
+        if seg is None or seg.size == 0:
+            return False
+        if seg.size >= self.max_segment_bytes:
+            return True
+        if self.max_segment_age_s is not None:
+            now_s = time.time() if now_s is None else now_s
+            return now_s - self._active_opened_s >= self.max_segment_age_s
+        return False
+
+    def rotate(self) -> None:
+        """Seal the active segment and start a new one at the current end offset."""
+        seg = self._active
+        if seg is None:
+            return
+        self.close()
+        base = seg.end
+        self._open_active(Segment(base, os.path.join(self.directory, self._segment_name(base)), self._segment_name(base), 0))
+        self._rotations += 1
+
+    @property
+    def active_path(self) -> str:
+        assert self._active is not None
+        return self._active.path
+
+    @property
+    def active_size(self) -> int:
+        return self._active.size if self._active is not None else 0
+
+    def append(self, data: bytes, first_ts_us: Optional[int]) -> Tuple[int, int]:
+        """Append one encoded batch. Returns its global [start, end) offsets."""
+        seg = self._active
+        if seg is None or self._fh is None:
+            raise RuntimeError("SegmentedLog is not open")
+        rel = seg.size
+        if first_ts_us is not None and (
+            self._last_index_rel < 0 or rel - self._last_index_rel >= self.index_interval_bytes
+        ):
+            with open(os.path.join(self.directory, seg.name + INDEX_SUFFIX), "ab") as f:
+                f.write(_INDEX_ENTRY.pack(first_ts_us, rel))
+            self._last_index_rel = rel
+        self._fh.write(data)
+        self._fh.flush()
+        seg.size += len(data)
+        return seg.base + rel, seg.end
+
+    def fileno(self) -> int:
+        assert self._fh is not None
+        return self._fh.fileno()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+            self._fh.close()
+            self._fh = None
+
+    # -------------------------
+    # Maintenance (compression + retention)
+    # -------------------------
+
+    def maintenance(self, now_s: Optional[float] = None) -> Dict[str, int]:
+        """Compress sealed segments and apply retention. Safe to run in a thread."""
+        now_s = time.time() if now_s is None else now_s
+        segs = self.segments()
+        active_base = self._active.base if self._active is not None else (segs[-1].base if segs else None)
+        sealed = [s for s in segs if s.base != active_base]
+
+        compressed = 0
+        if self.compress_sealed:
+            for seg in sealed:
+                if not seg.compressed:
+                    self._compress(seg)
+                    compressed += 1
+
+        retired = 0
+        total = sum(s.size for s in segs)
+        for i, seg in enumerate(sealed):
+            # A sealed segment's newest event is older than the next segment's first.
+            newest = self._first_ts(segs[i + 1])
+            too_old = self.retention_s is not None and newest is not None and newest < now_s - self.retention_s
+            too_big = self.retention_bytes is not None and total > self.retention_bytes
+            if not (too_old or too_big):
+                break
+            self._retire(seg)
+            total -= seg.size
+            retired += 1
+        return {"compressed": compressed, "retired": retired}
+
+    def _compress(self, seg: Segment) -> None:
+        plain = os.path.join(self.directory, seg.name)
+        tmp = plain + ".gz.tmp"
+        with open(plain, "rb") as fin, gzip.open(tmp, "wb", compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        os.replace(tmp, plain + ".gz")
+        os.remove(plain)
+        self._compressed += 1
+
+    def _sidecars(self, seg: Segment) -> List[str]:
+        base = os.path.join(self.directory, seg.name)
+        return [p for p in (base + INDEX_SUFFIX, base + SEGMENTS_SUFFIX) if os.path.exists(p)]
+
+    def _retire(self, seg: Segment) -> None:
+        files = [self._current_path(seg)] + self._sidecars(seg)
+        if self.archive_dir:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            for p in files:
+                shutil.move(p, os.path.join(self.archive_dir, os.path.basename(p)))
+            self._archived += 1
+        else:
+            for p in files:
+                os.remove(p)
+            self._deleted += 1
+
+    def _current_path(self, seg: Segment) -> str:
+        plain = os.path.join(self.directory, seg.name)
+        return plain if os.path.exists(plain) else plain + ".gz"
+
+    # -------------------------
+    # Time index
+    # -------------------------
+
+    def _index(self, seg: Segment) -> Tuple[List[int], List[int]]:
+        with self._cache_lock:
+            cached = self._indexes.get(seg.name)
+            sealed = seg.base < self._newest_base
+        if cached is not None:
+            return cached
+        path = os.path.join(self.directory, seg.name + INDEX_SUFFIX)
+        ts: List[int] = []
+        rel: List[int] = []
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                raw = f.read()
+            n = len(raw) // _INDEX_ENTRY.size
+            for t, r in _INDEX_ENTRY.iter_unpack(raw[: n * _INDEX_ENTRY.size]):
+                ts.append(t)
+                rel.append(r)
+        if sealed:
+            with self._cache_lock:
+                self._indexes[seg.name] = (ts, rel)
+        return ts, rel
+
+    def _first_ts(self, seg: Segment) -> Optional[float]:
+        ts, _ = self._index(seg)
+        return ts[0] / 1_000_000 if ts else None
+
+    # -------------------------
+    # Reading
+    # -------------------------
+
+    def read_from(self, offset: int = 0) -> Iterator[Tuple[Dict[str, Any], Optional[float], int]]:
+        """
+        Yield `(event, ts_s, end_offset)` from global `offset` onwards.
+
+        `ts_s` is None for JSONL segments (the caller parses the timestamp).
+        Offsets before the oldest retained segment start at that segment.
+        """
+        for seg in self.segments():
+            if seg.end <= offset:
+                continue
+            yield from self._read_segment(seg, max(0, offset - seg.base))
+
+    def read_range(self, start_s: float, end_s: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Events with `start_s <= ts < end_s` (end open if None), in log order.
+
+        Segments that end before `start_s` are skipped via their first
+        timestamps; inside a segment the sparse index gives the start offset.
+        """
+        segs = self.segments()
+        firsts = [self._first_ts(s) for s in segs]
+        for i, seg in enumerate(segs):
+            nxt_first = firsts[i + 1] if i + 1 < len(segs) else None
+            if nxt_first is not None and nxt_first < start_s:
+                continue  # the whole segment is older than the range
+            if end_s is not None and firsts[i] is not None and firsts[i] >= end_s:
+                break
+            ts_idx, rel_idx = self._index(seg)
+            j = bisect.bisect_right(ts_idx, int(start_s * 1_000_000)) - 1
+            rel = rel_idx[j] if j >= 0 else 0
+            for ev, ts_s, _end in self._read_segment(seg, rel):
+                if ts_s is None:
+                    ts_s = _parse_ts_s(ev.get("timestamp"))
+                    if ts_s is None:
+                        continue
+                if ts_s < start_s:
+                    continue
+                if end_s is not None and ts_s >= end_s:
+                    return
+                if ev.get("timestamp") is None:
+                    ev["timestamp"] = iso_from_us(int(ts_s * 1_000_000))
+                yield ev
+
+    def _read_segment(self, seg: Segment, rel: int) -> Iterator[Tuple[Dict[str, Any], Optional[float], int]]:
+        path = self._current_path(seg)
+        if not os.path.exists(path):
+            return
+        compressed = path.endswith(".gz")
+        buf = self._inflate(seg, path) if compressed else None
+        if self.binary:
+            starts = segment_starts(os.path.join(self.directory, seg.name))
+            if compressed:
+                if buf is None:  # too big to cache: inflate for this read only
+                    with gzip.open(path, "rb") as f:
+                        buf = f.read()
+                records = BinaryLogReader.read_buffer(buf, rel, starts)
+            else:
+                records = BinaryLogReader(path).read_from(rel)
+            for ev, ts_s, end in records:
+                yield ev, ts_s, seg.base + end
+            return
+
+        if buf is not None:
+            fh: Any = io.BytesIO(buf)
+        else:
+            fh = (gzip.open if compressed else open)(path, "rb")
+        with fh as f:
+            f.seek(rel)
+            for ev, ts_s, end in iter_jsonl(f, rel):
+                yield ev, ts_s, seg.base + end
+
+    def _inflate(self, seg: Segment, path: str) -> Optional[bytes]:
+        """Decompressed bytes of a sealed `.gz` segment via the LRU, None if it does not fit."""
+        if seg.size > self.decompressed_cache_bytes:
+            return None
+        with self._cache_lock:
+            buf = self._inflated.get(path)
+            if buf is not None:
+                self._inflated.move_to_end(path)
+                return buf
+        with gzip.open(path, "rb") as f:
+            buf = f.read()
+        with self._cache_lock:
+            if path not in self._inflated:
+                self._inflated[path] = buf
+                self._inflated_bytes += len(buf)
+            while self._inflated_bytes > self.decompressed_cache_bytes:
+                _old, old_buf = self._inflated.popitem(last=False)
+                self._inflated_bytes -= len(old_buf)
+        return buf
+
+    # -------------------------
+    # Introspection
+    # -------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        segs = self.segments()
+        return {
+            "segments": len(segs),
+            "compressedSegments": sum(1 for s in segs if s.compressed),
+            "startOffset": segs[0].base if segs else 0,
+            "endOffset": self.end_offset,
+            "bytesOnDisk": sum(os.path.getsize(s.path) for s in segs if os.path.exists(s.path)),
+            "rotations": self._rotations,
+            "compressed": self._compressed,
+            "deleted": self._deleted,
+            "archived": self._archived,
+            "inflatedCached": len(self._inflated),
+            "inflatedCachedBytes": self._inflated_bytes,
+        }
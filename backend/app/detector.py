@@ -0,0 +1,37 @@
+"""
+Detector process for multi-worker deployments (no HTTP listener).
+
+    python -m app.detector &
+    HONEYPOT_ROLE=worker uvicorn app.main:app --workers 8
+
+Runs the app's startup/shutdown (restore, log writer, tailer, snapshots)
+with `HONEYPOT_ROLE=detector`, serving workers on
+`HONEYPOT_DETECTOR_SOCKET` until SIGINT/SIGTERM.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+
+
+async def _serve() -> None:
+    from app.main import app
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with app.router.lifespan_context(app):
+        await stop.wait()
+
+
+def main() -> None:
+    # The role is read when app.main is imported.
+    os.environ["HONEYPOT_ROLE"] = "detector"
+    asyncio.run(_serve())
+
+
+if __name__ == "__main__":
+    main()
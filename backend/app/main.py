@@ -1,26 +1,289 @@
 from __future__ import annotations
 
+import asyncio
 import os
-import time
-import uuid
 import json
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, File, Form, Request, UploadFile, Response
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-
-from app.core.log_writer import append_jsonl
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.binlog import BINARY_SUFFIX, BinaryLogEncoder
+from app.core.log_writer import LogWriter
+from app.core.logging_middleware import StructuredRequestLoggingMiddleware
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.core.metrics import REGISTRY
+from app.core.segment_store import SegmentedLog
+from app.services.broadcaster import AttackBroadcaster, sse_encode
 from app.services.detection_engine import DetectionEngine
+from app.services.detector_ipc import DetectorClient, DetectorServer, DetectorUnavailable
+from app.services.geoip import GeoIPIndex
+from app.services.response_cache import ResponseCache
+from app.services.snapshots import dump_snapshot_parts, pack_snapshot, restore_engine, write_snapshot
+from app.services.subnets import SubnetTrie
+from app.services.tailer import LogTailer
+from app.services.upload_store import UploadStore
+
+try:
+    from app.services.history import ColumnarHistory
+except ImportError:  # numpy not installed: no columnar history
+    ColumnarHistory = None  # type: ignore[assignment,misc]
 
 
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
 BACKEND_ROOT = os.path.abspath(os.path.join(APP_ROOT, ".."))
-LOG_PATH = os.path.join(BACKEND_ROOT, "logs", "requests.jsonl")
-UPLOAD_DIR = os.path.join(BACKEND_ROOT, "uploads")
+# Where logs, snapshots and uploads live (benchmarks point this at a temp dir).
+DATA_ROOT = os.environ.get("HONEYPOT_DATA_DIR", BACKEND_ROOT)
+# "jsonl" (default, human-readable) or "binary" (compact .hpb, see app.core.binlog).
+LOG_FORMAT = os.environ.get("HONEYPOT_LOG_FORMAT", "jsonl")
+LOG_PATH = os.path.join(DATA_ROOT, "logs", "requests" + (BINARY_SUFFIX if LOG_FORMAT == "binary" else ".jsonl"))
+# Segmented mode: rotated (and gzip-compressed once sealed) segments under
+# logs/requests/, with a per-segment time index and a retention policy.
+LOG_SEGMENTED = os.environ.get("HONEYPOT_LOG_SEGMENTED", "0") == "1"
+LOG_SEGMENT_DIR = os.path.join(DATA_ROOT, "logs", "requests")
+LOG_RETENTION_DAYS = float(os.environ.get("HONEYPOT_LOG_RETENTION_DAYS", "30"))
+LOG_MAINTENANCE_INTERVAL_S = 300.0
+# Columnar history (segmented log only): sealed segments compacted into
+# memory-mapped column files for range analytics.
+HISTORY_DIR = os.path.join(DATA_ROOT, "logs", "history")
+HISTORY_RETENTION_DAYS = float(os.environ.get("HONEYPOT_HISTORY_RETENTION_DAYS", "365"))
+SNAPSHOT_PATH = os.path.join(DATA_ROOT, "logs", "engine.snapshot")
+SNAPSHOT_INTERVAL_S = float(os.environ.get("HONEYPOT_SNAPSHOT_INTERVAL_S", "60"))
+ATTACKER_SPILL_PATH = os.path.join(DATA_ROOT, "logs", "attackers.spill")
+UPLOAD_DIR = os.path.join(DATA_ROOT, "uploads")
+# Login usernames in telemetry: "plain", "hash" (stable pseudonym) or "off".
+LOG_USERNAMES = os.environ.get("HONEYPOT_LOG_USERNAMES", "plain")
+# Local IP-range database for country / ASN (CSV, see app.services.geoip).
+GEOIP_DB = os.environ.get("HONEYPOT_GEOIP_DB", "")
+# Process role (see app.services.detector_ipc):
+# - "standalone" (default): one process does everything.
+# - "detector": standalone + serves workers over DETECTOR_SOCKET
+#   (`python -m app.detector`, or a single-worker uvicorn).
+# - "worker": handles requests only (`uvicorn --workers N`); telemetry goes
+#   to the detector, dashboard reads are answered by it.
+ROLE = os.environ.get("HONEYPOT_ROLE", "standalone")
+if ROLE not in ("standalone", "detector", "worker"):
+    raise RuntimeError(f"HONEYPOT_ROLE must be standalone, detector or worker (got {ROLE!r})")
+DETECTOR_SOCKET = os.environ.get("HONEYPOT_DETECTOR_SOCKET", os.path.join(DATA_ROOT, "logs", "detector.sock"))
+
+
+def _prefixes(name: str, default: str) -> List[int]:
+    return [int(p) for p in os.environ.get(name, default).split(",") if p.strip()]
+
 
 # In-memory behavior engine (rule-first).
-ENGINE = DetectionEngine()
+# The attacker table is capacity-bounded; evicted IPs spill to disk.
+# Subnet counters (distributed attacks) are kept at these prefix lengths.
+ENGINE = DetectionEngine(
+    max_attackers=int(os.environ.get("HONEYPOT_MAX_ATTACKERS", "100000")),
+    # Workers never ingest; the spill file belongs to the detector.
+    attacker_spill_path=ATTACKER_SPILL_PATH if ROLE != "worker" else None,
+    subnets=SubnetTrie(
+        v4_prefixes=_prefixes("HONEYPOT_SUBNET_V4_PREFIXES", "16,24"),
+        v6_prefixes=_prefixes("HONEYPOT_SUBNET_V6_PREFIXES", "48,64"),
+        half_life_s=float(os.environ.get("HONEYPOT_SUBNET_HALF_LIFE_S", "60")),
+        max_nodes=int(os.environ.get("HONEYPOT_SUBNET_MAX_NODES", "200000")),
+    ),
+    # Counters per heavy-hitter summary (top IPs, user agents, endpoints, attack types).
+    top_k=int(os.environ.get("HONEYPOT_TOPK", "100")),
+)
+
+# Push feed: newly emitted attack events fan out to SSE subscribers.
+BROADCASTER = AttackBroadcaster(history=1000, subscriber_buffer=256)
+
+# Serialized dashboard payloads keyed on engine versions (ETag / 304).
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(os.environ.get("HONEYPOT_RESPONSE_CACHE_ENTRIES", "256")),
+    max_bytes=int(os.environ.get("HONEYPOT_RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024))),
+)
+
+# Content-addressed upload store (streams to disk, dedupes identical payloads).
+UPLOAD_STORE = UploadStore(
+    UPLOAD_DIR,
+    per_ip_quota_bytes=int(os.environ.get("HONEYPOT_UPLOAD_IP_QUOTA", str(100 * 1024 * 1024))),
+    global_quota_bytes=int(os.environ.get("HONEYPOT_UPLOAD_QUOTA", str(5 * 1024 * 1024 * 1024))),
+)
+
+LOG_STORE: Optional[SegmentedLog] = None
+if LOG_SEGMENTED:
+    LOG_STORE = SegmentedLog(
+        LOG_SEGMENT_DIR,
+        suffix=BINARY_SUFFIX if LOG_FORMAT == "binary" else ".jsonl",
+        max_segment_bytes=int(os.environ.get("HONEYPOT_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+        max_segment_age_s=float(os.environ.get("HONEYPOT_LOG_SEGMENT_AGE_S", "3600")),
+        retention_s=LOG_RETENTION_DAYS * 86400 if LOG_RETENTION_DAYS > 0 else None,
+        archive_dir=os.environ.get("HONEYPOT_LOG_ARCHIVE_DIR") or None,
+    )
+
+HISTORY: Optional["ColumnarHistory"] = None
+if LOG_STORE is not None and ColumnarHistory is not None:
+    HISTORY = ColumnarHistory(
+        HISTORY_DIR,
+        LOG_STORE,
+        retention_s=HISTORY_RETENTION_DAYS * 86400 if HISTORY_RETENTION_DAYS > 0 else None,
+    )
+
+# Batched request-log writer (one open handle, flushed by size or time).
+LOG_WRITER = LogWriter(
+    LOG_PATH,
+    max_queue=10000,
+    batch_size=256,
+    flush_interval_s=0.05,
+    fsync=os.environ.get("HONEYPOT_LOG_FSYNC", "never"),
+    encoder=BinaryLogEncoder() if LOG_FORMAT == "binary" else None,
+    store=LOG_STORE,
+)
+# Single ingestion path: the engine sees each event once, right after the
+# writer has appended it, together with the byte range it occupies in the log.
+LOG_WRITER.add_listener(ENGINE.ingest_batch)
+
+# Background catch-up from the log itself (gaps, other writers). Backs off
+# while the writer queue is more than half full.
+LOG_TAILER = LogTailer(
+    ENGINE,
+    LOG_STORE or LOG_PATH,
+    budget=int(os.environ.get("HONEYPOT_TAIL_BUDGET", "2000")),
+    pressure=lambda: LOG_WRITER.queue_depth * 2 > LOG_WRITER.max_queue,
+    queued=lambda: LOG_WRITER.queue_depth,
+)
+
+# Worker role: telemetry is shipped to the detector instead of LOG_WRITER,
+# which (like the engine, tailer and snapshots) stays idle in this process.
+DETECTOR_CLIENT: Optional[DetectorClient] = None
+if ROLE == "worker":
+    DETECTOR_CLIENT = DetectorClient(DETECTOR_SOCKET, max_queue=10000, batch_size=256, flush_interval_s=0.05)
+TELEMETRY_WRITER = DETECTOR_CLIENT or LOG_WRITER
+
+
+# Scrape-time gauges (read from the components, nothing recorded per request).
+REGISTRY.gauge(
+    "honeypot_log_queue_depth", "Events queued for the log writer (or detector).", fn=lambda: TELEMETRY_WRITER.queue_depth
+)
+# Detector state only exists where the engine runs (workers: see the
+# detector's /metrics).
+if ROLE != "worker":
+    REGISTRY.gauge("honeypot_attackers", "Attackers held in memory.", fn=lambda: ENGINE.attacker_count)
+    REGISTRY.gauge("honeypot_subnet_nodes", "Prefixes tracked by the subnet trie.", fn=lambda: len(ENGINE.subnets))
+    REGISTRY.gauge(
+        "honeypot_log_offset_bytes", "Durable log offset ingested by the detector.", fn=lambda: ENGINE.log_offset
+    )
+    REGISTRY.gauge("honeypot_tail_lag_events", "Ingestion lag in events.", fn=lambda: LOG_TAILER.stats()["lagEvents"])
+    REGISTRY.gauge(
+        "honeypot_tail_lag_seconds", "Ingestion lag in seconds.", fn=lambda: LOG_TAILER.stats()["lagSeconds"] or 0
+    )
+    REGISTRY.gauge(
+        "honeypot_stream_subscribers", "Connected SSE subscribers.", fn=lambda: BROADCASTER.stats()["subscribers"]
+    )
+
+
+_last_snapshot_offset: Optional[int] = None
+_last_warmup: Dict[str, Any] = {}
+_detector_server: Optional[DetectorServer] = None
+
+
+async def _take_snapshot() -> None:
+    global _last_snapshot_offset
+    offset = ENGINE.log_offset
+    if offset == _last_snapshot_offset:
+        return
+    # Pickled on the loop in small pieces (ingestion paused, so they match
+    # the offset) with requests served in between; packing, compression and
+    # the write run in a thread.
+    payload = await dump_snapshot_parts(ENGINE)
+    await asyncio.to_thread(lambda: write_snapshot(SNAPSHOT_PATH, pack_snapshot(payload)))
+    _last_snapshot_offset = offset
+
+
+async def _snapshot_loop() -> None:
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL_S)
+        try:
+            await _take_snapshot()
+        except Exception:
+            pass
+
+
+async def _log_maintenance_loop(store: SegmentedLog) -> None:
+    # Compaction into the columnar history, then compression and retention
+    # of sealed segments (never touches the active one). Sequential, so a
+    # segment is never compressed or retired while it is being compacted.
+    while True:
+        if HISTORY is not None:
+            try:
+                await asyncio.to_thread(HISTORY.compact)
+                await asyncio.to_thread(HISTORY.retire)
+            except Exception:
+                pass
+        try:
+            await asyncio.to_thread(store.maintenance)
+        except Exception:
+            pass
+        await asyncio.sleep(LOG_MAINTENANCE_INTERVAL_S)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DETECTOR_CLIENT is not None:
+        # Worker: no detector state here, only the telemetry forwarder.
+        await DETECTOR_CLIENT.start()
+        try:
+            yield
+        finally:
+            await DETECTOR_CLIENT.stop()
+        return
+    async with _detector_lifespan():
+        yield
+
+
+@asynccontextmanager
+async def _detector_lifespan():
+    global _last_warmup, _last_snapshot_offset, _detector_server
+    # Load GeoIP before replay so replayed attackers are enriched too.
+    if GEOIP_DB and os.path.exists(GEOIP_DB):
+        try:
+            ENGINE.geoip = await asyncio.to_thread(GeoIPIndex.load, GEOIP_DB)
+        except Exception:
+            pass
+    # Warm up once, before serving (never on the request path): load the latest
+    # snapshot and replay only the log tail after it. Live events then continue
+    # from the same byte offset.
+    # Boot-time replay is not "new": only attach the push feed afterwards.
+    try:
+        _last_warmup = await asyncio.to_thread(restore_engine, ENGINE, SNAPSHOT_PATH, LOG_STORE or LOG_PATH)
+        if _last_warmup.get("snapshotRestored") and not _last_warmup.get("replayedEvents"):
+            _last_snapshot_offset = ENGINE.log_offset
+    except Exception:
+        pass
+    ENGINE.add_attack_listener(BROADCASTER.publish)
+    await LOG_WRITER.start()
+    LOG_TAILER.start()
+    snapshot_task = asyncio.create_task(_snapshot_loop(), name="engine-snapshots")
+    maintenance_task = (
+        asyncio.create_task(_log_maintenance_loop(LOG_STORE), name="log-maintenance") if LOG_STORE else None
+    )
+    if ROLE == "detector":
+        _detector_server = DetectorServer(DETECTOR_SOCKET, LOG_WRITER, QUERIES, BROADCASTER)
+        await _detector_server.start()
+    try:
+        yield
+    finally:
+        if _detector_server is not None:
+            # Stop accepting worker events before draining the writer.
+            await _detector_server.stop()
+            _detector_server = None
+        snapshot_task.cancel()
+        if maintenance_task is not None:
+            maintenance_task.cancel()
+        await LOG_TAILER.stop()
+        # Drain queued events so nothing is lost on shutdown.
+        await LOG_WRITER.stop()
+        try:
+            await _take_snapshot()
+        except Exception:
+            pass
+        ENGINE.close()
 
 
 app = FastAPI(
@@ -30,6 +293,7 @@ app = FastAPI(
         "Intentionally vulnerable honeypot API.\n\n"
         "WARNING: Vulnerabilities are intentional for security research."
     ),
+    lifespan=lifespan,
 )
 
 # Allow the existing Vite frontend to call the backend locally.
@@ -41,70 +305,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Non-negotiable: structured JSON request telemetry.
-@app.middleware("http")
-async def structured_request_logger(request: Request, call_next):
-    """
-    Non-negotiable telemetry layer:
-    - Logs *every* request as structured JSON (JSONL).
-    - Fields match the required schema from the project brief.
-    """
-    request_id = str(uuid.uuid4())
-    request.state.request_id = request_id
+# Non-negotiable: structured JSON request telemetry (pure ASGI, outermost).
+app.add_middleware(StructuredRequestLoggingMiddleware, writer=TELEMETRY_WRITER, usernames=LOG_USERNAMES)
 
-    start = time.perf_counter()
-    body = await request.body()
-    payload_size = len(body) if body else 0
 
-    xff = request.headers.get("x-forwarded-for")
-    ip = (xff.split(",")[0].strip() if xff else None) or (request.client.host if request.client else None) or "unknown"
-    user_agent = request.headers.get("user-agent", "")
+@app.get("/health")
+def health() -> Dict[str, Any]:
+    return {"ok": True}
 
-    status_code = 500
-    auth_success = None
 
-    try:
-        response: Response = await call_next(request)
-        status_code = response.status_code
-        auth_success = getattr(request.state, "auth_success", None)
-        return response
-    finally:
-        duration_ms = int((time.perf_counter() - start) * 1000)
-
-        # IMPORTANT: log_writer will stamp the final timestamp at write-time.
-        # We keep this field present here for schema clarity, but allow the writer
-        # to be the single source of truth.
-        event = {
-            "timestamp": None,
-            "ip": ip,
-            "endpoint": str(request.url.path),
-            "method": request.method,
-            "status_code": status_code,
-            "auth_success": auth_success,
-            "response_time_ms": duration_ms,
-            "payload_size": payload_size,
-            "user_agent": user_agent,
-            "request_id": request_id,
-        }
+@app.get("/metrics")
+def metrics() -> Response:
+    """Prometheus text exposition of the metrics registry."""
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
 
-        try:
-            await append_jsonl(LOG_PATH, event)
-        except Exception:
-            # Logging must never break the honeypot.
-            pass
 
-        # Also feed the in-memory detector immediately (so UI updates without waiting).
-        try:
-            # Ensure timestamp is present for rule windows.
-            event["timestamp"] = datetime.now(timezone.utc).isoformat()
-            ENGINE.process_request_event(event)
-        except Exception:
-            pass
+@app.get("/api/system")
+async def system_stats() -> Dict[str, Any]:
+    """
+    Operational stats for the telemetry pipeline:
+    - logWriter: queue depth, batch sizes, flush latency.
+    - ingestion: durable log offset and dedupe counters of the detector.
+    - tailer: background ingestion, incl. lag in events and seconds.
+    - warmup: how the engine was restored at boot (snapshot vs replay).
+    - role / worker: process role; on workers, the detector's stats plus
+      this worker's forwarding queue (`worker`) and upload store.
+    """
+    if DETECTOR_CLIENT is None:
+        return _system_stats()
+    stats = await _query("system")
+    stats["worker"] = {"pid": os.getpid(), "detector": DETECTOR_CLIENT.stats()}
+    # Uploads are stored (and quota-checked) by the worker that received them.
+    stats["uploads"] = UPLOAD_STORE.stats()
+    return stats
 
 
-@app.get("/health")
-def health() -> Dict[str, Any]:
-    return {"ok": True}
+def _system_stats() -> Dict[str, Any]:
+    return {
+        "role": ROLE,
+        "detector": _detector_server.stats() if _detector_server is not None else None,
+        "logWriter": LOG_WRITER.stats(),
+        "ingestion": ENGINE.ingestion_stats(),
+        "tailer": LOG_TAILER.stats(),
+        "stream": BROADCASTER.stats(),
+        "warmup": _last_warmup,
+        "uploads": UPLOAD_STORE.stats(),
+        "lastSnapshotOffset": _last_snapshot_offset,
+        "logStore": LOG_STORE.stats() if LOG_STORE is not None else None,
+        "history": HISTORY.stats() if HISTORY is not None else None,
+        "geoip": ENGINE.geoip.stats() if ENGINE.geoip is not None else None,
+        "responseCache": RESPONSE_CACHE.stats(),
+    }
 
 
 # -----------------------------
@@ -176,21 +427,24 @@ async def upload_file(
     """
     Weak validation:
     - Accepts any file type.
-    - Stores by original filename (unsafe by design for honeypot realism).
+    - Echoes the original filename back (unsafe-looking by design for
+      honeypot realism); on disk payloads are content-addressed and deduped.
     """
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    dest = os.path.join(UPLOAD_DIR, file.filename)
-    content = await file.read()
-
-    with open(dest, "wb") as f:
-        f.write(content)
+    request_id = getattr(request.state, "request_id", None)
+    ip = getattr(request.state, "client_ip", None) or (request.client.host if request.client else "unknown")
+    try:
+        saved = await UPLOAD_STORE.save(file.file, file.filename or "", ip, request_id)
+        size = saved["bytes"]
+    except Exception:
+        # Storage problems must not change what the attacker sees.
+        size = file.size or 0
 
     return {
         "success": True,
         "stored_as": file.filename,
-        "bytes": len(content),
+        "bytes": size,
         "note": note,
-        "request_id": getattr(request.state, "request_id", None),
+        "request_id": request_id,
     }
 
 
@@ -211,6 +465,45 @@ async def admin_stats() -> Dict[str, Any]:
 # Frontend dashboard feed endpoints
 # -----------------------------------
 # These will be upgraded in later phases to come from rule+ML engines.
+# Every read of detector state goes through `_query`, so workers answer from
+# the detector's consolidated view instead of their own (empty) engine.
+
+QUERIES = {
+    "attacks": lambda limit=50: {"attacks": ENGINE.get_recent_attacks(limit)},
+    "attacker": lambda ip: ENGINE.get_attacker_profile(ip),
+    "analytics": lambda: ENGINE.get_analytics(),
+    "analytics_version": lambda: ENGINE.analytics_version(),
+    "attacker_version": lambda ip: ENGINE.attacker_version(ip),
+    "subnet": lambda cidr: ENGINE.get_subnet_profile(cidr),
+    "subnets": lambda limit=20: {"subnets": ENGINE.get_hot_subnets(limit)},
+    "accounts": lambda limit=20: ENGINE.get_targeted_accounts(limit),
+    "top": lambda limit=20: ENGINE.get_heavy_hitters(limit),
+    "system": lambda: _system_stats(),
+}
+
+
+async def _query(name: str, **kwargs: Any) -> Any:
+    if DETECTOR_CLIENT is None:
+        return QUERIES[name](**kwargs)
+    try:
+        return await DETECTOR_CLIENT.query(name, **kwargs)
+    except DetectorUnavailable:
+        raise HTTPException(status_code=503, detail="detector unavailable")
+
+
+async def _versioned(request: Request, name: str, version: Any, **kwargs: Any) -> Response:
+    """
+    `_query(name, **kwargs)` as JSON with an ETag for `version`: 304 if the
+    client has it, else cached bytes (built once per version). On workers
+    the version and the payload are two queries; the payload can only be
+    newer than its ETag, which just costs the client one more 200 later.
+    """
+    etag = RESPONSE_CACHE.etag(name, kwargs, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if RESPONSE_CACHE.not_modified(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body = await RESPONSE_CACHE.get_or_build(etag, lambda: _query(name, **kwargs))
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @app.get("/api/attacks")
@@ -219,35 +512,120 @@ async def api_attacks(limit: int = 50) -> Dict[str, Any]:
     Returns recent 'attack events'.
     Rule-engine output (behavior-first), not raw logs.
     """
-    # If server restarted, backfill from existing log file once lazily.
-    try:
-        ENGINE.tail_once(LOG_PATH)
-    except Exception:
-        pass
-    return {"attacks": ENGINE.get_recent_attacks(limit)}
+    return await _query("attacks", limit=limit)
+
+
+@app.get("/api/attacks/stream")
+async def api_attacks_stream(request: Request, lastEventId: Optional[str] = None) -> StreamingResponse:
+    """
+    Server-sent events: one `attack` event per newly emitted attack event.
+    Resume with the `Last-Event-ID` header (EventSource sends it on
+    reconnect) or `?lastEventId=`. A `dropped` event reports how many events
+    a slow client lost from its bounded buffer.
+    On workers the detector's feed is relayed (ids stay valid across workers).
+    """
+    last_event_id = request.headers.get("last-event-id") or lastEventId
+    if DETECTOR_CLIENT is not None:
+        body = sse_encode(DETECTOR_CLIENT.subscribe(last_event_id))
+    else:
+        body = BROADCASTER.stream(last_event_id)
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/attacker/{ip}")
-async def api_attacker_profile(ip: str) -> Dict[str, Any]:
-    try:
-        ENGINE.tail_once(LOG_PATH)
-    except Exception:
-        pass
-    return ENGINE.get_attacker_profile(ip)
+async def api_attacker_profile(ip: str, request: Request) -> Response:
+    """Attacker profile; revalidate with `If-None-Match` (304 until the IP or the minute changes)."""
+    return await _versioned(request, "attacker", await _query("attacker_version", ip=ip), ip=ip)
+
+
+@app.get("/api/analytics/accounts")
+async def api_targeted_accounts(limit: int = 20) -> Dict[str, Any]:
+    """
+    Most targeted login accounts over the tracker's window: failed logins
+    (count-min estimate, overcounting by at most `failureErrorBound`),
+    distinct source IPs (HyperLogLog) and totals since tracking began.
+    """
+    return await _query("accounts", limit=max(1, min(limit, 500)))
+
+
+@app.get("/api/analytics/top")
+async def api_heavy_hitters(limit: int = 20) -> Dict[str, Any]:
+    """
+    Top source IPs, user agents, endpoints and attack types across all
+    traffic (Space-Saving). Each item's true count is between `guaranteed`
+    and `count`; unlisted keys occurred at most `floor` times. Summaries
+    from several sensors combine with `app.services.sketches.merge_summaries`.
+    """
+    return await _query("top", limit=max(1, min(limit, 500)))
+
+
+@app.get("/api/subnets")
+async def api_subnets(limit: int = 20) -> Dict[str, Any]:
+    """Most active prefixes (most specific level) by recent failed logins, then requests."""
+    return await _query("subnets", limit=max(1, min(limit, 500)))
+
+
+@app.get("/api/subnet/{cidr:path}")
+async def api_subnet_profile(cidr: str) -> Dict[str, Any]:
+    """
+    Profile of one tracked prefix, e.g. `/api/subnet/203.0.113.0/24`:
+    decayed request / failed-login / enumeration counters, distinct
+    sources and the busiest sub-prefixes. 404 unless the prefix length is
+    configured and the prefix was seen recently.
+    """
+    profile = await _query("subnet", cidr=cidr)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="subnet not tracked")
+    return profile
+
+
+@app.get("/api/requests")
+async def api_requests(since: float, until: Optional[float] = None, limit: int = 1000) -> Dict[str, Any]:
+    """
+    Raw request events with `since <= ts < until` (epoch seconds).
+    Only available with the segmented log, which seeks via its time index.
+    """
+    if LOG_STORE is None:
+        raise HTTPException(status_code=404, detail="segmented log disabled")
+    limit = max(1, min(limit, 10000))
+
+    def _read():
+        out = []
+        for ev in LOG_STORE.read_range(since, until):
+            out.append(ev)
+            if len(out) >= limit:
+                break
+        return out
+
+    return {"requests": await asyncio.to_thread(_read)}
+
+
+@app.get("/api/history/analytics")
+async def api_history_analytics(since: float, until: Optional[float] = None, top: int = 5) -> Dict[str, Any]:
+    """
+    `/api/analytics` for any time range (`since <= ts < until`, epoch
+    seconds), computed over the columnar history. Covers sealed segments
+    only: `coveredUntil` is the newest compacted event.
+    Needs the segmented log and numpy.
+    """
+    if HISTORY is None:
+        raise HTTPException(status_code=404, detail="columnar history disabled")
+    return await asyncio.to_thread(HISTORY.analytics, since, until, max(1, min(top, 100)))
 
 
 @app.get("/api/analytics")
-async def api_analytics() -> Dict[str, Any]:
+async def api_analytics(request: Request) -> Response:
     """
     Returns aggregated analytics used by the dashboard charts.
     Shapes match frontend mockData helpers:
     - attackTypeDistribution: [{name, value}]
     - topEndpoints: [{endpoint, attacks}]
     - hourlyAttackVolume: [{hour, attacks}]
+    Served with an ETag: polls answer 304 until new events arrive.
     """
-    try:
-        ENGINE.tail_once(LOG_PATH)
-    except Exception:
-        pass
-    return ENGINE.get_analytics()
+    return await _versioned(request, "analytics", await _query("analytics_version"))
 
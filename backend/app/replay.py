@@ -0,0 +1,246 @@
+"""
+Offline replay / backtest of the detection rules over historical logs.
+
+    python -m app.replay logs/requests.jsonl --jobs 8 --out report.json
+    python -m app.replay logs/requests --attacks-out attacks.jsonl
+    python -m app.replay logs/requests.hpb --rules mypkg.tuning:rules
+
+- Sharded by network (crc32 of the shortest tracked prefix, /16 or /48 by
+  default) across a process pool. Rules read per-IP state, the prefixes of
+  the source and its login account; every shard feeds all login attempts
+  to its account tracker, so each shard's output is exactly what a single
+  engine would produce for those networks.
+- Each shard reads the whole log and keeps its own IPs: no events are
+  shipped between processes, at the cost of parsing the log once per shard.
+- Engines run on event time (`DetectionEngine.clock`), so results do not
+  depend on when the replay runs; attackers are classified as of their own
+  last request. Nothing is evicted from the attacker table.
+- `--rules module:callable` replays a candidate rule set (a callable
+  returning a list of `Rule`s), e.g. with tuned thresholds.
+
+The report merges all shards: totals, attacks by type and rule, the
+analytics summary, classification counts and the top attackers. With
+`--attacks-out`, every emitted attack event is written as JSONL in log
+order (the order of the requests that triggered them, i.e. timestamp order
+for logs written by the LogWriter), the same for any `--jobs`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import importlib
+import json
+import os
+import sys
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional
+
+from app.core.binlog import BINARY_SUFFIX
+from app.core.segment_store import SegmentedLog
+from app.services.aggregates import AttackAggregates
+from app.services.detection_engine import DetectionEngine
+from app.services.rules import Rule
+
+# Analytics retention for backtests: keep every hour of a multi-year log.
+_RETENTION_HOURS = 24 * 366 * 5
+
+
+@dataclass
+class ShardSpec:
+    log: str
+    shard: int
+    shards: int
+    rules: Optional[str] = None
+    attacks_path: Optional[str] = None
+
+
+def shard_of(key: str, shards: int) -> int:
+    # Stable across processes (unlike hash(), which is salted per process).
+    return zlib.crc32(key.encode("utf-8", "replace")) % shards
+
+
+def open_source(log: str) -> Any:
+    """A log path for `read_log`: JSONL/.hpb file, or a segment directory."""
+    if not os.path.isdir(log):
+        return log
+    names = os.listdir(log)
+    suffix = BINARY_SUFFIX if any(BINARY_SUFFIX in n for n in names) else ".jsonl"
+    return SegmentedLog(log, suffix=suffix)
+
+
+def load_rules(spec: Optional[str]) -> Optional[List[Rule]]:
+    if not spec:
+        return None
+    module, _, attr = spec.partition(":")
+    factory: Callable[[], List[Rule]] = getattr(importlib.import_module(module), attr or "rules")
+    return list(factory())
+
+
+# -------------------------
+# Shard worker
+# -------------------------
+
+
+def run_shard(spec: ShardSpec) -> Dict[str, Any]:
+    from app.core.log_reader import read_log
+
+    engine = DetectionEngine(
+        analytics_retention_hours=_RETENTION_HOURS,
+        max_attackers=sys.maxsize,
+        attacker_idle_ttl_s=None,
+        rules=load_rules(spec.rules),
+    )
+    engine.clock = lambda: engine.last_event_s
+    by_type: Counter = Counter()
+    out: Optional[IO[str]] = open(spec.attacks_path, "w", encoding="utf-8") if spec.attacks_path else None
+    end = 0  # log offset of the request being processed
+
+    def on_attack(event: Dict[str, Any]) -> None:
+        by_type[event["attackType"]] += 1
+        if out is not None:
+            # Prefixed with the source offset for `merge_attack_files`.
+            out.write(f"{end}\t" + json.dumps(event, ensure_ascii=False) + "\n")
+
+    engine.add_attack_listener(on_attack)
+    shard, shards = spec.shard, spec.shards
+    shard_key = engine.subnets.shard_key
+    seen = processed = 0
+    t0 = time.perf_counter()
+    try:
+        for event, ts_s, end in read_log(open_source(spec.log), 0):
+            seen += 1
+            if shards > 1 and shard_of(shard_key(str(event.get("ip") or "unknown")), shards) != shard:
+                if event.get("username"):
+                    engine.track_account(event, ts_s)
+                continue
+            if engine.process_request_event(event, ts_s=ts_s):
+                processed += 1
+    finally:
+        if out is not None:
+            out.close()
+    return {
+        "shard": shard,
+        "eventsRead": seen,
+        "events": processed,
+        "seconds": round(time.perf_counter() - t0, 3),
+        "lastEventS": engine.last_event_s,
+        "attacksByType": dict(by_type),
+        "rules": engine.ingestion_stats()["rules"],
+        "aggregates": engine.aggregates,
+        "attackers": engine.attackers_report(),
+    }
+
+
+# -------------------------
+# Merge
+# -------------------------
+
+
+def merge(results: List[Dict[str, Any]], top: int = 50) -> Dict[str, Any]:
+    """One report from per-shard results (independent of the shard count)."""
+    by_type: Counter = Counter()
+    rules: Dict[str, Dict[str, Any]] = {}
+    aggregates = AttackAggregates(retention_hours=_RETENTION_HOURS)
+    attackers: List[Dict[str, Any]] = []
+    for r in sorted(results, key=lambda r: r["shard"]):
+        by_type.update(r["attacksByType"])
+        aggregates.merge(r["aggregates"])
+        attackers.extend(r["attackers"])
+        for row in r["rules"]:
+            acc = rules.setdefault(row["rule"], {"rule": row["rule"], "priority": row["priority"], "calls": 0, "emits": 0})
+            acc["calls"] += row["calls"]
+            acc["emits"] += row["emits"]
+    now_s = max((r["lastEventS"] for r in results), default=0.0)
+    attackers.sort(key=lambda a: (-sum(a["attacks"].values()), -a["totalRequests"], a["ip"]))
+    return {
+        "events": sum(r["events"] for r in results),
+        "attackers": len(attackers),
+        "attacks": sum(by_type.values()),
+        "attacksByType": dict(by_type.most_common()),
+        "rules": sorted(rules.values(), key=lambda r: r["priority"]),
+        "classifications": dict(Counter(a["classification"] for a in attackers).most_common()),
+        "analytics": aggregates.summary(now_s) if now_s else None,
+        "topAttackers": attackers[:top],
+        "shards": [
+            {k: r[k] for k in ("shard", "events", "seconds", "attacksByType")} for r in results
+        ],
+    }
+
+
+def _attack_key(line: str) -> int:
+    return int(line.partition("\t")[0])
+
+
+def merge_attack_files(parts: List[str], out_path: str) -> int:
+    """
+    k-way merge of the per-shard attack files by the log offset of the
+    request behind each attack (each file is already in that order), so
+    equal timestamps come out in log order whatever the shard count.
+    """
+    files = [open(p, "r", encoding="utf-8") for p in parts]
+    n = 0
+    try:
+        streams: List[Iterator[str]] = [iter(f) for f in files]
+        with open(out_path, "w", encoding="utf-8") as out:
+            for line in heapq.merge(*streams, key=_attack_key):
+                out.write(line.partition("\t")[2])
+                n += 1
+    finally:
+        for f in files:
+            f.close()
+        for p in parts:
+            os.remove(p)
+    return n
+
+
+def replay(
+    log: str,
+    jobs: int,
+    rules: Optional[str] = None,
+    attacks_out: Optional[str] = None,
+    top: int = 50,
+) -> Dict[str, Any]:
+    jobs = max(1, jobs)
+    specs = [
+        ShardSpec(log, k, jobs, rules, f"{attacks_out}.part{k}" if attacks_out else None) for k in range(jobs)
+    ]
+    t0 = time.perf_counter()
+    if jobs == 1:
+        results = [run_shard(specs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(run_shard, specs))
+    report = merge(results, top=top)
+    if attacks_out:
+        merge_attack_files([s.attacks_path for s in specs if s.attacks_path], attacks_out)
+    report["jobs"] = jobs
+    report["seconds"] = round(time.perf_counter() - t0, 3)
+    report["eventsPerS"] = round(report["events"] / report["seconds"]) if report["seconds"] else None
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("log", help="request log (.jsonl / .hpb) or segmented log directory")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="shards / worker processes")
+    ap.add_argument("--rules", help="module:callable returning the rules to replay (default: built-in)")
+    ap.add_argument("--attacks-out", help="write every emitted attack event here (JSONL)")
+    ap.add_argument("--top", type=int, default=50, help="attackers listed in the report")
+    ap.add_argument("--out", help="write the JSON report here (stdout otherwise)")
+    args = ap.parse_args()
+
+    report = replay(args.log, args.jobs, args.rules, args.attacks_out, args.top)
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
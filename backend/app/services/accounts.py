@@ -0,0 +1,209 @@
+"""
+Per-account login tracking (cross-IP credential stuffing).
+
+Credential stuffing that rotates source IPs never trips a per-IP rule; it
+shows up per *account*: many failed logins for one username, from many
+addresses. Usernames are attacker-chosen (millions in a spray), so
+`AccountTracker` keeps a fixed amount of memory:
+
+- Failed logins per username over a sliding window (default 10 min):
+  `WindowedCountMin` (never undercounts; see `failureErrorBound`).
+- Distinct usernames seen: one `HyperLogLog`.
+- A bounded table of the most attacked accounts (`capacity`): a username
+  is admitted when its windowed failure estimate beats the weakest tracked
+  account, which it then replaces. The weakest is found with a lazy
+  min-heap (estimates only grow until the window moves). Tracked accounts carry totals and a
+  small HyperLogLog of source IPs per window (current + previous).
+
+Estimates of tracked accounts are refreshed whenever the window moves, and
+accounts without failures left in the window are dropped.
+"""
+
+from __future__ import annotations
+
+import heapq
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.sketches import HyperLogLog, WindowedCountMin, hash64
+
+
+class AccountState:
+    __slots__ = (
+        "username",
+        "h",
+        "first_seen_s",
+        "last_seen_s",
+        "attempts",
+        "failures",
+        "successes",
+        "window_failures",
+        "flagged",
+        "epoch",
+        "sources",
+        "prev_sources",
+    )
+
+    def __init__(self, username: str, h: int, ts: float, epoch: int, source_precision: int) -> None:
+        self.username = username
+        self.h = h
+        self.first_seen_s = ts
+        self.last_seen_s = ts
+        # Totals since the account was admitted.
+        self.attempts = 0
+        self.failures = 0
+        self.successes = 0
+        # Count-min estimate of failed logins in the window.
+        self.window_failures = 0
+        # Failed logins a rule attributed to this account.
+        self.flagged = 0
+        self.epoch = epoch
+        self.sources = HyperLogLog(source_precision)
+        self.prev_sources = HyperLogLog(source_precision)
+
+    def source_count(self) -> int:
+        """Distinct source IPs over the last one to two windows."""
+        return self.sources.union(self.prev_sources).count()
+
+
+class AccountTracker:
+    def __init__(
+        self,
+        capacity: int = 2000,
+        window_s: float = 600.0,
+        buckets: int = 10,
+        width: int = 16384,
+        depth: int = 4,
+        source_precision: int = 6,
+        username_precision: int = 14,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        self.source_precision = source_precision
+        self._failures = WindowedCountMin(width, depth, buckets, window_s / max(1, buckets))
+        self._usernames = HyperLogLog(username_precision)
+        self._accounts: Dict[str, AccountState] = {}
+        # One (window_failures, last_seen_s, username) entry per tracked
+        # account; an entry may lag behind its account (fixed when on top).
+        self._heap: List[Tuple[int, float, str]] = []
+        self._observed: int = 0
+        self._admitted: int = 0
+        self._evicted: int = 0
+
+    @property
+    def window_s(self) -> float:
+        return self._failures.window_s
+
+    # -------------------------
+    # Updates
+    # -------------------------
+
+    def observe(self, username: str, ip: str, ts: float, auth_success: Optional[bool]) -> Optional[AccountState]:
+        """
+        Record one login attempt. Returns the account's state if it is
+        tracked (after this attempt), else None.
+        """
+        h = hash64(username)
+        self._usernames.add_hash(h)
+        self._observed += 1
+        if self._failures.advance(ts):
+            self._refresh(ts)
+        est = self._failures.add_hash(h, ts) if auth_success is False else None
+
+        acc = self._accounts.get(username)
+        if acc is None:
+            # Only failures compete for a slot.
+            if est is None or not self._admit(est):
+                return None
+            acc = AccountState(username, h, ts, int(ts // self.window_s), self.source_precision)
+            self._accounts[username] = acc
+            heapq.heappush(self._heap, (est, ts, username))
+            self._admitted += 1
+
+        acc.last_seen_s = max(acc.last_seen_s, ts)
+        acc.attempts += 1
+        if auth_success is False:
+            acc.failures += 1
+            acc.window_failures = est or 0
+        elif auth_success:
+            acc.successes += 1
+        epoch = int(ts // self.window_s)
+        if epoch != acc.epoch:
+            acc.prev_sources = acc.sources if epoch == acc.epoch + 1 else HyperLogLog(self.source_precision)
+            acc.sources = HyperLogLog(self.source_precision)
+            acc.epoch = epoch
+        acc.sources.add(ip)
+        return acc
+
+    def _admit(self, est: int) -> bool:
+        if len(self._accounts) < self.capacity:
+            return True
+        heap = self._heap
+        while True:
+            value, _seen, username = heap[0]
+            acc = self._accounts[username]
+            if value == acc.window_failures:
+                break
+            heapq.heapreplace(heap, (acc.window_failures, acc.last_seen_s, username))
+        if est <= value:
+            return False
+        heapq.heappop(heap)
+        del self._accounts[username]
+        self._evicted += 1
+        return True
+
+    def _refresh(self, ts: float) -> None:
+        # The window moved: estimates only go down; forget idle accounts.
+        estimate = self._failures.estimate_hash
+        for username in list(self._accounts):
+            acc = self._accounts[username]
+            acc.window_failures = estimate(acc.h)
+            if not acc.window_failures and ts - acc.last_seen_s >= self.window_s:
+                del self._accounts[username]
+        self._heap = [(a.window_failures, a.last_seen_s, u) for u, a in self._accounts.items()]
+        heapq.heapify(self._heap)
+
+    # -------------------------
+    # Reads
+    # -------------------------
+
+    def get(self, username: str) -> Optional[AccountState]:
+        return self._accounts.get(username)
+
+    def top(self, limit: int = 20) -> Dict[str, Any]:
+        """Most attacked accounts in the window (failed logins, then sources)."""
+        ranked = sorted(self._accounts.values(), key=lambda a: (-a.window_failures, a.username))[: max(1, limit)]
+        return {
+            "accounts": [
+                {
+                    "username": a.username,
+                    "failedLogins": a.window_failures,
+                    "sources": a.source_count(),
+                    "attempts": a.attempts,
+                    "failures": a.failures,
+                    "successes": a.successes,
+                    "flaggedRequests": a.flagged,
+                    "firstSeen": datetime.fromtimestamp(a.first_seen_s, timezone.utc).isoformat(),
+                    "lastSeen": datetime.fromtimestamp(a.last_seen_s, timezone.utc).isoformat(),
+                }
+                for a in ranked
+            ],
+            "windowS": self.window_s,
+            "windowFailures": self._failures.total,
+            # failedLogins overcount by at most this much (probability 1 - e^-depth).
+            "failureErrorBound": self._failures.error_bound(),
+            "distinctUsernames": self._usernames.count(),
+            "trackedAccounts": len(self._accounts),
+        }
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked": len(self._accounts),
+            "capacity": self.capacity,
+            "observed": self._observed,
+            "admitted": self._admitted,
+            "evicted": self._evicted,
+            "sketchBytes": self._failures.memory_bytes() + self._usernames.memory_bytes(),
+        }
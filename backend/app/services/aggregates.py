@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import heapq
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+_BUCKET_S = 3600  # one bucket per UTC hour
+# Endpoints are attacker-chosen paths: keys are cut, and past `max_endpoints`
+# distinct keys new ones are counted under _OTHER until old hours free room.
+_MAX_ENDPOINT_LEN = 256
+_OTHER = "(other)"
+
+
+class _HourBucket:
+    __slots__ = ("hour", "total", "types", "endpoints")
+
+    def __init__(self, hour: int) -> None:
+        self.hour = hour  # epoch hour (ts_s // 3600)
+        self.total = 0
+        self.types: Counter = Counter()
+        self.endpoints: Counter = Counter()
+
+
+class AttackAggregates:
+    """
+    Running analytics over emitted attack events.
+
+    - Events are folded into hourly buckets as they are emitted.
+    - Running totals (type distribution, per-endpoint counts, hour-of-day
+      volume) are kept alongside, so reads never walk the events.
+    - Buckets older than `retention_hours` are evicted and subtracted from
+      the running totals.
+    - At most `max_endpoints` distinct endpoints (+ "(other)") are held, so
+      memory and the cost of `summary()` are bounded.
+    """
+
+    def __init__(self, retention_hours: int = 24 * 7, max_endpoints: int = 2000) -> None:
+        self.retention_hours = max(1, retention_hours)
+        self.max_endpoints = max(1, max_endpoints)
+        self._buckets: Deque[_HourBucket] = deque()
+        self._types: Counter = Counter()
+        self._endpoints: Counter = Counter()
+        self._hour_of_day: List[int] = [0] * 24
+        self._total: int = 0
+        # Ever emitted, including evicted buckets.
+        self._all_time: int = 0
+
+    def add(self, ts_s: float, attack_type: str, endpoint: str) -> None:
+        hour = int(ts_s // _BUCKET_S)
+        bucket = self._bucket_for(hour)
+        self._all_time += 1
+        if bucket is None:
+            # Older than the retention window: counted all-time only.
+            return
+        endpoint = self._endpoint_key(endpoint)
+        bucket.total += 1
+        bucket.types[attack_type] += 1
+        bucket.endpoints[endpoint] += 1
+        self._types[attack_type] += 1
+        self._endpoints[endpoint] += 1
+        self._hour_of_day[hour % 24] += 1
+        self._total += 1
+
+    def evict(self, now_s: float) -> None:
+        """Drop buckets that fell out of the retention window ending at `now_s`."""
+        oldest_kept = int(now_s // _BUCKET_S) - self.retention_hours + 1
+        while self._buckets and self._buckets[0].hour < oldest_kept:
+            self._drop(self._buckets.popleft())
+
+    def summary(self, now_s: float, top_endpoints: int = 5) -> Dict[str, Any]:
+        self.evict(now_s)
+        # Ties broken by name, so merged (replay) and single-engine results match.
+        top = heapq.nsmallest(top_endpoints, self._endpoints.items(), key=lambda kv: (-kv[1], kv[0]))
+        return {
+            "attackTypeDistribution": [
+                {"name": k, "value": v} for k, v in sorted(self._types.items(), key=lambda kv: (-kv[1], kv[0]))
+            ],
+            "topEndpoints": [{"endpoint": k, "attacks": v} for k, v in top],
+            "hourlyAttackVolume": [
+                {"hour": f"{h:02d}:00", "attacks": self._hour_of_day[h]} for h in range(24)
+            ],
+            "totalAttacks": self._total,
+            "allTimeAttacks": self._all_time,
+            "windowHours": self.retention_hours,
+        }
+
+    def merge(self, other: "AttackAggregates") -> None:
+        """
+        Fold in another instance (e.g. one per replay shard). Buckets are
+        merged hour by hour; the result is the same as one instance that
+        saw both event streams (within this instance's retention).
+        """
+        for b in other._buckets:
+            bucket = self._bucket_for(b.hour)
+            if bucket is None:
+                continue
+            bucket.total += b.total
+            bucket.types.update(b.types)
+            self._types.update(b.types)
+            for endpoint, n in b.endpoints.items():
+                endpoint = self._endpoint_key(endpoint)
+                bucket.endpoints[endpoint] += n
+                self._endpoints[endpoint] += n
+            self._hour_of_day[b.hour % 24] += b.total
+            self._total += b.total
+        self._all_time += other._all_time
+
+    # -------------------------
+    # Helpers
+    # -------------------------
+
+    def _endpoint_key(self, endpoint: str) -> str:
+        endpoint = endpoint[:_MAX_ENDPOINT_LEN]
+        if endpoint in self._endpoints or len(self._endpoints) < self.max_endpoints:
+            return endpoint
+        return _OTHER
+
+    def _bucket_for(self, hour: int) -> Optional[_HourBucket]:
+        buckets = self._buckets
+        if not buckets or hour > buckets[-1].hour:
+            buckets.append(_HourBucket(hour))
+            self.evict(hour * _BUCKET_S)
+            return buckets[-1]
+        # Late event (replay / clock skew): find its bucket, newest first.
+        for b in reversed(buckets):
+            if b.hour == hour:
+                return b
+            if b.hour < hour:
+                break
+        if hour <= buckets[-1].hour - self.retention_hours:
+            return None
+        # Inside the window but its hour has no bucket yet: insert in order.
+        idx = next(i for i, b in enumerate(buckets) if b.hour > hour)
+        bucket = _HourBucket(hour)
+        buckets.insert(idx, bucket)
+        return bucket
+
+    def _drop(self, bucket: _HourBucket) -> None:
+        self._types.subtract(bucket.types)
+        self._endpoints.subtract(bucket.endpoints)
+        for k in bucket.types:
+            if self._types[k] <= 0:
+                del self._types[k]
+        for k in bucket.endpoints:
+            if self._endpoints[k] <= 0:
+                del self._endpoints[k]
+        self._hour_of_day[bucket.hour % 24] -= bucket.total
+        self._total -= bucket.total
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Compact snapshot form: plain tuples/dicts instead of bucket objects.
+        return {
+            "retention_hours": self.retention_hours,
+            "max_endpoints": self.max_endpoints,
+            "buckets": [(b.hour, b.total, dict(b.types), dict(b.endpoints)) for b in self._buckets],
+            "all_time": self._all_time,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["retention_hours"], state.get("max_endpoints", 2000))
+        for hour, total, types, endpoints in state["buckets"]:
+            b = _HourBucket(hour)
+            b.total = total
+            b.types.update(types)
+            b.endpoints.update(endpoints)
+            self._buckets.append(b)
+            self._types.update(types)
+            self._endpoints.update(endpoints)
+            self._hour_of_day[hour % 24] += total
+            self._total += total
+        self._all_time = state["all_time"]
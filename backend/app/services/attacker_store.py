@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import dbm
+import os
+import pickle
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+def _deep_size(obj: Any, _depth: int = 0) -> int:
+    """Approximate retained size of an AttackerState (object + owned containers)."""
+    size = sys.getsizeof(obj)
+    if _depth > 3:
+        return size
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += sys.getsizeof(k) + _deep_size(v, _depth + 1)
+        return size
+    for name in getattr(type(obj), "__slots__", ()):
+        value = getattr(obj, name, None)
+        if isinstance(value, (array, dict)) or hasattr(type(value), "__slots__"):
+            size += _deep_size(value, _depth + 1)
+        elif isinstance(value, str):
+            size += sys.getsizeof(value)
+    return size
+
+
+class AttackerStore:
+    """
+    Capacity-bounded attacker table.
+
+    - LRU order: every hit moves the IP to the back; the front is evicted
+      once `capacity` is exceeded.
+    - Idle TTL: IPs not seen for `idle_ttl_s` (event time) are dropped by
+      `expire()`, which only looks at the LRU front.
+    - Optional spill: states evicted for capacity are written to a dbm file
+      (compact tuples) and rehydrated transparently on the next `get()`.
+      Spilled states that went idle past the TTL are pruned when the file
+      is walked for a snapshot (`spilled_compact(now_s)`). The file is
+      scratch space for this process: it is emptied when first opened and
+      on `clear()`, since the state is rebuilt from snapshot + log (which
+      carries the spilled states too, see `spilled_compact()`).
+    - `on_drop(ip)` is called for every state that leaves for good (expired,
+      pruned, or evicted and not spilled), so owners can free what they keep
+      per IP.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 100000,
+        idle_ttl_s: Optional[float] = 6 * 3600,
+        spill_path: Optional[str] = None,
+        encode: Optional[Callable[[Any], Tuple[Any, ...]]] = None,
+        decode: Optional[Callable[[Tuple[Any, ...]], Any]] = None,
+        on_drop: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        self.idle_ttl_s = idle_ttl_s
+        self.spill_path = spill_path
+        self._encode = encode
+        self._decode = decode
+        self._on_drop = on_drop
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._spill = None
+        self._spill_opened: bool = False
+
+        self._evicted_lru: int = 0
+        self._evicted_ttl: int = 0
+        self._spilled: int = 0
+        self._rehydrated: int = 0
+        self._spill_errors: int = 0
+
+    # -------------------------
+    # Mapping-style access
+    # -------------------------
+
+    def get(self, ip: str) -> Optional[Any]:
+        """Lookup for ingestion: promotes the IP and rehydrates spilled state."""
+        st = self._items.get(ip)
+        if st is not None:
+            self._items.move_to_end(ip)
+            return st
+        st = self._load_spilled(ip, remove=True)
+        if st is not None:
+            self._rehydrated += 1
+            self.put(ip, st)
+        return st
+
+    def peek(self, ip: str) -> Optional[Any]:
+        """Read-only lookup for dashboards: no LRU promotion, no re-insert."""
+        st = self._items.get(ip)
+        if st is not None:
+            return st
+        return self._load_spilled(ip, remove=False)
+
+    def put(self, ip: str, st: Any) -> None:
+        self._items[ip] = st
+        self._items.move_to_end(ip)
+        while len(self._items) > self.capacity:
+            old_ip, old_st = self._items.popitem(last=False)
+            self._evicted_lru += 1
+            self._evict(old_ip, old_st)
+
+    def expire(self, now_s: float) -> int:
+        """Evict IPs idle for longer than the TTL. Returns how many were evicted."""
+        if self.idle_ttl_s is None:
+            return 0
+        threshold = now_s - self.idle_ttl_s
+        evicted = 0
+        items = self._items
+        while items:
+            ip, st = next(iter(items.items()))
+            if st.last_seen_s >= threshold:
+                break
+            del items[ip]
+            self._drop(ip)
+            evicted += 1
+        self._evicted_ttl += evicted
+        return evicted
+
+    def clear(self) -> None:
+        self._items.clear()
+        if self.spill_path:
+            self.close()
+            self._spill_opened = False  # reopened empty
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self._items
+
+    def values(self) -> Iterator[Any]:
+        return iter(self._items.values())
+
+    # -------------------------
+    # Spill file
+    # -------------------------
+
+    def _open_spill(self):
+        if self._spill is None and self.spill_path:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            # "n" the first time: never trust states left by a previous run.
+            self._spill = dbm.open(self.spill_path, "c" if self._spill_opened else "n")
+            self._spill_opened = True
+        return self._spill
+
+    def _evict(self, ip: str, st: Any) -> None:
+        if not self._spill_out(ip, st):
+            self._drop(ip)
+
+    def _drop(self, ip: str) -> None:
+        if self._on_drop is not None:
+            self._on_drop(ip)
+
+    def _spill_out(self, ip: str, st: Any) -> bool:
+        if not self.spill_path or self._encode is None:
+            return False
+        try:
+            self._open_spill()[ip] = pickle.dumps(self._encode(st), protocol=pickle.HIGHEST_PROTOCOL)
+            self._spilled += 1
+            return True
+        except Exception:
+            self._spill_errors += 1
+            return False
+
+    def _load_spilled(self, ip: str, remove: bool) -> Optional[Any]:
+        if not self.spill_path or self._decode is None:
+            return None
+        try:
+            db = self._open_spill()
+            raw = db.get(ip)
+            if raw is None:
+                return None
+            if remove:
+                del db[ip]
+            return self._decode(pickle.loads(raw))
+        except Exception:
+            self._spill_errors += 1
+            return None
+
+    def spilled_compact(self, now_s: Optional[float] = None) -> Iterator[Tuple[Any, ...]]:
+        """
+        Compact tuples of the spilled states (for snapshots). With `now_s`,
+        states idle past the TTL are deleted from the file instead.
+        """
+        if not self.spill_path or not self._spill_opened:
+            return
+        threshold = None
+        if now_s is not None and self.idle_ttl_s is not None and self._decode is not None:
+            threshold = now_s - self.idle_ttl_s
+        db = self._open_spill()
+        for key in db.keys():
+            try:
+                t = pickle.loads(db[key])
+                if threshold is not None and self._decode(t).last_seen_s < threshold:
+                    del db[key]
+                    self._evicted_ttl += 1
+                    self._drop(key.decode("utf-8", "surrogatepass") if isinstance(key, bytes) else key)
+                    continue
+            except Exception:
+                self._spill_errors += 1
+                continue
+            yield t
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    # -------------------------
+    # Introspection
+    # -------------------------
+
+    def stats(self, sample: int = 200) -> Dict[str, Any]:
+        n = len(self._items)
+        per_attacker = 0
+        if n:
+            sizes = [_deep_size(st) for _, st in zip(range(sample), reversed(self._items.values()))]
+            per_attacker = sum(sizes) // len(sizes)
+        return {
+            "attackers": n,
+            "capacity": self.capacity,
+            "idleTtlS": self.idle_ttl_s,
+            "bytesPerAttacker": per_attacker,
+            "estimatedBytes": per_attacker * n,
+            "evictedLru": self._evicted_lru,
+            "evictedTtl": self._evicted_ttl,
+            "spilled": self._spilled,
+            "rehydrated": self._rehydrated,
+            "spillErrors": self._spill_errors,
+        }
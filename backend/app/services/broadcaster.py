@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+
+class Subscriber:
+    """
+    One connected client: a bounded buffer plus a wake-up event.
+
+    When the buffer is full the *oldest* pending event is dropped (the
+    client is behind anyway) and counted; the stream tells the client how
+    many it missed before the next event.
+    """
+
+    __slots__ = ("buffer", "dropped", "_pending_drops", "_wakeup")
+
+    def __init__(self, size: int) -> None:
+        self.buffer: Deque[Tuple[str, Dict[str, Any]]] = deque(maxlen=max(1, size))
+        self.dropped: int = 0
+        self._pending_drops: int = 0
+        self._wakeup = asyncio.Event()
+
+    def push(self, item: Tuple[str, Dict[str, Any]]) -> None:
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+            self._pending_drops += 1
+        self.buffer.append(item)
+        self._wakeup.set()
+
+
+class AttackBroadcaster:
+    """
+    Fan-out of newly emitted attack events to streaming clients (SSE).
+
+    - `publish()` is called by the engine for every emitted event; it costs
+      one append per subscriber, independent of how many events clients
+      already have.
+    - Event ids are `<boot id>:<sequence>`. A client reconnecting with
+      `Last-Event-ID` gets what it missed from the `history` ring; an id
+      from another process (or older than the ring) replays the whole ring.
+    - Must be used from the event loop thread. (Boot-time replay runs in a
+      thread, but before any client can subscribe.)
+    """
+
+    def __init__(self, history: int = 1000, subscriber_buffer: int = 256) -> None:
+        self.subscriber_buffer = subscriber_buffer
+        self._boot = uuid.uuid4().hex[:8]
+        self._seq: int = 0
+        self._history: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=max(1, history))
+        self._subscribers: Set[Subscriber] = set()
+
+        self._published: int = 0
+        self._resumed: int = 0
+        self._dropped_closed: int = 0
+
+    # -------------------------
+    # Producer side
+    # -------------------------
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self._seq += 1
+        self._published += 1
+        self._history.append((self._seq, event))
+        if self._subscribers:
+            item = (self._event_id(self._seq), event)
+            for sub in self._subscribers:
+                sub.push(item)
+
+    def _event_id(self, seq: int) -> str:
+        return f"{self._boot}:{seq}"
+
+    # -------------------------
+    # Consumer side
+    # -------------------------
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscriber:
+        sub = Subscriber(self.subscriber_buffer)
+        if last_event_id:
+            for seq, event in self._missed_since(last_event_id):
+                sub.push((self._event_id(seq), event))
+            self._resumed += 1
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        if sub in self._subscribers:
+            self._subscribers.discard(sub)
+            self._dropped_closed += sub.dropped
+
+    def _missed_since(self, last_event_id: str) -> List[Tuple[int, Dict[str, Any]]]:
+        boot, _, raw_seq = last_event_id.partition(":")
+        try:
+            seq = int(raw_seq)
+        except ValueError:
+            seq = -1
+        if boot != self._boot or seq < 0:
+            return list(self._history)
+        return [(s, ev) for s, ev in self._history if s > seq]
+
+    async def events(
+        self, last_event_id: Optional[str] = None, heartbeat_s: float = 15.0
+    ) -> AsyncIterator[Tuple[str, Any, Optional[Dict[str, Any]]]]:
+        """
+        Raw feed for one client: `("attack", event_id, event)`,
+        `("dropped", count, None)` and `("heartbeat", None, None)` items.
+
+        Subscribes on first iteration, so a consumer that never starts
+        never leaks a subscriber.
+        """
+        sub = self.subscribe(last_event_id)
+        try:
+            while True:
+                if not sub.buffer:
+                    sub._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(sub._wakeup.wait(), heartbeat_s)
+                    except asyncio.TimeoutError:
+                        yield "heartbeat", None, None
+                        continue
+                if sub._pending_drops:
+                    yield "dropped", sub._pending_drops, None
+                    sub._pending_drops = 0
+                while sub.buffer:
+                    event_id, event = sub.buffer.popleft()
+                    yield "attack", event_id, event
+        finally:
+            self.unsubscribe(sub)
+
+    def stream(self, last_event_id: Optional[str] = None, heartbeat_s: float = 15.0) -> AsyncIterator[str]:
+        """Server-sent events for one client; heartbeats keep proxies from timing out."""
+        return sse_encode(self.events(last_event_id, heartbeat_s))
+
+    # -------------------------
+    # Introspection
+    # -------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        subs = list(self._subscribers)
+        return {
+            "subscribers": len(subs),
+            "published": self._published,
+            "lastEventId": self._event_id(self._seq) if self._seq else None,
+            "historySize": len(self._history),
+            "subscriberBuffer": self.subscriber_buffer,
+            "resumes": self._resumed,
+            "droppedEvents": self._dropped_closed + sum(s.dropped for s in subs),
+            "maxSubscriberBacklog": max((len(s.buffer) for s in subs), default=0),
+        }
+
+
+async def sse_encode(items: AsyncIterator[Tuple[str, Any, Optional[Dict[str, Any]]]]) -> AsyncIterator[str]:
+    """
+    Format `AttackBroadcaster.events()`-style items as server-sent events.
+    Closes `items` when the client goes away (async generators are not
+    finalized promptly on their own).
+    """
+    try:
+        async for kind, value, event in items:
+            if kind == "attack":
+                yield f"id: {value}\nevent: attack\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            elif kind == "dropped":
+                yield f"event: dropped\ndata: {json.dumps({'dropped': value})}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+    finally:
+        await items.aclose()  # type: ignore[attr-defined]
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
-import json
-import os
-import re
+import itertools
+import pickle
 import time
+import uuid
 from collections import Counter, deque
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from app.core.log_reader import LogRecord, read_log
+from app.core.metrics import REGISTRY
+from app.services.accounts import AccountState, AccountTracker
+from app.services.aggregates import AttackAggregates
+from app.services.attacker_store import AttackerStore
+from app.services.event_index import AttackEventIndex
+from app.services.geoip import GeoIPIndex
+from app.services.rules import Rule, RuleContext, RuleIndex, default_rules
+from app.services.sketches import SpaceSaving
+from app.services.subnets import SubnetTrie
+from app.services.windows import MultiResolutionSeries, SlidingWindowCounter
 
 
 # Frontend expects these enums (from mockData.ts)
@@ -37,19 +49,53 @@ def _risk_level(score: int) -> RiskLevel:
     return "LOW"
 
 
-_RE_USER_ID = re.compile(r"^/api/users/(\d+)$")
+
+# Bump whenever the shape of the engine state changes; snapshots written with
+# another version are ignored and the engine falls back to a cold replay.
+SNAPSHOT_VERSION = 11
+
+
+# Layout version of `AttackerState.to_compact()` (spill files outlive processes).
+_COMPACT_FORMAT = 5
+
+# Rule windows: 60 x 1s buckets for rates, 10 x 1min buckets for classification.
+_RATE_BUCKETS, _RATE_BUCKET_S = 60, 1.0
+_CLASSIFY_BUCKETS, _CLASSIFY_BUCKET_S = 10, 60.0
+# Day buckets kept per attacker for the profile's daily view.
+_SERIES_DAYS = 90
+
+# Streams with a heavy-hitter summary; keys are cut to bound their memory.
+HEAVY_HITTER_DIMENSIONS = ("ips", "userAgents", "endpoints", "attackTypes")
+_HEAVY_HITTER_KEY_MAX = 256
+
+
+_EVENT_SECONDS = REGISTRY.histogram(
+    "honeypot_process_event_seconds", "Time spent in DetectionEngine.process_request_event."
+)
+_ATTACK_EVENTS = REGISTRY.counter("honeypot_attack_events_total", "Attack events emitted.", ("attack_type",))
+
+
+def _rate_window() -> SlidingWindowCounter:
+    return SlidingWindowCounter(_RATE_BUCKETS, _RATE_BUCKET_S)
+
+
+def _request_series() -> MultiResolutionSeries:
+    return MultiResolutionSeries(days=_SERIES_DAYS)
 
 
-@dataclass
+@dataclass(slots=True)
 class AttackerState:
     ip: str
-    first_seen: datetime
-    last_seen: datetime
+    # Epoch seconds (floats are far smaller than datetime objects).
+    first_seen_s: float
+    last_seen_s: float
     total_requests: int = 0
 
-    # Rolling windows (timestamps in epoch seconds).
-    recent_requests_s: Deque[float] = field(default_factory=lambda: deque(maxlen=5000))
-    recent_failed_logins_s: Deque[float] = field(default_factory=lambda: deque(maxlen=5000))
+    # Rolling windows (fixed-size bucketed counters, last 60 seconds).
+    requests_60s: SlidingWindowCounter = field(default_factory=_rate_window)
+    failed_logins_60s: SlidingWindowCounter = field(default_factory=_rate_window)
+    # Request volume for profile charts (minute / hour / day buckets).
+    request_series: MultiResolutionSeries = field(default_factory=_request_series)
 
     # IDOR enumeration tracking.
     last_user_id: Optional[int] = None
@@ -62,8 +108,69 @@ class AttackerState:
     behavior_counts: Counter = field(default_factory=Counter)  # keys: AttackType
     recon_hits: int = 0
     brute_force_emits: int = 0
-    # Recent emitted attack types for classification (ts_s, attackType)
-    recent_attack_types: Deque[Tuple[float, str]] = field(default_factory=lambda: deque(maxlen=2000))
+    # Recent emitted attack types for classification (last 10 minutes), per type.
+    recent_attack_types: Dict[str, SlidingWindowCounter] = field(default_factory=dict)
+
+    # Offline GeoIP / ASN enrichment, resolved once when the state is created.
+    country: str = "Unknown"
+    asn: Optional[int] = None
+    isp: str = "Unknown"
+
+    # Engine version at this IP's last event (response cache key).
+    version: int = 0
+
+    @property
+    def first_seen(self) -> datetime:
+        return datetime.fromtimestamp(self.first_seen_s, timezone.utc)
+
+    @property
+    def last_seen(self) -> datetime:
+        return datetime.fromtimestamp(self.last_seen_s, timezone.utc)
+
+    def to_compact(self) -> Tuple[Any, ...]:
+        """Flat tuple of primitives (fast to pickle) for snapshots and spill files."""
+        return (
+            _COMPACT_FORMAT,
+            self.ip,
+            self.first_seen_s,
+            self.last_seen_s,
+            self.total_requests,
+            self.requests_60s.to_compact(),
+            self.failed_logins_60s.to_compact(),
+            self.last_user_id,
+            self.sequential_id_hits,
+            dict(self.endpoint_counts),
+            self.risk_score,
+            dict(self.behavior_counts),
+            self.recon_hits,
+            self.brute_force_emits,
+            {k: w.to_compact() for k, w in self.recent_attack_types.items()},
+            self.request_series.to_compact(),
+            self.country,
+            self.asn,
+            self.isp,
+            self.version,
+        )
+
+    @classmethod
+    def from_compact(cls, t: Tuple[Any, ...]) -> "AttackerState":
+        if t[0] != _COMPACT_FORMAT:
+            raise ValueError(f"unsupported AttackerState format {t[0]!r}")
+        st = cls(ip=t[1], first_seen_s=t[2], last_seen_s=t[3], total_requests=t[4])
+        st.requests_60s = SlidingWindowCounter.from_compact(t[5])
+        st.failed_logins_60s = SlidingWindowCounter.from_compact(t[6])
+        st.last_user_id = t[7]
+        st.sequential_id_hits = t[8]
+        st.endpoint_counts.update(t[9])
+        st.risk_score = t[10]
+        st.behavior_counts.update(t[11])
+        st.recon_hits = t[12]
+        st.brute_force_emits = t[13]
+        st.recent_attack_types = {k: SlidingWindowCounter.from_compact(w) for k, w in t[14].items()}
+        st.request_series = MultiResolutionSeries.from_compact(t[15])
+        st.country, st.asn, st.isp = t[16], t[17], t[18]
+        st.version = t[19]
+        return st
 
 
 class DetectionEngine:
@@ -74,24 +181,104 @@ class DetectionEngine:
     "attack events" the frontend can display.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        dedupe_window: int = 50000,
+        analytics_retention_hours: int = 24 * 7,
+        timeline_per_ip: int = 50,
+        timeline_max_events: int = 100000,
+        max_attackers: int = 100000,
+        attacker_idle_ttl_s: Optional[float] = 6 * 3600,
+        attacker_spill_path: Optional[str] = None,
+        rules: Optional[List[Rule]] = None,
+        clock: Optional[Callable[[], float]] = None,
+        geoip: Optional[GeoIPIndex] = None,
+        subnets: Optional[SubnetTrie] = None,
+        accounts: Optional[AccountTracker] = None,
+        top_k: int = 100,
+        metrics: bool = True,
+    ) -> None:
+        # "Now" in epoch seconds for reads (classification, profiles,
+        # analytics windows). Offline replay swaps in event time so results
+        # do not depend on when the replay runs.
+        self.clock: Callable[[], float] = clock or time.time
+        # Whether to record into the process-wide metrics registry (off for
+        # private engines, e.g. history compaction, so nothing counts twice).
+        self._metrics = metrics
         self._attack_events: Deque[Dict[str, Any]] = deque(maxlen=500)
-        self._attackers: Dict[str, AttackerState] = {}
+        self._attack_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # Per-IP rings for attacker timelines (independent of the global feed).
+        self._event_index = AttackEventIndex(per_ip=timeline_per_ip, max_events=timeline_max_events)
+        # Running analytics, updated in `_emit` (not limited to the 500 above).
+        self._aggregates = AttackAggregates(retention_hours=analytics_retention_hours)
+        # Bounded attacker table (LRU + idle TTL, optional spill to disk).
+        self._attackers = AttackerStore(
+            capacity=max_attackers,
+            idle_ttl_s=attacker_idle_ttl_s,
+            spill_path=attacker_spill_path,
+            encode=AttackerState.to_compact,
+            decode=AttackerState.from_compact,
+            # Forgotten attackers take their timeline with them (looked up
+            # late: `load_state` replaces the index).
+            on_drop=lambda ip: self._event_index.drop(ip),
+        )
+        self._last_expire_s: float = 0.0
+        # Bumped on every ingested event; with the boot id, keys cached
+        # responses (`analytics_version`, `attacker_version`).
+        self._version: int = 0
+        self._boot = uuid.uuid4().hex[:8]
+        # Country / ASN lookups for new attackers (None: "Unknown"). May be
+        # set after construction (the database loads in the background).
+        self.geoip: Optional[GeoIPIndex] = geoip
+        # Decayed per-prefix counters (/24, /64, ...) for distributed attacks.
+        self._subnets: SubnetTrie = subnets if subnets is not None else SubnetTrie()
+        # Login usernames (fixed-memory sketches) for cross-IP credential stuffing.
+        self._accounts: AccountTracker = accounts if accounts is not None else AccountTracker()
+        # Heavy hitters over all traffic (Space-Saving, `top_k` counters each).
+        self._heavy_hitters: Dict[str, SpaceSaving] = {name: SpaceSaving(top_k) for name in HEAVY_HITTER_DIMENSIONS}
+        # Detection rules, dispatched by endpoint/method.
+        self._rules = RuleIndex(rules if rules is not None else default_rules())
+        # Byte offset in the request log up to which events have been ingested.
         self._file_pos: int = 0
         self._last_tail_ts: float = 0.0
+        # Event time of the last processed event and average bytes per event
+        # on disk (both only feed `ingestion_lag`).
+        self._last_event_s: float = 0.0
+        self._bytes_per_event: float = 0.0
+
+        # Recently ingested request_ids, so an event reaching the engine twice
+        # (live batch + replay of the same log range) is only counted once.
+        self._seen_ids: set = set()
+        self._seen_order: Deque[str] = deque()
+        self._dedupe_window = max(1, dedupe_window)
+        # Set while a snapshot is taken piece by piece (`export_parts`):
+        # live batches and tailer records are queued, in arrival order, and
+        # processed on `resume_ingest()` (see `pause_ingest`).
+        self.ingest_paused: bool = False
+        self._paused_work: Deque[Tuple[Callable[..., int], Tuple[Any, ...]]] = deque()
+        self._duplicates: int = 0
+        self._offset_gaps: int = 0
 
     # -------------------------
     # Public API used by routes
     # -------------------------
 
     def get_recent_attacks(self, limit: int = 50) -> List[Dict[str, Any]]:
-        items = list(self._attack_events)
-        return list(reversed(items[-max(1, limit) :]))
+        # Newest first, touching only `limit` items (not a copy of the deque).
+        return list(itertools.islice(reversed(self._attack_events), max(1, limit)))
+
+    def register_rule(self, rule: Rule) -> None:
+        self._rules.register(rule)
+
+    def add_attack_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Called with every newly emitted attack event (e.g. the SSE broadcaster)."""
+        self._attack_listeners.append(listener)
 
     def get_attacker_profile(self, ip: str) -> Dict[str, Any]:
-        st = self._attackers.get(ip)
-        now = _utc_now()
+        st = self._attackers.peek(ip)
+        now = datetime.fromtimestamp(self.clock(), timezone.utc)
         if not st:
+            country, asn, isp = self.geoip.lookup(ip) if self.geoip is not None else ("Unknown", None, "Unknown")
             return {
                 "ip": ip,
                 "riskScore": 0,
@@ -100,14 +287,18 @@ class DetectionEngine:
                 "lastSeen": now.isoformat(),
                 "totalRequests": 0,
                 "requestsPerMinute": [0] * 60,
+                "requestsPerHour": [0] * (24 * 7),
+                "requestsPerDay": [0] * _SERIES_DAYS,
                 "attackTimeline": [],
                 "targetedEndpoints": [],
-                "country": "Unknown",
-                "isp": "Unknown",
+                "country": country,
+                "asn": asn,
+                "isp": isp,
             }
 
         classification = self._classify(st)
         rpm = self._requests_per_minute(st, now)
+        now_s = now.timestamp()
         timeline = self._timeline_for_ip(ip, limit=20)
         targeted = [
             {"endpoint": ep, "count": count}
@@ -122,181 +313,504 @@ class DetectionEngine:
             "lastSeen": st.last_seen.isoformat(),
             "totalRequests": st.total_requests,
             "requestsPerMinute": rpm,
+            "requestsPerHour": st.request_series.hours.series(now_s),
+            "requestsPerDay": st.request_series.days.series(now_s),
             "attackTimeline": timeline,
             "targetedEndpoints": targeted,
-            "country": "Unknown",
-            "isp": "Unknown",
+            "country": st.country,
+            "asn": st.asn,
+            "isp": st.isp,
         }
 
     def get_analytics(self) -> Dict[str, Any]:
-        dist = Counter()
-        ep_counts = Counter()
-        hourly = {h: 0 for h in range(24)}
+        """
+        Served from running aggregates: cost does not depend on how many
+        events were seen, and totals cover the whole retention window.
+        """
+        return self._aggregates.summary(self.clock())
+
+    def analytics_version(self) -> Tuple[Any, ...]:
+        """Changes whenever `get_analytics()` may (new events, retention moving hourly)."""
+        return (self._boot, self._version, int(self.clock() // 3600))
+
+    def attacker_version(self, ip: str) -> Tuple[Any, ...]:
+        """
+        Changes whenever `get_attacker_profile(ip)` may: events of `ip`,
+        timelines dropped by the global budget, and the minute (per-minute
+        series, classification windows; "now" to the second for unknown IPs).
+        """
+        st = self._attackers.peek(ip)
+        now_s = self.clock()
+        if st is None:
+            return (self._boot, 0, int(now_s))
+        return (self._boot, st.version, self._event_index.evicted_ips, int(now_s // 60))
+
+    def get_subnet_profile(self, cidr: str) -> Optional[Dict[str, Any]]:
+        """
+        Decayed counters of a tracked prefix ("203.0.113.0/24", at one of the
+        configured lengths) and its busiest sub-prefixes; None if unknown.
+        """
+        node = self._subnets.find(cidr)
+        return self._subnets.profile(node, self.clock()) if node is not None else None
+
+    def get_hot_subnets(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return self._subnets.hottest(self.clock(), max(1, limit))
+
+    @property
+    def subnets(self) -> SubnetTrie:
+        return self._subnets
+
+    def get_targeted_accounts(self, limit: int = 20) -> Dict[str, Any]:
+        """Accounts with the most failed logins in the tracker's window, with sketch error bounds."""
+        return self._accounts.top(limit)
+
+    def get_heavy_hitters(self, limit: int = 20) -> Dict[str, Any]:
+        """
+        Most frequent source IPs, user agents and endpoints (all requests)
+        and attack types (emitted attacks) since start, with error bounds.
+        """
+        return {name: top.summary(max(1, limit)) for name, top in self._heavy_hitters.items()}
+
+    def track_account(self, e: Dict[str, Any], ts_s: Optional[float] = None) -> Optional[AccountState]:
+        """
+        Feed a login event's username to the account tracker (also used on
+        its own by sharded replay, where every shard must see every login).
+        """
+        if ts_s is None:
+            ts_s = _parse_ts(e.get("timestamp")).timestamp()
+        return self._accounts.observe(
+            str(e.get("username")), str(e.get("ip") or "unknown"), ts_s, e.get("auth_success", None)
+        )
+
+    def attackers_report(self) -> List[Dict[str, Any]]:
+        """
+        One row per attacker in memory, classified as of its own last
+        request (offline replay / backtests; not bounded, not for routes).
+        """
+        rows = []
+        for st in self._attackers.values():
+            rows.append(
+                {
+                    "ip": st.ip,
+                    "classification": self._classify(st, now_s=st.last_seen_s),
+                    "riskScore": max(0, min(100, st.risk_score)),
+                    "firstSeen": st.first_seen.isoformat(),
+                    "lastSeen": st.last_seen.isoformat(),
+                    "totalRequests": st.total_requests,
+                    "attacks": dict(st.behavior_counts),
+                }
+            )
+        return rows
+
+    @property
+    def aggregates(self) -> AttackAggregates:
+        return self._aggregates
+
+    @property
+    def last_event_s(self) -> float:
+        """Event time of the newest processed event (0.0 before the first)."""
+        return self._last_event_s
+
+    # -------------------------
+    # Snapshots
+    # -------------------------
+
+    # Everything needed to resume exactly where the snapshot left off,
+    # including the log offset the state covers.
+    _SNAPSHOT_FIELDS: Tuple[str, ...] = (
+        "_attack_events",
+        "_aggregates",
+        "_event_index",
+        "_attackers",
+        "_subnets",
+        "_accounts",
+        "_heavy_hitters",
+        "_version",
+        "_file_pos",
+        "_seen_ids",
+        "_seen_order",
+        "_duplicates",
+        "_offset_gaps",
+    )
+
+    def export_state(self) -> Dict[str, Any]:
+        # Attackers dominate the state; store them as flat tuples. Spilled
+        # ones first (least recent), so a restore spills them again; idle
+        # ones are pruned from the spill file on the way (before the
+        # timelines are taken, which lose their rings).
+        attackers = list(self._attackers.spilled_compact(self._last_event_s))
+        attackers.extend(st.to_compact() for st in self._attackers.values())
+        state = {name: getattr(self, name) for name in self._SNAPSHOT_FIELDS}
+        state["_attackers"] = attackers
+        state["version"] = SNAPSHOT_VERSION
+        return state
+
+    def export_parts(self, chunk_size: int = 500) -> Iterator[Tuple[str, bytes]]:
+        """
+        `export_state()` pickled piece by piece as (name, bytes): one piece
+        per field, except attackers (`chunk_size` compact states per piece)
+        and timelines (rings of about 10 * `chunk_size` events). Callers may
+        yield to the event loop between pieces; with ingestion paused
+        (`pause_ingest`), all pieces describe the same log offset. See `state_from_parts`.
+        """
+        dumps = pickle.dumps
+        # Attackers first: walking the spill file prunes idle states, and
+        # their timeline rings with them (see `export_state`).
+        compact = itertools.chain(
+            self._attackers.spilled_compact(self._last_event_s),
+            (st.to_compact() for st in list(self._attackers.values())),
+        )
+        while True:
+            chunk = list(itertools.islice(compact, chunk_size))
+            if not chunk:
+                break
+            yield "_attackers", dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL)
+        for name in self._SNAPSHOT_FIELDS:
+            if name == "_attackers":
+                continue
+            if name == "_event_index":
+                yield name, dumps(self._event_index.empty_copy(), protocol=pickle.HIGHEST_PROTOCOL)
+                for rings in self._event_index.chunks(10 * chunk_size):
+                    yield "_event_index_rings", dumps(rings, protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                yield name, dumps(getattr(self, name), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def state_from_parts(parts: Iterable[Tuple[str, bytes]]) -> Dict[str, Any]:
+        """`export_state()`-shaped dict (without "version") from `export_parts()` pieces."""
+        state: Dict[str, Any] = {"_attackers": []}
+        for name, raw in parts:
+            value = pickle.loads(raw)
+            if name == "_attackers":
+                state["_attackers"].extend(value)
+            elif name == "_event_index_rings":
+                state["_event_index"].extend(value)
+            else:
+                state[name] = value
+        return state
+
+    def load_state(self, state: Dict[str, Any]) -> bool:
+        """Restore from `export_state()` output. Returns False if incompatible."""
+        if state.get("version") != SNAPSHOT_VERSION:
+            return False
+        if any(name not in state for name in self._SNAPSHOT_FIELDS):
+            return False
+        for name in self._SNAPSHOT_FIELDS:
+            if name == "_attackers":
+                self._attackers.clear()
+                for t in state[name]:
+                    st = AttackerState.from_compact(t)
+                    self._attackers.put(st.ip, st)
+            else:
+                setattr(self, name, state[name])
+        return True
+
+    def close(self) -> None:
+        self._attackers.close()
+
+    @property
+    def log_offset(self) -> int:
+        return self._file_pos
 
-        for ev in self._attack_events:
-            dist[ev.get("attackType", "API Abuse")] += 1
-            ep_counts[ev.get("targetEndpoint", "")] += 1
-            ts = _parse_ts(ev.get("timestamp"))
-            hourly[ts.hour] = hourly.get(ts.hour, 0) + 1
+    @property
+    def attacker_count(self) -> int:
+        return len(self._attackers)
 
+    def ingestion_stats(self) -> Dict[str, Any]:
         return {
-            "attackTypeDistribution": [
-                {"name": k, "value": v} for k, v in dist.most_common()
-            ],
-            "topEndpoints": [
-                {"endpoint": k, "attacks": v} for k, v in ep_counts.most_common(5)
-            ],
-            "hourlyAttackVolume": [
-                {"hour": f"{h:02d}:00", "attacks": hourly.get(h, 0)} for h in range(24)
-            ],
+            "logOffset": self._file_pos,
+            "duplicatesSkipped": self._duplicates,
+            "offsetGaps": self._offset_gaps,
+            "attackers": self._attackers.stats(),
+            "timelineIndex": self._event_index.stats(),
+            "rules": self._rules.stats(),
+            "subnets": self._subnets.stats(),
+            "accounts": self._accounts.stats(),
         }
 
     # -------------------------
     # Tailing / ingestion
     # -------------------------
 
-    def tail_once(self, log_path: str) -> int:
+    def tail_once(self, source: Union[str, Any], max_events: Optional[int] = None) -> int:
+        """
+        Read and process log records since the last position.
+        Returns number of processed events.
+
+        `source` is a JSONL path, a binary `.hpb` path or a `SegmentedLog`.
+        Used for catch-up at startup; at runtime the background `LogTailer`
+        reads in a worker thread and hands records to `apply_records`.
+        A trailing JSONL line without a newline is still being written and
+        is left for the next call.
+        """
+        records = read_log(source, self._file_pos)
+        if max_events is not None:
+            records = itertools.islice(records, max_events)
+        return self.apply_records(records)
+
+    def tail_store(self, store: Any) -> int:
+        """
+        Catch up from a segmented log (`app.core.segment_store.SegmentedLog`).
+
+        Offsets are global across segments, so `_file_pos` means the same
+        thing as for a single file. If retention already dropped the segment
+        holding `_file_pos`, replay resumes at the oldest retained one.
+        """
+        return self.tail_once(store)
+
+    # -------------------------
+    # Pausing (snapshots)
+    # -------------------------
+
+    def pause_ingest(self) -> None:
+        """
+        Hold all ingestion (`ingest_batch`, `apply_records`) so the state
+        stays at one log offset. What arrives meanwhile is queued and applied
+        in arrival order afterwards: rules see events in the same order as
+        without the pause.
+        """
+        self.ingest_paused = True
+
+    def drain_paused(self, max_items: int = 1) -> bool:
+        """Apply up to `max_items` queued batches (still paused). True if more are left."""
+        work = self._paused_work
+        for _ in range(max_items):
+            if not work:
+                break
+            fn, args = work.popleft()
+            fn(*args)
+        return bool(work)
+
+    def resume_ingest(self) -> None:
+        """Apply everything still queued, then accept ingestion again."""
+        while self._paused_work:
+            self.drain_paused(len(self._paused_work))
+        self.ingest_paused = False
+
+    def apply_records(self, records: Iterable[LogRecord]) -> int:
         """
-        Read and process any new JSONL lines since last position.
-        Returns number of processed lines.
+        Process records read from the log and advance the durable offset.
+
+        Records may overlap what `ingest_batch` already saw while they were
+        being read; request_id dedupe makes that safe, and the offset never
+        moves backwards. While paused the records are queued (returns 0).
         """
-        if not os.path.exists(log_path):
+        if self.ingest_paused:
+            self._paused_work.append((self._apply_records, (list(records),)))
             return 0
+        return self._apply_records(records)
 
+    def _apply_records(self, records: Iterable[LogRecord]) -> int:
         processed = 0
-        with open(log_path, "r", encoding="utf-8") as f:
-            f.seek(self._file_pos)
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    event = json.loads(line)
-                except Exception:
-                    continue
-                self.process_request_event(event)
+        start = pos = self._file_pos
+        n = 0
+        for event, ts_s, end in records:
+            # Binary logs give epoch timestamps: no ISO parsing on replay.
+            if self.process_request_event(event, ts_s=ts_s):
                 processed += 1
-            self._file_pos = f.tell()
+            pos = max(pos, end)
+            n += 1
+        if n and pos > start:
+            self._observe_event_size(pos - start, n)
+        self._file_pos = max(self._file_pos, pos)
         self._last_tail_ts = time.time()
         return processed
 
-    def process_request_event(self, e: Dict[str, Any]) -> None:
+    def ingest_batch(self, events: List[Dict[str, Any]], start_offset: int, end_offset: int) -> int:
+        """
+        Ingest a batch the log writer just appended at [start_offset, end_offset).
+
+        This is the live ingestion path (registered as a LogWriter listener).
+        The durable log offset only advances when the batch is contiguous with
+        what has been ingested so far; otherwise the gap is counted and the
+        background tailer fills it in (request_id dedupe makes that safe).
+        While paused the batch is queued (returns 0).
+        """
+        if self.ingest_paused:
+            self._paused_work.append((self._ingest_batch, (events, start_offset, end_offset)))
+            return 0
+        return self._ingest_batch(events, start_offset, end_offset)
+
+    def _ingest_batch(self, events: List[Dict[str, Any]], start_offset: int, end_offset: int) -> int:
+        processed = 0
+        for e in events:
+            if self.process_request_event(e):
+                processed += 1
+        if events:
+            self._observe_event_size(end_offset - start_offset, len(events))
+        if start_offset == self._file_pos:
+            self._file_pos = end_offset
+        elif end_offset > self._file_pos:
+            self._offset_gaps += 1
+        return processed
+
+    def _observe_event_size(self, nbytes: int, n: int) -> None:
+        # Moving average of on-disk bytes per event, to express lag in events.
+        size = nbytes / n
+        self._bytes_per_event = size if not self._bytes_per_event else 0.9 * self._bytes_per_event + 0.1 * size
+
+    def ingestion_lag(self, log_end_offset: int, queued: int = 0) -> Dict[str, Any]:
+        """
+        How far the detector is behind the log:
+        - lagBytes: log bytes not ingested yet.
+        - lagEvents: `queued` (accepted, not yet written) plus an estimate of
+          the events in lagBytes.
+        - lagSeconds: wall-clock age of the last ingested event while behind,
+          0 when caught up.
+        """
+        lag_bytes = max(0, log_end_offset - self._file_pos)
+        lag_events = queued
+        if lag_bytes and self._bytes_per_event:
+            lag_events += max(1, round(lag_bytes / self._bytes_per_event))
+        elif lag_bytes:
+            lag_events += 1
+        lag_s: Optional[float] = 0.0
+        if lag_events:
+            lag_s = round(max(0.0, time.time() - self._last_event_s), 3) if self._last_event_s else None
+        return {"lagBytes": lag_bytes, "lagEvents": lag_events, "lagSeconds": lag_s}
+
+    def _is_duplicate(self, request_id: Any) -> bool:
+        if not request_id:
+            return False
+        if request_id in self._seen_ids:
+            self._duplicates += 1
+            return True
+        self._seen_ids.add(request_id)
+        self._seen_order.append(request_id)
+        if len(self._seen_order) > self._dedupe_window:
+            self._seen_ids.discard(self._seen_order.popleft())
+        return False
+
+    def process_request_event(self, e: Dict[str, Any], ts_s: Optional[float] = None) -> bool:
+        """
+        Apply one request event to the rules.
+        `ts_s` (epoch seconds) skips parsing `e["timestamp"]` when the caller
+        already has it (binary log replay).
+        Returns False if the event was already ingested (duplicate request_id).
+        """
+        if self._is_duplicate(e.get("request_id")):
+            return False
+        perf_ns = time.perf_counter_ns
+        started_ns = perf_ns()
+
         ip = str(e.get("ip") or "unknown")
         endpoint = str(e.get("endpoint") or "")
-        ts = _parse_ts(e.get("timestamp"))
-        ts_s = ts.timestamp()
+        method = str(e.get("method") or "")
+        if ts_s is None:
+            ts_s = _parse_ts(e.get("timestamp")).timestamp()
+        self._last_event_s = ts_s
+
+        # Idle-TTL sweep of the attacker table, at most once a minute (event time).
+        if ts_s - self._last_expire_s >= 60:
+            self._last_expire_s = ts_s
+            self._attackers.expire(ts_s)
 
         st = self._attackers.get(ip)
         if not st:
-            st = AttackerState(ip=ip, first_seen=ts, last_seen=ts)
-            self._attackers[ip] = st
-
-        st.last_seen = ts
+            st = AttackerState(ip=ip, first_seen_s=ts_s, last_seen_s=ts_s)
+            if self.geoip is not None:
+                st.country, st.asn, st.isp = self.geoip.lookup(ip)
+            self._attackers.put(ip, st)
+
+        self._version += 1
+        st.version = self._version
+        st.last_seen_s = ts_s
         st.total_requests += 1
-        st.recent_requests_s.append(ts_s)
+        st.requests_60s.add(ts_s)
+        st.request_series.add(ts_s)
         st.endpoint_counts[endpoint] += 1
-
-        status = int(e.get("status_code") or 200)
-        auth_success = e.get("auth_success", None)
-
-        # ---- Rules (behavior-first) ----
-        # Recon / traversal-ish endpoints (very common honeypot noise)
-        if endpoint in ("/.env", "/wp-admin/admin-ajax.php", "/wp-admin") or ".." in endpoint:
-            st.recon_hits += 1
-            self._recompute_risk(st, ts_s)
-            self._emit(st, e, attack_type="Path Traversal")
-            return
-
-        # Brute force: failed login tracking
-        if endpoint == "/login" and auth_success is False:
-            st.recent_failed_logins_s.append(ts_s)
-            # window: last 60 seconds
-            self._prune_older_than(st.recent_failed_logins_s, ts_s - 60)
-            self._recompute_risk(st, ts_s)
-            if len(st.recent_failed_logins_s) >= 10:
-                # Only /login failures should be marked brute force.
-                # Reduce spam: emit every 3rd failed login after threshold.
-                st.brute_force_emits += 1
-                if st.brute_force_emits % 3 == 0:
-                    self._emit(st, e, attack_type="Brute Force")
-                return
-            # still suspicious but lower
-            self._emit(st, e, attack_type="Credential Stuffing")
-            return
-
-        # IDOR enumeration: sequential user IDs
-        m = _RE_USER_ID.match(endpoint)
-        if m:
-            user_id = int(m.group(1))
-            if st.last_user_id is not None and user_id == st.last_user_id + 1:
-                st.sequential_id_hits += 1
-            else:
-                st.sequential_id_hits = 0
-            st.last_user_id = user_id
-            self._recompute_risk(st, ts_s)
-
-            # Mark IDOR as soon as we see a sequence starting (less confusing),
-            # but only after at least 2 steps to avoid false positives.
-            if st.sequential_id_hits >= 1:
-                self._emit(st, e, attack_type="IDOR")
-                return
-
-        # High-frequency API abuse: > 120 requests/min
-        self._prune_older_than(st.recent_requests_s, ts_s - 60)
+        hh = self._heavy_hitters
+        hh["ips"].add(ip)
+        hh["endpoints"].add(endpoint[:_HEAVY_HITTER_KEY_MAX])
+        hh["userAgents"].add(str(e.get("user_agent") or "")[:_HEAVY_HITTER_KEY_MAX])
+
+        subnets = self._subnets.observe(ip, ts_s)
+        account = self.track_account(e, ts_s) if e.get("username") else None
+
+        # ---- Rules (behavior-first), see app.services.rules ----
+        ctx = RuleContext(st, e, endpoint, method, ts_s, subnets, account)
+        matched = self._rules.dispatch(method, endpoint)
+        for rule, m in matched:
+            if rule.observes:
+                t0 = perf_ns()
+                ctx.match = m
+                rule.observe(ctx)
+                elapsed = perf_ns() - t0
+                rule.observe_calls += 1
+                rule.observe_ns += elapsed
+                if elapsed > rule.observe_max_ns:
+                    rule.observe_max_ns = elapsed
+
+        # Once per event, after every rule has updated its state.
         self._recompute_risk(st, ts_s)
-        if len(st.recent_requests_s) > 120:
-            self._emit(st, e, attack_type="API Abuse")
-            return
 
-        # Default: scanner-ish if they’re probing many endpoints quickly
-        if status >= 400:
-            # A single 404 shouldn't become HIGH risk. Keep it low.
-            self._emit(st, e, attack_type="Scanner")
-            return
+        for rule, m in matched:
+            t0 = perf_ns()
+            ctx.match = m
+            attack_type = rule.evaluate(ctx)
+            elapsed = perf_ns() - t0
+            rule.calls += 1
+            rule.total_ns += elapsed
+            if elapsed > rule.max_ns:
+                rule.max_ns = elapsed
+            if attack_type is None:
+                continue
+            if attack_type:
+                rule.emits += 1
+                self._emit(st, e, attack_type=attack_type, ts=ts_s)
+            break
 
         # Non-malicious-looking requests are not emitted as "attacks" to reduce noise.
+        if self._metrics:
+            _EVENT_SECONDS.observe((perf_ns() - started_ns) / 1e9)
+        return True
 
     # -------------------------
     # Helpers
     # -------------------------
 
-    def _emit(self, st: AttackerState, e: Dict[str, Any], attack_type: AttackType) -> None:
+    def _emit(self, st: AttackerState, e: Dict[str, Any], attack_type: AttackType, ts: float) -> None:
         st.behavior_counts[attack_type] += 1
+        if self._metrics:
+            _ATTACK_EVENTS.labels(attack_type).inc()
         risk = _risk_level(st.risk_score)
         payload_preview: Optional[str] = None
 
-        ts = _parse_ts(e.get("timestamp")).timestamp()
-        st.recent_attack_types.append((ts, attack_type))
-        self._prune_recent_attack_types(st, ts - 600)  # keep last 10 minutes for classification
-
-        self._attack_events.append(
-            {
-                "id": e.get("request_id") or f"{st.ip}-{int(time.time()*1000)}",
-                "timestamp": e.get("timestamp"),
-                "attackerIP": st.ip,
-                "targetEndpoint": e.get("endpoint"),
-                "attackType": attack_type,
-                "riskLevel": risk,
-                "userAgent": e.get("user_agent", ""),
-                "payload": payload_preview,
-            }
-        )
-
-    def _prune_older_than(self, dq: Deque[float], threshold: float) -> None:
-        while dq and dq[0] < threshold:
-            dq.popleft()
+        # Keep last 10 minutes per type for classification.
+        window = st.recent_attack_types.get(attack_type)
+        if window is None:
+            window = SlidingWindowCounter(_CLASSIFY_BUCKETS, _CLASSIFY_BUCKET_S)
+            st.recent_attack_types[attack_type] = window
+        window.add(ts)
+        self._aggregates.add(ts, attack_type, str(e.get("endpoint") or ""))
+        self._heavy_hitters["attackTypes"].add(attack_type)
+
+        event = {
+            "id": e.get("request_id") or f"{st.ip}-{int(ts * 1000)}",
+            "timestamp": e.get("timestamp") or datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+            "attackerIP": st.ip,
+            "targetEndpoint": e.get("endpoint"),
+            "attackType": attack_type,
+            "riskLevel": risk,
+            "userAgent": e.get("user_agent", ""),
+            "payload": payload_preview,
+        }
+        self._attack_events.append(event)
+        self._event_index.add(st.ip, event)
+        for listener in self._attack_listeners:
+            try:
+                listener(event)
+            except Exception:
+                pass
 
     def _recompute_risk(self, st: AttackerState, now_s: float) -> None:
         """
         Explainable risk score based on *recent* behavior (last ~60s),
         instead of permanently accumulating to 100.
         """
-        # Make sure windows are current.
-        self._prune_older_than(st.recent_failed_logins_s, now_s - 60)
-        self._prune_older_than(st.recent_requests_s, now_s - 60)
-
-        failed_60s = len(st.recent_failed_logins_s)
-        rpm = len(st.recent_requests_s)
+        # Window sums are O(1) and always current for `now_s`.
+        failed_60s = st.failed_logins_60s.total(now_s)
+        rpm = st.requests_60s.total(now_s)
         seq = st.sequential_id_hits
 
         score = 10
@@ -308,47 +822,36 @@ class DetectionEngine:
 
         st.risk_score = max(0, min(100, score))
 
-    def _classify(self, st: AttackerState) -> AttackerClassification:
+    def _classify(self, st: AttackerState, now_s: Optional[float] = None) -> AttackerClassification:
         """
         Explainable, rule-first classification based on RECENT (last 10 minutes) behavior.
         This avoids "sticky" labels where one brute-force burst marks the IP forever.
         """
-        now_s = _utc_now().timestamp()
-        self._prune_recent_attack_types(st, now_s - 600)
-
-        counts = Counter(t for _, t in st.recent_attack_types)
+        if now_s is None:
+            now_s = self.clock()
+        counts = {t: w.total(now_s) for t, w in st.recent_attack_types.items()}
         # Count brute-force pressure from *requests*, not only emitted events (we throttle emits).
-        brute = counts.get("Brute Force", 0) + counts.get("Credential Stuffing", 0)
-        idor = counts.get("IDOR", 0)
+        brute = (
+            counts.get("Brute Force", 0)
+            + counts.get("Credential Stuffing", 0)
+            + counts.get("Distributed Brute Force", 0)
+            + counts.get("Cross-IP Credential Stuffing", 0)
+        )
+        idor = counts.get("IDOR", 0) + counts.get("Distributed Enumeration", 0)
         recon = counts.get("Path Traversal", 0) + counts.get("Scanner", 0)
         abuse = counts.get("API Abuse", 0)
 
         # Dominant-pattern classification (simple + viva-friendly).
-        if (len(st.recent_failed_logins_s) >= 10) or (brute >= 3 and brute >= max(idor, abuse, recon)):
+        if (st.failed_logins_60s.total(now_s) >= 10) or (brute >= 3 and brute >= max(idor, abuse, recon)):
             return "Brute-forcer"
         if idor >= 3 and idor >= max(brute, abuse, recon):
             return "Manual Attacker"
         return "Scanner"
 
-    def _prune_recent_attack_types(self, st: AttackerState, threshold: float) -> None:
-        while st.recent_attack_types and st.recent_attack_types[0][0] < threshold:
-            st.recent_attack_types.popleft()
-
     def _requests_per_minute(self, st: AttackerState, now: datetime) -> List[int]:
-        now_s = now.timestamp()
-        buckets = [0] * 60
-        for ts_s in st.recent_requests_s:
-            delta_min = int((now_s - ts_s) // 60)
-            if 0 <= delta_min < 60:
-                buckets[59 - delta_min] += 1
-        return buckets
+        # Oldest first; the last entry is the current (partial) minute.
+        return st.request_series.minutes.series(now.timestamp())
 
     def _timeline_for_ip(self, ip: str, limit: int = 20) -> List[Dict[str, Any]]:
-        out = []
-        for ev in reversed(self._attack_events):
-            if ev.get("attackerIP") == ip:
-                out.append(ev)
-                if len(out) >= limit:
-                    break
-        return list(reversed(out))
+        return self._event_index.timeline(ip, limit)
 
@@ -0,0 +1,369 @@
+"""
+Local IPC between request workers and a single detector process.
+
+Multi-worker deployment (`uvicorn --workers N`) runs one process with
+`HONEYPOT_ROLE=detector` and the request workers with
+`HONEYPOT_ROLE=worker`, sharing `HONEYPOT_DETECTOR_SOCKET`:
+
+- Workers do not build detector state. Their telemetry middleware writes to
+  a `DetectorClient`, which batches events over the Unix socket.
+- The detector owns the request log, the engine, snapshots and the push
+  feed. Every worker's events go through its one `LogWriter`, so there is
+  a single log and a single consolidated view of attackers.
+- Dashboard routes on workers are answered by the detector (`query`), and
+  the SSE feed is relayed from it (`subscribe`), so every worker returns
+  the same answer and event ids are valid across workers.
+
+Wire format: 4-byte big-endian length + UTF-8 JSON object. Operations:
+`events` (fire and forget), `query` (request/response by id) and
+`subscribe` (server pushes `attack` / `dropped` / `heartbeat` frames).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import struct
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.log_writer import _utc_now_iso
+from app.services.broadcaster import AttackBroadcaster
+
+_LEN = struct.Struct("!I")
+MAX_FRAME = 64 * 1024 * 1024
+
+
+class DetectorUnavailable(RuntimeError):
+    pass
+
+
+async def write_frame(writer: asyncio.StreamWriter, obj: Dict[str, Any]) -> None:
+    raw = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    writer.write(_LEN.pack(len(raw)) + raw)
+    await writer.drain()
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    (size,) = _LEN.unpack(await reader.readexactly(_LEN.size))
+    if size > MAX_FRAME:
+        raise ValueError(f"IPC frame too large ({size} bytes)")
+    return json.loads(await reader.readexactly(size))
+
+
+async def _close(writer: Optional[asyncio.StreamWriter]) -> None:
+    if writer is None:
+        return
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+# -------------------------
+# Detector side
+# -------------------------
+
+
+class DetectorServer:
+    """
+    Unix-socket endpoint of the detector process.
+
+    - `events`: each event goes through `log_writer.write()`, exactly like
+      the detector's own requests (the engine is fed by the writer's flush
+      listener).
+    - `query`: `queries[name](**args)`; results must be JSON-serializable.
+    - `subscribe`: relays `broadcaster.events()` until the worker hangs up.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        log_writer: Any,
+        queries: Dict[str, Callable[..., Any]],
+        broadcaster: AttackBroadcaster,
+    ) -> None:
+        self.path = path
+        self.log_writer = log_writer
+        self.queries = queries
+        self.broadcaster = broadcaster
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+
+        self._connections: int = 0
+        self._events: int = 0
+        self._queries: int = 0
+        self._errors: int = 0
+
+    async def start(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)  # stale socket from a previous run
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Subscribers idle until the next attack / heartbeat: cancel them.
+            for task in list(self._handlers):
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        if task is not None:
+            self._handlers.add(task)
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    frame = await read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                op = frame.get("op")
+                if op == "events":
+                    for event in frame.get("events") or ():
+                        await self.log_writer.write(event)
+                    self._events += len(frame.get("events") or ())
+                elif op == "query":
+                    await write_frame(writer, await self._query(frame))
+                elif op == "subscribe":
+                    await self._relay(writer, frame.get("lastEventId"))
+                    return
+                else:
+                    self._errors += 1
+                    return
+        except asyncio.CancelledError:
+            pass  # stop(); the streams callback logs cancelled handlers otherwise
+        except Exception:
+            self._errors += 1
+        finally:
+            self._connections -= 1
+            self._handlers.discard(task)  # type: ignore[arg-type]
+            await _close(writer)
+
+    async def _query(self, frame: Dict[str, Any]) -> Dict[str, Any]:
+        self._queries += 1
+        fn = self.queries.get(str(frame.get("name")))
+        if fn is None:
+            return {"id": frame.get("id"), "error": f"unknown query {frame.get('name')!r}"}
+        try:
+            result = fn(**(frame.get("args") or {}))
+            if asyncio.iscoroutine(result):
+                result = await result
+            return {"id": frame.get("id"), "result": result}
+        except Exception as exc:
+            self._errors += 1
+            return {"id": frame.get("id"), "error": f"{type(exc).__name__}: {exc}"}
+
+    async def _relay(self, writer: asyncio.StreamWriter, last_event_id: Optional[str]) -> None:
+        items = self.broadcaster.events(last_event_id)
+        try:
+            async for kind, value, event in items:
+                await write_frame(writer, {"op": kind, "id": value, "event": event})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await items.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "socket": self.path,
+            "connections": self._connections,
+            "eventsReceived": self._events,
+            "queries": self._queries,
+            "errors": self._errors,
+        }
+
+
+# -------------------------
+# Worker side
+# -------------------------
+
+
+class DetectorClient:
+    """
+    Worker-side stand-in for the `LogWriter` (same `write()` / `start()` /
+    `stop()` / `stats()` surface) plus dashboard queries.
+
+    - Events are stamped here (when the request finished) and queued in a
+      bounded buffer; one task sends them in batches. A batch that fails to
+      send is retried after reconnecting (the detector dedupes by
+      request_id). When the buffer is full, new events are dropped and
+      counted: the honeypot must keep answering while the detector is down.
+    - Queries share one connection, one at a time.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval_s: float = 0.05,
+        query_timeout_s: float = 5.0,
+    ) -> None:
+        self.path = path
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.query_timeout_s = query_timeout_s
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._query_conn: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._query_lock = asyncio.Lock()
+        self._query_id: int = 0
+
+        self._sent: int = 0
+        self._dropped: int = 0
+        self._reconnects: int = 0
+        self._send_errors: int = 0
+
+    # -------------------------
+    # Telemetry (LogWriter surface)
+    # -------------------------
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run(), name="detector-client")
+
+    async def stop(self, drain_timeout_s: float = 5.0) -> None:
+        if self._task is None:
+            return
+        assert self._queue is not None
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout_s)
+        except asyncio.TimeoutError:
+            pass
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for conn in (self._conn, self._query_conn):
+            if conn is not None:
+                await _close(conn[1])
+        self._conn = self._query_conn = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def write(self, event: Dict[str, Any]) -> None:
+        if self._queue is None:
+            raise RuntimeError("DetectorClient is not started")
+        if not event.get("timestamp"):
+            event["timestamp"] = _utc_now_iso()
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._dropped += 1
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        q = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Dict[str, Any]] = [await q.get()]
+            deadline = loop.time() + self.flush_interval_s
+            while len(batch) < self.batch_size:
+                if q.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(q.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(q.get_nowait())
+            try:
+                await self._send(batch)
+            finally:
+                for _ in batch:
+                    q.task_done()
+
+    async def _send(self, batch: List[Dict[str, Any]]) -> None:
+        delay = 0.1
+        while True:
+            try:
+                if self._conn is None:
+                    self._conn = await asyncio.open_unix_connection(self.path)
+                    self._reconnects += 1
+                await write_frame(self._conn[1], {"op": "events", "events": batch})
+                self._sent += len(batch)
+                return
+            except (OSError, ConnectionError):
+                self._send_errors += 1
+                if self._conn is not None:
+                    await _close(self._conn[1])
+                    self._conn = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2.0)
+
+    # -------------------------
+    # Dashboard
+    # -------------------------
+
+    async def query(self, name: str, **args: Any) -> Any:
+        async with self._query_lock:
+            try:
+                return await asyncio.wait_for(self._query_once(name, args), self.query_timeout_s)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+                if self._query_conn is not None:
+                    await _close(self._query_conn[1])
+                    self._query_conn = None
+                raise DetectorUnavailable(str(exc) or type(exc).__name__) from exc
+
+    async def _query_once(self, name: str, args: Dict[str, Any]) -> Any:
+        if self._query_conn is None:
+            self._query_conn = await asyncio.open_unix_connection(self.path)
+        reader, writer = self._query_conn
+        self._query_id += 1
+        await write_frame(writer, {"op": "query", "id": self._query_id, "name": name, "args": args})
+        reply = await read_frame(reader)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply.get("result")
+
+    async def subscribe(
+        self, last_event_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Any, Optional[Dict[str, Any]]]]:
+        """
+        The detector's attack feed (same items as `AttackBroadcaster.events()`).
+        Ends when the detector is unreachable or goes away; SSE clients
+        reconnect with their last event id.
+        """
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        except OSError:
+            return
+        try:
+            await write_frame(writer, {"op": "subscribe", "lastEventId": last_event_id})
+            while True:
+                frame = await read_frame(reader)
+                yield frame.get("op", "heartbeat"), frame.get("id"), frame.get("event")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            await _close(writer)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "socket": self.path,
+            "connected": self._conn is not None,
+            "queueDepth": self.queue_depth,
+            "queueCapacity": self.max_queue,
+            "eventsSent": self._sent,
+            "eventsDropped": self._dropped,
+            "connects": self._reconnects,
+            "sendErrors": self._send_errors,
+        }
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Any, Deque, Dict, Iterator, List, Tuple
+
+
+class AttackEventIndex:
+    """
+    Per-attacker index of emitted attack events.
+
+    - Each IP keeps its own bounded ring (`per_ip` newest events), so a noisy
+      IP can only ever overwrite its own history.
+    - A global budget (`max_events`) caps memory across all rings; when it is
+      exceeded, the ring of the least recently active IP is dropped first.
+    - Timeline reads touch at most `limit` entries.
+    """
+
+    def __init__(self, per_ip: int = 50, max_events: int = 100000) -> None:
+        self.per_ip = max(1, per_ip)
+        self.max_events = max(self.per_ip, max_events)
+        self._rings: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self._total: int = 0
+        self._evicted_ips: int = 0
+        self._evicted_events: int = 0
+
+    def add(self, ip: str, event: Dict[str, Any]) -> None:
+        ring = self._rings.get(ip)
+        if ring is None:
+            ring = deque(maxlen=self.per_ip)
+            self._rings[ip] = ring
+        else:
+            self._rings.move_to_end(ip)
+        if len(ring) < self.per_ip:
+            self._total += 1
+        ring.append(event)
+
+        while self._total > self.max_events:
+            old_ip, old_ring = self._rings.popitem(last=False)
+            self._total -= len(old_ring)
+            self._evicted_ips += 1
+            self._evicted_events += len(old_ring)
+
+    def timeline(self, ip: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Newest `limit` events of `ip`, oldest first."""
+        ring = self._rings.get(ip)
+        if not ring:
+            return []
+        out = list(islice(reversed(ring), max(0, limit)))
+        out.reverse()
+        return out
+
+    def drop(self, ip: str) -> None:
+        """Forget `ip`'s ring (its attacker was evicted from the store)."""
+        ring = self._rings.pop(ip, None)
+        if ring is not None:
+            self._total -= len(ring)
+
+    # -------------------------
+    # Snapshots in pieces
+    # -------------------------
+
+    def empty_copy(self) -> "AttackEventIndex":
+        """Same settings and counters, no rings (see `chunks` / `extend`)."""
+        out = AttackEventIndex(self.per_ip, self.max_events)
+        out._evicted_ips = self._evicted_ips
+        out._evicted_events = self._evicted_events
+        return out
+
+    def chunks(self, max_events: int) -> Iterator[List[Tuple[str, List[Dict[str, Any]]]]]:
+        """Rings in LRU order, about `max_events` events per chunk."""
+        chunk: List[Tuple[str, List[Dict[str, Any]]]] = []
+        n = 0
+        for ip, ring in list(self._rings.items()):
+            chunk.append((ip, list(ring)))
+            n += len(ring)
+            if n >= max_events:
+                yield chunk
+                chunk, n = [], 0
+        if chunk:
+            yield chunk
+
+    def extend(self, chunk: List[Tuple[str, List[Dict[str, Any]]]]) -> None:
+        for ip, events in chunk:
+            self._rings[ip] = deque(events, maxlen=self.per_ip)
+            self._total += len(events)
+
+    @property
+    def evicted_ips(self) -> int:
+        return self._evicted_ips
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ips": len(self._rings),
+            "events": self._total,
+            "maxEvents": self.max_events,
+            "perIp": self.per_ip,
+            "evictedIps": self._evicted_ips,
+            "evictedEvents": self._evicted_events,
+        }
@@ -0,0 +1,236 @@
+"""
+Offline GeoIP / ASN enrichment from a local IP-range database.
+
+Database: CSV (optionally `.gz`), one range per line, no network lookups:
+
+    start,end,country[,asn[,isp]]
+    1.0.0.0,1.0.0.255,AU,13335,Cloudflare
+    2001:200::,2001:200:ffff:ffff:ffff:ffff:ffff:ffff,JP,2500,WIDE Project
+
+`start` / `end` are inclusive, as addresses or integers. Lines starting
+with `#` are ignored. Ranges must not overlap (as in the usual
+DB-IP / IP2Location / MaxMind CSV exports).
+
+Index layout (sorted, array-backed, no per-range Python objects):
+- IPv4: `array('I')` starts and ends (4 + 4 bytes per range).
+- IPv6: the 128-bit bounds split into high / low `array('Q')` halves
+  (32 bytes per range), searched on the high half, then on the low half
+  inside the run of equal high halves.
+- Labels `(country, asn, isp)` are deduplicated; each range stores a
+  4-byte label id.
+- Per family, a 65537-entry table maps the top 16 address bits to the
+  slice of ranges starting in that /16, so a search bisects a few entries
+  instead of the whole array.
+
+Every search is a C-level `bisect` over an array. An LRU cache of
+`lookup_cache` addresses sits in front (attackers repeat).
+See `benchmarks/bench_geoip.py`.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import socket
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+Label = Tuple[str, Optional[int], str]  # (country, asn, isp)
+UNKNOWN: Label = ("Unknown", None, "Unknown")
+
+_U64 = (1 << 64) - 1
+_AF_INET, _AF_INET6, _inet_pton = socket.AF_INET, socket.AF_INET6, socket.inet_pton
+
+
+def parse_ip(value: str) -> Optional[Tuple[int, int]]:
+    """(version, integer) for an address string, IPv4-mapped IPv6 as IPv4."""
+    try:
+        if ":" not in value:
+            return 4, int.from_bytes(_inet_pton(_AF_INET, value), "big")
+        n = int.from_bytes(_inet_pton(_AF_INET6, value.split("%", 1)[0]), "big")
+    except (OSError, ValueError):
+        return None
+    if n >> 32 == 0xFFFF:
+        return 4, n & 0xFFFFFFFF
+    return 6, n
+
+
+def _bound(value: str) -> Optional[Tuple[int, int]]:
+    if value.isdigit():
+        n = int(value)
+        return (4 if n <= 0xFFFFFFFF else 6), n
+    return parse_ip(value.strip())
+
+
+def _buckets(top16: Iterable[int], n: int) -> array:
+    """`table[b]` = index of the first range whose top 16 bits are >= b."""
+    table = array("I", bytes(4 * 65537))
+    counts = [0] * 65537
+    for b in top16:
+        counts[b + 1] += 1
+    total = 0
+    for b in range(65537):
+        total += counts[b]
+        table[b] = total
+    table[65536] = n
+    return table
+
+
+def _label(row: Sequence[str]) -> Label:
+    asn = row[3].strip().upper().removeprefix("AS") if len(row) > 3 else ""
+    return (
+        row[2].strip() or "Unknown",
+        int(asn) if asn.isdigit() else None,
+        (row[4].strip() if len(row) > 4 else "") or "Unknown",
+    )
+
+
+class GeoIPIndex:
+    def __init__(self, lookup_cache: int = 65536) -> None:
+        self._labels: List[Label] = [UNKNOWN]
+        self._label_ids: Dict[Label, int] = {UNKNOWN: 0}
+        # IPv4
+        self._v4_start = array("I")
+        self._v4_end = array("I")
+        self._v4_label = array("I")
+        # IPv6 (high / low 64-bit halves)
+        self._v6_start_hi = array("Q")
+        self._v6_start_lo = array("Q")
+        self._v6_end_hi = array("Q")
+        self._v6_end_lo = array("Q")
+        self._v6_label = array("I")
+        self._v4_buckets = _buckets((), 0)
+        self._v6_buckets = _buckets((), 0)
+        self._skipped: int = 0
+
+        self.lookup = lru_cache(maxsize=lookup_cache)(self._lookup)
+
+    # -------------------------
+    # Loading
+    # -------------------------
+
+    @classmethod
+    def load(cls, path: str, lookup_cache: int = 65536) -> "GeoIPIndex":
+        index = cls(lookup_cache=lookup_cache)
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as raw:
+            index.add_rows(csv.reader(io.TextIOWrapper(raw, encoding="utf-8", errors="replace")))
+        return index
+
+    def add_rows(self, rows: Iterable[Sequence[str]]) -> None:
+        """Append ranges (`start, end, country[, asn[, isp]]`) and re-sort if needed."""
+        # Raw (country, asn, isp) columns -> label id: most rows repeat one.
+        row_labels: Dict[Tuple[str, ...], int] = {}
+        add = self._add
+        for row in rows:
+            if len(row) < 3 or row[0].startswith("#"):
+                continue
+            start = _bound(row[0])
+            end = _bound(row[1]) if start is not None else None
+            if start is None or end is None or start[0] != end[0] or end[1] < start[1]:
+                self._skipped += 1  # header line, malformed or mixed-family range
+                continue
+            key = tuple(row[2:5])
+            label = row_labels.get(key)
+            if label is None:
+                label = row_labels[key] = self._label_id(_label(row))
+            add(start[0], start[1], end[1], label)
+        self._sort()
+        self._v4_buckets = _buckets((s >> 16 for s in self._v4_start), len(self._v4_start))
+        self._v6_buckets = _buckets((h >> 48 for h in self._v6_start_hi), len(self._v6_start_hi))
+        self.lookup.cache_clear()
+
+    def _label_id(self, label: Label) -> int:
+        i = self._label_ids.get(label)
+        if i is None:
+            i = self._label_ids[label] = len(self._labels)
+            self._labels.append(label)
+        return i
+
+    def _add(self, version: int, start: int, end: int, label: int) -> None:
+        if version == 4:
+            self._v4_start.append(start)
+            self._v4_end.append(end)
+            self._v4_label.append(label)
+        else:
+            self._v6_start_hi.append(start >> 64)
+            self._v6_start_lo.append(start & _U64)
+            self._v6_end_hi.append(end >> 64)
+            self._v6_end_lo.append(end & _U64)
+            self._v6_label.append(label)
+
+    def _sort(self) -> None:
+        # Exports are normally sorted already: check before paying for a sort.
+        s = self._v4_start
+        if any(s[i] > s[i + 1] for i in range(len(s) - 1)):
+            order = sorted(range(len(s)), key=s.__getitem__)
+            for name in ("_v4_start", "_v4_end", "_v4_label"):
+                col = getattr(self, name)
+                setattr(self, name, array(col.typecode, (col[i] for i in order)))
+        hi, lo = self._v6_start_hi, self._v6_start_lo
+        if any((hi[i], lo[i]) > (hi[i + 1], lo[i + 1]) for i in range(len(hi) - 1)):
+            order = sorted(range(len(hi)), key=lambda i: (hi[i], lo[i]))
+            for name in ("_v6_start_hi", "_v6_start_lo", "_v6_end_hi", "_v6_end_lo", "_v6_label"):
+                col = getattr(self, name)
+                setattr(self, name, array(col.typecode, (col[i] for i in order)))
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+
+    def _lookup(self, ip: str) -> Label:
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return UNKNOWN
+        version, n = parsed
+        if version == 4:
+            b = n >> 16
+            lo = self._v4_buckets[b]
+            # The covering range may start in an earlier /16: fall back to lo - 1.
+            i = bisect_right(self._v4_start, n, lo, self._v4_buckets[b + 1]) - 1
+            if i >= 0 and n <= self._v4_end[i]:
+                return self._labels[self._v4_label[i]]
+            return UNKNOWN
+
+        h, l = n >> 64, n & _U64
+        starts_hi = self._v6_start_hi
+        top = h >> 48
+        a = bisect_left(starts_hi, h, self._v6_buckets[top], self._v6_buckets[top + 1])
+        b = bisect_right(starts_hi, h, a, self._v6_buckets[top + 1])
+        # Last start <= (h, l): inside the run of equal high halves, or the
+        # entry just before it (a - 1) when there is none / l is below it.
+        i = bisect_right(self._v6_start_lo, l, a, b) - 1
+        if i >= 0 and (h, l) <= (self._v6_end_hi[i], self._v6_end_lo[i]):
+            return self._labels[self._v6_label[i]]
+        return UNKNOWN
+
+    # -------------------------
+    # Introspection
+    # -------------------------
+
+    def __len__(self) -> int:
+        return len(self._v4_start) + len(self._v6_start_hi)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the range arrays (labels excluded)."""
+        cols = (
+            self._v4_start, self._v4_end, self._v4_label,
+            self._v6_start_hi, self._v6_start_lo, self._v6_end_hi, self._v6_end_lo, self._v6_label,
+        )
+        return sum(c.itemsize * len(c) for c in cols)
+
+    def stats(self) -> Dict[str, object]:
+        info = self.lookup.cache_info()
+        return {
+            "ipv4Ranges": len(self._v4_start),
+            "ipv6Ranges": len(self._v6_start_hi),
+            "labels": len(self._labels) - 1,
+            "skippedRows": self._skipped,
+            "indexBytes": self.memory_bytes(),
+            "cacheHits": info.hits,
+            "cacheMisses": info.misses,
+            "cacheSize": info.currsize,
+        }
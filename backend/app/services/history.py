@@ -0,0 +1,318 @@
+"""
+Columnar, memory-mapped request history for range analytics.
+
+Sealed segments of the `SegmentedLog` are compacted into one directory of
+column files per segment (`history/<base>/`), written once and never
+modified:
+
+- ts (int64, epoch microseconds), status (uint16), auth (int8: -1 unknown,
+  0 failed, 1 ok), payload (int64 bytes), rt (float32 ms).
+- ip, endpoint, method and attack (uint32 / uint8 ids) with the id -> name
+  dictionaries in the chunk's `meta.json`. Attack id 0 means "no attack";
+  the others are what the detection rules emitted for that request.
+
+Attack types come from replaying each segment through a private
+`DetectionEngine` (kept across compaction runs, so rule windows carry over
+segment boundaries; after a restart the first segment starts cold).
+
+Queries map the columns (`numpy.load(mmap_mode="r")`) and use vectorized
+masks and `bincount` group-bys: only the pages of the columns a query
+touches are read, and no Python loop runs per event. Data still in the
+active segment is not covered (see `coveredUntil`).
+
+Requires numpy.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from app.core.segment_store import Segment, SegmentedLog
+from app.services.detection_engine import DetectionEngine
+
+HISTORY_VERSION = 1
+
+# name -> dtype of the column files.
+COLUMNS: Dict[str, Any] = {
+    "ts": np.int64,
+    "ip": np.uint32,
+    "endpoint": np.uint32,
+    "method": np.uint32,  # attacker-controlled: no small bound
+    "status": np.uint16,
+    "auth": np.int8,
+    "payload": np.int64,
+    "rt": np.float32,
+    "attack": np.uint8,
+}
+_DICTS = ("ip", "endpoint", "method", "attack")
+_HOUR_US = 3600 * 1_000_000
+
+
+@dataclass
+class _Chunk:
+    base: int
+    path: str
+    meta: Dict[str, Any]
+    _cols: Optional[Dict[str, np.ndarray]] = None
+
+    @property
+    def min_us(self) -> int:
+        return self.meta["minTs"]
+
+    @property
+    def max_us(self) -> int:
+        return self.meta["maxTs"]
+
+    def col(self, name: str) -> np.ndarray:
+        if self._cols is None:
+            self._cols = {}
+        arr = self._cols.get(name)
+        if arr is None:
+            arr = np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+            self._cols[name] = arr
+        return arr
+
+
+class ColumnarHistory:
+    """
+    - `compact()`: turn sealed segments not compacted yet into chunks
+      (oldest first). Meant for the log maintenance task, in a thread.
+    - `retire(now_s)`: drop chunks older than `retention_s` (independent of
+      the raw log's retention: history is much smaller).
+    - `analytics(start_s, end_s)`: `get_analytics`-shaped answer for any
+      time range.
+    """
+
+    def __init__(self, directory: str, store: SegmentedLog, retention_s: Optional[float] = None) -> None:
+        self.directory = directory
+        self.store = store
+        self.retention_s = retention_s
+        # Replaced, never mutated in place: the compaction thread swaps in a
+        # new dict (under `_lock`) while handlers iterate the current one.
+        self._chunks: Dict[int, _Chunk] = {}
+        self._lock = threading.Lock()
+        self._engine: Optional[DetectionEngine] = None
+        self._engine_end: int = -1
+        self._last_attack: Optional[str] = None
+
+        self._compacted_segments: int = 0
+        self._compacted_events: int = 0
+        self._retired: int = 0
+        self._last_compact_s: float = 0.0
+
+    # -------------------------
+    # Compaction
+    # -------------------------
+
+    def compact(self) -> Dict[str, int]:
+        os.makedirs(self.directory, exist_ok=True)
+        chunks = self.chunks()
+        done_until = max((c.meta["end"] for c in chunks), default=0)
+        segs = self.store.segments()
+        sealed = segs[:-1]  # the newest segment is still being written
+        compacted = events = 0
+        for seg in sealed:
+            if seg.end <= done_until:
+                continue
+            events += self._compact_segment(seg)
+            compacted += 1
+        self._compacted_segments += compacted
+        self._compacted_events += events
+        self._last_compact_s = time.time()
+        return {"segments": compacted, "events": events}
+
+    def _compact_segment(self, seg: Segment) -> int:
+        if self._engine is None or self._engine_end != seg.base:
+            # Cold start (or a gap from retention): rule state starts empty.
+            # Off the global metrics: the live engine already counted these events.
+            self._engine = DetectionEngine(metrics=False)
+            self._engine.add_attack_listener(self._on_attack)
+        engine = self._engine
+
+        ids: Dict[str, Dict[str, int]] = {name: {} for name in _DICTS}
+        ids["attack"][""] = 0
+        cols: Dict[str, List[Any]] = {name: [] for name in COLUMNS}
+        for ev, ts_s, end in self.store.read_from(seg.base):
+            if end > seg.end:
+                break
+            self._last_attack = None
+            if not engine.process_request_event(ev, ts_s=ts_s):
+                continue  # duplicate request_id: already in an earlier row
+            cols["ts"].append(int(engine.last_event_s * 1_000_000))
+            cols["ip"].append(_intern(ids["ip"], str(ev.get("ip") or "unknown")))
+            cols["endpoint"].append(_intern(ids["endpoint"], str(ev.get("endpoint") or "")))
+            cols["method"].append(_intern(ids["method"], str(ev.get("method") or "")))
+            cols["status"].append(int(ev.get("status_code") or 0))
+            auth = ev.get("auth_success")
+            cols["auth"].append(-1 if auth is None else int(bool(auth)))
+            cols["payload"].append(int(ev.get("payload_size") or 0))
+            cols["rt"].append(float(ev.get("response_time_ms") or 0))
+            cols["attack"].append(_intern(ids["attack"], self._last_attack or ""))
+        self._engine_end = seg.end
+
+        n = len(cols["ts"])
+        ts = np.asarray(cols["ts"], dtype=np.int64)
+        meta = {
+            "version": HISTORY_VERSION,
+            "base": seg.base,
+            "end": seg.end,
+            "events": n,
+            "minTs": int(ts.min()) if n else 0,
+            "maxTs": int(ts.max()) if n else 0,
+            "dicts": {name: list(ids[name]) for name in _DICTS},
+        }
+        final = os.path.join(self.directory, f"{seg.base:020d}")
+        tmp = final + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, dtype in COLUMNS.items():
+            np.save(os.path.join(tmp, name + ".npy"), ts if name == "ts" else np.asarray(cols[name], dtype=dtype))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)  # readers only ever see complete chunks
+        return n
+
+    def _on_attack(self, event: Dict[str, Any]) -> None:
+        self._last_attack = event["attackType"]
+
+    def retire(self, now_s: Optional[float] = None) -> int:
+        if self.retention_s is None:
+            return 0
+        cutoff_us = ((time.time() if now_s is None else now_s) - self.retention_s) * 1_000_000
+        retired = 0
+        for chunk in self.chunks():
+            if chunk.meta["events"] and chunk.max_us >= cutoff_us:
+                break
+            shutil.rmtree(chunk.path, ignore_errors=True)
+            with self._lock:
+                self._chunks = {b: c for b, c in self._chunks.items() if b != chunk.base}
+            retired += 1
+        self._retired += retired
+        return retired
+
+    # -------------------------
+    # Queries
+    # -------------------------
+
+    def chunks(self) -> List[_Chunk]:
+        """Compacted chunks on disk, oldest first (new ones picked up here)."""
+        if not os.path.isdir(self.directory):
+            return []
+        with self._lock:
+            known = self._chunks
+            found: Dict[int, _Chunk] = {}
+            for name in os.listdir(self.directory):
+                if not name.isdigit():
+                    continue
+                base = int(name)
+                chunk = known.get(base)
+                if chunk is None:
+                    path = os.path.join(self.directory, name)
+                    try:
+                        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                            meta = json.load(f)
+                    except (OSError, ValueError):
+                        continue
+                    if meta.get("version") != HISTORY_VERSION:
+                        continue
+                    chunk = _Chunk(base, path, meta)
+                found[base] = chunk
+            self._chunks = found
+        return [found[b] for b in sorted(found)]
+
+    def analytics(self, start_s: float, end_s: Optional[float] = None, top_endpoints: int = 5) -> Dict[str, Any]:
+        """
+        Attack analytics for `start_s <= ts < end_s` (epoch seconds), same
+        shape as `DetectionEngine.get_analytics()` plus request totals.
+        """
+        lo = int(start_s * 1_000_000)
+        hi = int(end_s * 1_000_000) if end_s is not None else None
+        types: Dict[str, int] = {}
+        endpoints: Dict[str, int] = {}
+        ips: Set[str] = set()
+        hour_of_day = np.zeros(24, dtype=np.int64)
+        requests = attacks = scanned = 0
+        covered_until: Optional[int] = None
+
+        for chunk in self.chunks():
+            if not chunk.meta["events"]:
+                continue
+            covered_until = max(covered_until or 0, chunk.max_us)
+            if chunk.max_us < lo or (hi is not None and chunk.min_us >= hi):
+                continue
+            ts = chunk.col("ts")
+            scanned += len(ts)
+            # Whole chunk inside the range: no per-row comparison needed.
+            inside = chunk.min_us >= lo and (hi is None or chunk.max_us < hi)
+            mask = None
+            if not inside:
+                mask = ts >= lo if hi is None else (ts >= lo) & (ts < hi)
+            attack = chunk.col("attack") if mask is None else chunk.col("attack")[mask]
+            ip = chunk.col("ip") if mask is None else chunk.col("ip")[mask]
+            requests += len(attack)
+            dicts = chunk.meta["dicts"]
+
+            hit = attack > 0
+            n_attacks = int(np.count_nonzero(hit))
+            attacks += n_attacks
+            ips.update(dicts["ip"][i] for i in np.flatnonzero(np.bincount(ip, minlength=len(dicts["ip"]))))
+            if not n_attacks:
+                continue
+            _add_counts(types, dicts["attack"], np.bincount(attack[hit], minlength=len(dicts["attack"])))
+            ep = chunk.col("endpoint") if mask is None else chunk.col("endpoint")[mask]
+            _add_counts(endpoints, dicts["endpoint"], np.bincount(ep[hit], minlength=len(dicts["endpoint"])))
+            at_ts = ts[hit] if mask is None else ts[mask][hit]
+            hour_of_day += np.bincount((at_ts // _HOUR_US) % 24, minlength=24)
+
+        types.pop("", None)
+        top = sorted(endpoints.items(), key=lambda kv: (-kv[1], kv[0]))[:top_endpoints]
+        return {
+            "attackTypeDistribution": [
+                {"name": k, "value": v} for k, v in sorted(types.items(), key=lambda kv: (-kv[1], kv[0]))
+            ],
+            "topEndpoints": [{"endpoint": k, "attacks": v} for k, v in top],
+            "hourlyAttackVolume": [{"hour": f"{h:02d}:00", "attacks": int(hour_of_day[h])} for h in range(24)],
+            "totalAttacks": attacks,
+            "totalRequests": requests,
+            "uniqueIps": len(ips),
+            "since": start_s,
+            "until": end_s,
+            "coveredUntil": covered_until / 1_000_000 if covered_until is not None else None,
+            "scannedRows": scanned,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        chunks = self.chunks()
+        return {
+            "chunks": len(chunks),
+            "events": sum(c.meta["events"] for c in chunks),
+            "bytesOnDisk": sum(
+                os.path.getsize(os.path.join(c.path, f)) for c in chunks for f in os.listdir(c.path)
+            ),
+            "compactedSegments": self._compacted_segments,
+            "compactedEvents": self._compacted_events,
+            "retired": self._retired,
+            "lastCompactAgeS": round(time.time() - self._last_compact_s, 3) if self._last_compact_s else None,
+        }
+
+
+def _intern(ids: Dict[str, int], value: str) -> int:
+    i = ids.get(value)
+    if i is None:
+        i = ids[value] = len(ids)
+    return i
+
+
+def _add_counts(out: Dict[str, int], names: List[str], counts: np.ndarray) -> None:
+    for i in np.flatnonzero(counts):
+        name = names[i]
+        out[name] = out.get(name, 0) + int(counts[i])
@@ -0,0 +1,117 @@
+"""
+Serialized responses for polled dashboard routes, keyed on engine versions.
+
+The engine bumps a global version on every ingested event, and a per-IP
+version on the events of that IP (`DetectionEngine.analytics_version()` /
+`attacker_version()`, which also carry the clock granularity a payload
+depends on). A route asks for its version first:
+
+- The ETag is a digest of (route, arguments, version). The detector's boot
+  id is part of the version, so every worker derives the same ETag and a
+  restarted detector never reuses one.
+- `If-None-Match` with the current ETag: 304, nothing is built or sent.
+- Otherwise the JSON bytes are served from an LRU (bounded by entries and
+  bytes) or built once; concurrent requests for the same ETag wait for
+  that one build instead of each serializing the payload.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an `If-None-Match` header value covers `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    Must be used from the event loop thread (the build futures belong to it).
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes: int = 0
+        self._building: Dict[str, "asyncio.Future[bytes]"] = {}
+
+        self._hits: int = 0
+        self._misses: int = 0
+        self._coalesced: int = 0
+        self._not_modified: int = 0
+
+    @staticmethod
+    def etag(name: str, args: Dict[str, Any], version: Any) -> str:
+        # JSON, not repr: tuples and lists (versions fetched over IPC) hash alike.
+        key = json.dumps([name, args, version], sort_keys=True, separators=(",", ":"))
+        return '"' + blake2b(key.encode("utf-8", "surrogatepass"), digest_size=12).hexdigest() + '"'
+
+    def not_modified(self, if_none_match: Optional[str], etag: str) -> bool:
+        if etag_matches(if_none_match, etag):
+            self._not_modified += 1
+            return True
+        return False
+
+    async def get_or_build(self, etag: str, build: Callable[[], Awaitable[Any]]) -> bytes:
+        """Cached JSON bytes for `etag`, else `await build()` serialized (once)."""
+        body = self._entries.get(etag)
+        if body is not None:
+            self._entries.move_to_end(etag)
+            self._hits += 1
+            return body
+        pending = self._building.get(etag)
+        if pending is not None:
+            self._coalesced += 1
+            return await asyncio.shield(pending)
+
+        self._misses += 1
+        future: "asyncio.Future[bytes]" = asyncio.get_running_loop().create_future()
+        self._building[etag] = future
+        try:
+            result = await build()
+            body = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+                future.exception()  # waiters re-raise it; nobody else has to
+            raise
+        finally:
+            del self._building[etag]
+        self._store(etag, body)
+        future.set_result(body)
+        return body
+
+    def _store(self, etag: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        self._entries[etag] = body
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _old, old_body = self._entries.popitem(last=False)
+            self._bytes -= len(old_body)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "maxEntries": self.max_entries,
+            "maxBytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "notModified": self._not_modified,
+        }
@@ -0,0 +1,384 @@
+"""
+Pluggable detection rules.
+
+A rule declares which requests it cares about (exact paths, path prefixes,
+a regex on the path, HTTP methods; or nothing, meaning every request) and
+is evaluated in two phases per event:
+
+1. `observe(ctx)`: update per-attacker state (counters, streaks), the
+   source's prefix nodes (`ctx.subnets`) or login account (`ctx.account`).
+   Runs for every rule the event dispatches to.
+2. The engine recomputes the risk score once.
+3. `evaluate(ctx)`: decide. Rules run in priority order; the first one
+   returning an attack type (or `SUPPRESS`) ends the chain.
+
+`RuleIndex` precomputes the dispatch: a dict of exact paths, a prefix
+tuple and one combined regex act as pre-filters, and the resolved rule
+list is cached per (method, path). Every rule keeps invocation counts and
+cumulative time (see `RuleIndex.stats()`).
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+# Returned by `evaluate` to end the chain without emitting an attack event.
+SUPPRESS = ""
+
+
+class RuleContext:
+    """Per-event inputs shared by all rules (and the regex match of the current one)."""
+
+    __slots__ = ("st", "event", "endpoint", "method", "status", "auth_success", "ts", "match", "subnets", "account")
+
+    def __init__(
+        self,
+        st: Any,
+        event: Dict[str, Any],
+        endpoint: str,
+        method: str,
+        ts: float,
+        subnets: Tuple[Any, ...] = (),
+        account: Any = None,
+    ) -> None:
+        self.st = st
+        self.event = event
+        self.endpoint = endpoint
+        self.method = method
+        self.status = int(event.get("status_code") or 200)
+        self.auth_success = event.get("auth_success", None)
+        self.ts = ts
+        self.match: Optional[re.Match] = None
+        # Prefix nodes of the source IP, most specific first (`app.services.subnets`).
+        self.subnets = subnets
+        # Tracked login account of the event, if any (`app.services.accounts`).
+        self.account = account
+
+
+class Rule:
+    """
+    Base class for rules. Subclasses set the selectors and override
+    `observe` and/or `evaluate`.
+    """
+
+    name: str = "rule"
+    # Lower runs first in the evaluate phase.
+    priority: int = 100
+    exact: Tuple[str, ...] = ()
+    prefixes: Tuple[str, ...] = ()
+    pattern: Optional[str] = None
+    methods: Optional[Tuple[str, ...]] = None
+
+    def __init__(self) -> None:
+        # Evaluate phase.
+        self.calls: int = 0
+        self.emits: int = 0
+        self.total_ns: int = 0
+        self.max_ns: int = 0
+        # Observe phase (timed the same way, reported separately).
+        self.observe_calls: int = 0
+        self.observe_ns: int = 0
+        self.observe_max_ns: int = 0
+        self._re: Optional[Pattern[str]] = re.compile(self.pattern) if self.pattern else None
+        # Dispatch skips the observe phase for rules that do not override it.
+        self.observes = type(self).observe is not Rule.observe
+
+    @property
+    def is_global(self) -> bool:
+        return not (self.exact or self.prefixes or self.pattern)
+
+    def select(self, method: str, endpoint: str) -> Tuple[bool, Optional[re.Match]]:
+        """Whether this rule applies to a request (and the regex match, if any)."""
+        if self.methods is not None and method not in self.methods:
+            return False, None
+        if self.is_global or endpoint in self.exact or (self.prefixes and endpoint.startswith(self.prefixes)):
+            return True, None
+        if self._re is not None:
+            m = self._re.search(endpoint)
+            if m:
+                return True, m
+        return False, None
+
+    def observe(self, ctx: RuleContext) -> None:
+        pass
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        return None
+
+
+class RuleIndex:
+    """Precomputed endpoint dispatch over a set of rules."""
+
+    def __init__(self, rules: List[Rule], cache_size: int = 4096) -> None:
+        self.cache_size = cache_size
+        self._rules: List[Rule] = []
+        self._cache: Dict[Tuple[str, str], Tuple[Tuple[Rule, Optional[re.Match]], ...]] = {}
+        for rule in rules:
+            self._rules.append(rule)
+        self._build()
+
+    def register(self, rule: Rule) -> None:
+        self._rules.append(rule)
+        self._build()
+
+    @property
+    def rules(self) -> List[Rule]:
+        return list(self._rules)
+
+    def _build(self) -> None:
+        # Stable sort: equal priorities keep registration order.
+        self._rules.sort(key=lambda r: r.priority)
+        self._global = [r for r in self._rules if r.is_global]
+        self._exact: Dict[str, List[Rule]] = {}
+        for r in self._rules:
+            for path in r.exact:
+                self._exact.setdefault(path, []).append(r)
+        self._prefixed = [r for r in self._rules if r.prefixes]
+        self._all_prefixes: Tuple[str, ...] = tuple(p for r in self._prefixed for p in r.prefixes)
+        self._patterned = [r for r in self._rules if r.pattern]
+        self._combined: Optional[Pattern[str]] = (
+            re.compile("|".join(f"(?:{r.pattern})" for r in self._patterned)) if self._patterned else None
+        )
+        self._cache.clear()
+
+    def dispatch(self, method: str, endpoint: str) -> Tuple[Tuple[Rule, Optional[re.Match]], ...]:
+        """Rules relevant to a request, in priority order (cached per method + path)."""
+        key = (method, endpoint)
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+
+        candidates = set(self._global)
+        candidates.update(self._exact.get(endpoint, ()))
+        if self._all_prefixes and endpoint.startswith(self._all_prefixes):
+            candidates.update(self._prefixed)
+        if self._combined is not None and self._combined.search(endpoint):
+            candidates.update(self._patterned)
+
+        selected = []
+        for rule in self._rules:
+            if rule in candidates:
+                ok, m = rule.select(method, endpoint)
+                if ok:
+                    selected.append((rule, m))
+        result = tuple(selected)
+
+        # Paths are attacker-controlled: bound the cache rather than grow it.
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key] = result
+        return result
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "rule": r.name,
+                "priority": r.priority,
+                "calls": r.calls,
+                "emits": r.emits,
+                "totalMs": round(r.total_ns / 1e6, 3),
+                "avgUs": round(r.total_ns / r.calls / 1e3, 3) if r.calls else 0.0,
+                "maxUs": round(r.max_ns / 1e3, 3),
+                "observeCalls": r.observe_calls,
+                "observeMs": round(r.observe_ns / 1e6, 3),
+                "observeAvgUs": round(r.observe_ns / r.observe_calls / 1e3, 3) if r.observe_calls else 0.0,
+                "observeMaxUs": round(r.observe_max_ns / 1e3, 3),
+            }
+            for r in self._rules
+        ]
+
+
+# -------------------------
+# Built-in rules
+# -------------------------
+
+
+class ReconRule(Rule):
+    """Recon / traversal-ish endpoints (very common honeypot noise)."""
+
+    name = "recon"
+    priority = 10
+    exact = ("/.env", "/wp-admin/admin-ajax.php", "/wp-admin")
+    pattern = r"\.\."
+
+    def observe(self, ctx: RuleContext) -> None:
+        ctx.st.recon_hits += 1
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        return "Path Traversal"
+
+
+class AccountStuffingRule(Rule):
+    """
+    Cross-IP credential stuffing: one account's failed logins arriving from
+    many source addresses (rotating proxies / botnets).
+    """
+
+    name = "account-stuffing"
+    priority = 12
+    exact = ("/login",)
+    # Failed logins of the account in the tracker's window (count-min estimate).
+    threshold = 20
+    min_sources = 5
+    emit_every = 3
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        acc = ctx.account
+        if ctx.auth_success is not False or acc is None or acc.window_failures < self.threshold:
+            return None
+        if ctx.st.failed_logins_60s.total(ctx.ts) >= FailedLoginRule.threshold:
+            return None  # one IP over its own threshold: plain brute force
+        if acc.source_count() < self.min_sources:
+            return None
+        acc.flagged += 1
+        # Throttle on the account's own failure count (the same in every replay shard).
+        return "Cross-IP Credential Stuffing" if acc.failures % self.emit_every == 0 else SUPPRESS
+
+
+class SubnetBruteForceRule(Rule):
+    """
+    Distributed brute force: failed logins spread over the addresses of one
+    prefix, each IP staying under the per-IP threshold.
+    """
+
+    name = "subnet-brute-force"
+    priority = 15
+    exact = ("/login",)
+    # Decayed failed logins of the prefix (about 1.44 half-lives' worth).
+    threshold = 20.0
+    min_sources = 3
+    emit_every = 3
+
+    def observe(self, ctx: RuleContext) -> None:
+        if ctx.auth_success is False:
+            for node in ctx.subnets:
+                node.failures += 1.0
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        if ctx.auth_success is not False:
+            return None
+        if ctx.st.failed_logins_60s.total(ctx.ts) >= FailedLoginRule.threshold:
+            return None  # one IP over its own threshold: plain brute force
+        node = _hot_subnet(ctx, "failures", self.threshold, self.min_sources)
+        if node is None:
+            return None
+        node.flagged += 1
+        return "Distributed Brute Force" if node.flagged % self.emit_every == 0 else SUPPRESS
+
+
+class FailedLoginRule(Rule):
+    """Failed logins: credential stuffing, then brute force past a 60s threshold."""
+
+    name = "failed-login"
+    priority = 20
+    exact = ("/login",)
+    threshold = 10
+    # Reduce spam: emit every n-th failed login once over the threshold.
+    emit_every = 3
+
+    def observe(self, ctx: RuleContext) -> None:
+        if ctx.auth_success is False:
+            ctx.st.failed_logins_60s.add(ctx.ts)
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        if ctx.auth_success is not False:
+            return None
+        st = ctx.st
+        if st.failed_logins_60s.total(ctx.ts) >= self.threshold:
+            # Only /login failures should be marked brute force.
+            st.brute_force_emits += 1
+            return "Brute Force" if st.brute_force_emits % self.emit_every == 0 else SUPPRESS
+        # still suspicious but lower
+        return "Credential Stuffing"
+
+
+class SequentialIdRule(Rule):
+    """IDOR enumeration: sequential user IDs."""
+
+    name = "sequential-id"
+    priority = 30
+    pattern = r"^/api/users/(\d+)$"
+
+    def observe(self, ctx: RuleContext) -> None:
+        st = ctx.st
+        user_id = int(ctx.match.group(1))
+        if st.last_user_id is not None and user_id == st.last_user_id + 1:
+            st.sequential_id_hits += 1
+        else:
+            st.sequential_id_hits = 0
+        st.last_user_id = user_id
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        # Mark IDOR as soon as a sequence starts (after at least 2 steps).
+        return "IDOR" if ctx.st.sequential_id_hits >= 1 else None
+
+
+class SubnetEnumerationRule(Rule):
+    """
+    Distributed IDOR enumeration: user lookups spread over the addresses of
+    one prefix (rotating IPs defeat the per-IP sequence check).
+    """
+
+    name = "subnet-enumeration"
+    priority = 25
+    pattern = r"^/api/users/\d+$"
+    threshold = 30.0
+    min_sources = 3
+
+    def observe(self, ctx: RuleContext) -> None:
+        for node in ctx.subnets:
+            node.enumeration += 1.0
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        if ctx.st.sequential_id_hits >= 1:
+            return None  # the per-IP sequence rule reports it as IDOR
+        node = _hot_subnet(ctx, "enumeration", self.threshold, self.min_sources)
+        if node is None:
+            return None
+        node.flagged += 1
+        return "Distributed Enumeration"
+
+
+class RateAbuseRule(Rule):
+    """High-frequency API abuse: more than `limit` requests in the last 60s."""
+
+    name = "rate-abuse"
+    priority = 80
+    limit = 120
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        return "API Abuse" if ctx.st.requests_60s.total(ctx.ts) > self.limit else None
+
+
+class ErrorScanRule(Rule):
+    """Scanner-ish: probing endpoints that error out."""
+
+    name = "error-scan"
+    priority = 90
+
+    def evaluate(self, ctx: RuleContext) -> Optional[str]:
+        # A single 404 shouldn't become HIGH risk; risk stays driven by windows.
+        return "Scanner" if ctx.status >= 400 else None
+
+
+def _hot_subnet(ctx: RuleContext, counter: str, threshold: float, min_sources: int) -> Any:
+    """Most specific prefix of the source over `threshold` with enough distinct sources."""
+    for node in ctx.subnets:
+        # Nodes were touched by this event: their counters are current.
+        if getattr(node, counter) >= threshold and node.source_count() >= min_sources:
+            return node
+    return None
+
+
+def default_rules() -> List[Rule]:
+    return [
+        ReconRule(),
+        AccountStuffingRule(),
+        SubnetBruteForceRule(),
+        FailedLoginRule(),
+        SubnetEnumerationRule(),
+        SequentialIdRule(),
+        RateAbuseRule(),
+        ErrorScanRule(),
+    ]
@@ -0,0 +1,326 @@
+"""
+Fixed-memory streaming sketches.
+
+- `CountMinSketch`: frequency estimates that never undercount; with width
+  w and depth d, the overcount is at most e/w * N (N = total count) with
+  probability 1 - e^-d.
+- `WindowedCountMin`: the same over a sliding window of `buckets` time
+  buckets, with a running total so an update or query reads d counters.
+- `HyperLogLog`: distinct counts in 2^p one-byte registers (standard
+  error ~1.04 / sqrt(2^p)), with linear counting for small cardinalities.
+- `SpaceSaving`: the k most frequent keys of a stream in k counters. Every
+  count overestimates by at most its recorded error, which is at most N/k;
+  any key that is not listed occurred at most `floor` times.
+
+The hashed sketches use `hash64` (BLAKE2b, stable across processes and
+restarts, unlike `hash()`), so sketches survive snapshots and two sketches
+with the same shape can be merged.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import operator
+from array import array
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def hash64(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big")
+
+
+def _rows(h: int, width: int, depth: int) -> List[int]:
+    # Double hashing: row i uses h1 + i * h2 (Kirsch-Mitzenmacher).
+    h1, h2 = h >> 32, (h & 0xFFFFFFFF) | 1
+    return [i * width + (h1 + i * h2) % width for i in range(depth)]
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 4096, depth: int = 4) -> None:
+        self.width = max(1, width)
+        self.depth = max(1, depth)
+        self.total = 0
+        self._counts = array("I", bytes(4 * self.width * self.depth))
+
+    def add(self, key: str, n: int = 1) -> int:
+        """Count `key` `n` more times; returns its new estimate."""
+        return self.add_hash(hash64(key), n)
+
+    def add_hash(self, h: int, n: int = 1) -> int:
+        counts = self._counts
+        est = None
+        for i in _rows(h, self.width, self.depth):
+            v = counts[i] + n
+            counts[i] = v
+            if est is None or v < est:
+                est = v
+        self.total += n
+        return est or 0
+
+    def estimate(self, key: str) -> int:
+        return self.estimate_hash(hash64(key))
+
+    def estimate_hash(self, h: int) -> int:
+        counts = self._counts
+        return min(counts[i] for i in _rows(h, self.width, self.depth))
+
+    def error_bound(self) -> int:
+        """Overcount bound (e/w * N) holding with probability 1 - e^-depth."""
+        return math.ceil(math.e / self.width * self.total)
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("count-min sketches of different shapes")
+        self._counts = array("I", map(operator.add, self._counts, other._counts))
+        self.total += other.total
+
+    def memory_bytes(self) -> int:
+        return self._counts.itemsize * len(self._counts)
+
+
+class WindowedCountMin:
+    """
+    Count-min over the last `buckets * bucket_s` seconds: one sketch per
+    bucket plus their running sum; expired buckets are subtracted from the
+    sum as time moves on (by event time: `ts` of the updates).
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4, buckets: int = 10, bucket_s: float = 60.0) -> None:
+        self.width = max(1, width)
+        self.depth = max(1, depth)
+        self.bucket_s = bucket_s
+        n = self.width * self.depth
+        self._buckets: List[array] = [array("I", bytes(4 * n)) for _ in range(max(1, buckets))]
+        self._bucket_totals: List[int] = [0] * len(self._buckets)
+        self._sum = array("I", bytes(4 * n))
+        self._current: Optional[int] = None  # absolute bucket number
+
+    @property
+    def window_s(self) -> float:
+        return self.bucket_s * len(self._buckets)
+
+    @property
+    def total(self) -> int:
+        return sum(self._bucket_totals)
+
+    def advance(self, ts: float) -> bool:
+        """Move the window to `ts`; True if buckets expired."""
+        b = int(ts // self.bucket_s)
+        if self._current is None:
+            self._current = b
+            return False
+        if b <= self._current:
+            return False
+        k = len(self._buckets)
+        for step in range(1, min(b - self._current, k) + 1):
+            slot = (self._current + step) % k
+            old = self._buckets[slot]
+            if self._bucket_totals[slot]:
+                self._sum = array("I", map(operator.sub, self._sum, old))
+                self._buckets[slot] = array("I", bytes(4 * len(old)))
+                self._bucket_totals[slot] = 0
+        self._current = b
+        return True
+
+    def add_hash(self, h: int, ts: float, n: int = 1) -> int:
+        self.advance(ts)
+        slot = (self._current or 0) % len(self._buckets)
+        bucket, total = self._buckets[slot], self._sum
+        est = None
+        for i in _rows(h, self.width, self.depth):
+            bucket[i] += n
+            v = total[i] + n
+            total[i] = v
+            if est is None or v < est:
+                est = v
+        self._bucket_totals[slot] += n
+        return est or 0
+
+    def estimate_hash(self, h: int) -> int:
+        total = self._sum
+        return min(total[i] for i in _rows(h, self.width, self.depth))
+
+    def error_bound(self) -> int:
+        return math.ceil(math.e / self.width * self.total)
+
+    def memory_bytes(self) -> int:
+        return 4 * self.width * self.depth * (len(self._buckets) + 1)
+
+
+class HyperLogLog:
+    __slots__ = ("p", "_registers")
+
+    def __init__(self, p: int = 12) -> None:
+        self.p = max(4, min(16, p))
+        self._registers = bytearray(1 << self.p)
+
+    def add(self, key: str) -> None:
+        self.add_hash(hash64(key))
+
+    def add_hash(self, h: int) -> None:
+        p = self.p
+        idx = h >> (64 - p)
+        rest_bits = 64 - p
+        rank = rest_bits - (h & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self._registers[idx]:
+            self._registers[idx] = rank
+
+    def count(self) -> int:
+        regs = self._registers
+        m = len(regs)
+        zeros = regs.count(0)
+        if zeros == m:
+            return 0
+        alpha = 0.673 if m == 16 else 0.697 if m == 32 else 0.709 if m == 64 else 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in regs)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # small range: linear counting
+        return round(raw)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError("HyperLogLogs of different precision")
+        self._registers = bytearray(map(max, self._registers, other._registers))
+
+    def union(self, other: "HyperLogLog") -> "HyperLogLog":
+        out = HyperLogLog(self.p)
+        out._registers = self._registers[:]
+        out.merge(other)
+        return out
+
+    def clear(self) -> None:
+        self._registers = bytearray(len(self._registers))
+
+    def memory_bytes(self) -> int:
+        return len(self._registers)
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k (Metwally et al.): at most `k` monitored keys. An
+    unmonitored key takes over the smallest counter and inherits its count
+    as error. Mergeable (Agarwal et al.): `merge` and `from_summary` combine
+    summaries of different streams (e.g. several sensors) with the same
+    guarantees over the combined stream.
+    """
+
+    def __init__(self, k: int = 100) -> None:
+        self.k = max(1, k)
+        self.total = 0
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        # One (count, key) entry per monitored key; an entry may lag behind
+        # its counter (counts only grow), fixed when it reaches the top.
+        self._heap: List[Tuple[int, str]] = []
+        # Count a key may have had before it was first monitored (non-zero
+        # after merging, or when rebuilt from a truncated summary).
+        self._min_floor = 0
+
+    def add(self, key: str, n: int = 1) -> int:
+        """Count `key` `n` more times; returns its new (over)estimate."""
+        self.total += n
+        counts = self._counts
+        count = counts.get(key)
+        if count is not None:
+            counts[key] = count + n
+            return count + n
+        heap = self._heap
+        if len(counts) < self.k:
+            error = self._min_floor
+            heapq.heappush(heap, (error + n, key))
+        else:
+            error, victim = self._min_entry()
+            del counts[victim]
+            del self._errors[victim]
+            heapq.heapreplace(heap, (error + n, key))
+        counts[key] = error + n
+        self._errors[key] = error
+        return error + n
+
+    def _min_entry(self) -> Tuple[int, str]:
+        heap, counts = self._heap, self._counts
+        while True:
+            value, key = heap[0]
+            if value == counts[key]:
+                return value, key
+            heapq.heapreplace(heap, (counts[key], key))
+
+    @property
+    def floor(self) -> int:
+        """Upper bound on the count of any key that is not monitored."""
+        if len(self._counts) < self.k:
+            return self._min_floor
+        return self._min_entry()[0]
+
+    def top(self, limit: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """(key, count, error) by count, then key; true count is in [count - error, count]."""
+        items = ((key, count, self._errors[key]) for key, count in self._counts.items())
+        return heapq.nsmallest(limit or self.k, items, key=lambda t: (-t[1], t[0]))
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """
+        Fold in a summary of another stream: a key missing from one side is
+        counted at that side's `floor` (as error), then the k largest stay.
+        """
+        floor_a, floor_b = self.floor, other.floor
+        merged: Dict[str, Tuple[int, int]] = {}
+        for key in self._counts.keys() | other._counts.keys():
+            ca = self._counts.get(key)
+            cb = other._counts.get(key)
+            count = (floor_a if ca is None else ca) + (floor_b if cb is None else cb)
+            error = (floor_a if ca is None else self._errors[key]) + (floor_b if cb is None else other._errors[key])
+            merged[key] = (count, error)
+        kept = heapq.nsmallest(self.k, merged.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        self._counts = {key: c for key, (c, _e) in kept}
+        self._errors = {key: e for key, (_c, e) in kept}
+        self._heap = [(c, key) for key, c in self._counts.items()]
+        heapq.heapify(self._heap)
+        self._min_floor = floor_a + floor_b
+        self.total += other.total
+
+    def summary(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "items": [
+                {"key": key, "count": count, "error": error, "guaranteed": count - error}
+                for key, count, error in self.top(limit)
+            ],
+            "total": self.total,
+            "k": self.k,
+            # Unlisted keys occurred at most this often.
+            "floor": self.floor,
+            # No count overestimates by more than this (N / k).
+            "errorBound": self.total // self.k,
+        }
+
+    @classmethod
+    def from_summary(cls, summary: Dict[str, Any]) -> "SpaceSaving":
+        """
+        Rebuild from `summary()` output (e.g. fetched from another sensor)
+        so it can be merged; keys that are not listed are covered by its
+        `floor`.
+        """
+        out = cls(summary["k"])
+        out.total = summary["total"]
+        out._min_floor = summary["floor"]
+        for item in summary["items"]:
+            out._counts[item["key"]] = item["count"]
+            out._errors[item["key"]] = item["error"]
+        out._heap = [(c, key) for key, c in out._counts.items()]
+        heapq.heapify(out._heap)
+        return out
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+def merge_summaries(summaries: Iterable[Dict[str, Any]], k: Optional[int] = None) -> Dict[str, Any]:
+    """Combine `SpaceSaving.summary()` outputs of several streams into one."""
+    merged: Optional[SpaceSaving] = None
+    for s in summaries:
+        part = SpaceSaving.from_summary(s)
+        if merged is None:
+            merged = SpaceSaving(k or part.k)
+        merged.merge(part)
+    return (merged or SpaceSaving(k or 1)).summary()
@@ -0,0 +1,306 @@
+"""
+Subnet-level state (IPv4 / IPv6 prefix trie) for distributed attacks.
+
+Per-IP rules miss campaigns spread over many addresses of one network.
+`SubnetTrie` keeps decayed counters per prefix, next to the per-IP state:
+
+- One trie per address family with a level per configured prefix length
+  (default /16 and /24 for IPv4, /48 and /64 for IPv6). Children are keyed
+  by their full prefix, so an update is one dict get per level.
+- Counters decay exponentially with `half_life_s` (a steady r/s settles at
+  about 1.44 * r * half-life): requests here, failed logins and user
+  enumeration from the subnet rules (`app.services.rules`).
+- Distinct sources: a 256-bit bitmap of host bits for the current and the
+  previous window (two half-lives). Exact for /24s (one bit per host), a
+  linear-counting estimate for wider prefixes.
+- Bounded: past `max_nodes`, the most specific prefixes whose decayed
+  request count fell below `min_requests`, then the weakest ones, are
+  pruned down to 75% of the cap (emptied parents go with them). A prefix
+  costs ~400 bytes against several KB per `AttackerState`, so a spray from
+  millions of addresses costs far less here than in the per-IP table (see
+  `benchmarks/bench_subnets.py`).
+"""
+
+from __future__ import annotations
+
+import heapq
+import ipaddress
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.services.geoip import parse_ip
+
+_BITMAP_BITS = 256
+_GOLDEN64 = 0x9E3779B97F4A7C15
+_U64 = (1 << 64) - 1
+
+
+class SubnetNode:
+    __slots__ = (
+        "key",
+        "length",
+        "host_bits",
+        "first_seen_s",
+        "last_s",
+        "total",
+        "requests",
+        "failures",
+        "enumeration",
+        "flagged",
+        "epoch",
+        "sources",
+        "prev_sources",
+        "children",
+    )
+
+    def __init__(self, key: int, length: int, host_bits: int, ts: float, epoch: int) -> None:
+        self.key = key  # network address >> host_bits
+        self.length = length
+        self.host_bits = host_bits
+        self.first_seen_s = ts
+        self.last_s = ts
+        self.total = 0  # not decayed
+        self.requests = 0.0
+        self.failures = 0.0
+        self.enumeration = 0.0
+        # Requests a subnet rule attributed to this prefix (not decayed).
+        self.flagged = 0
+        self.epoch = epoch
+        self.sources = 0
+        self.prev_sources = 0
+        self.children: Optional[Dict[int, "SubnetNode"]] = None
+
+    def decayed(self, value: float, now_s: float, half_life_s: float) -> float:
+        dt = now_s - self.last_s
+        return value * 0.5 ** (dt / half_life_s) if dt > 0 else value
+
+    def source_count(self) -> int:
+        """Distinct addresses seen over the last one to two windows."""
+        ones = (self.sources | self.prev_sources).bit_count()
+        if self.host_bits <= 8:
+            return ones
+        zeros = _BITMAP_BITS - ones
+        return round(_BITMAP_BITS * math.log(_BITMAP_BITS / max(1, zeros)))
+
+
+class SubnetTrie:
+    def __init__(
+        self,
+        v4_prefixes: Sequence[int] = (16, 24),
+        v6_prefixes: Sequence[int] = (48, 64),
+        half_life_s: float = 60.0,
+        max_nodes: int = 200_000,
+        min_requests: float = 0.5,
+    ) -> None:
+        # Family (4 / 6) -> (address bits, prefix lengths, shortest first).
+        self.levels: Dict[int, Tuple[int, Tuple[int, ...]]] = {
+            4: (32, tuple(sorted({p for p in v4_prefixes if 0 < p <= 32}))),
+            6: (128, tuple(sorted({p for p in v6_prefixes if 0 < p <= 128}))),
+        }
+        self.half_life_s = half_life_s
+        self.window_s = 2 * half_life_s
+        self.max_nodes = max(16, max_nodes)
+        self.min_requests = min_requests
+        # Per family: (length, host bits, has children) for each level.
+        self._plan: Dict[int, Tuple[Tuple[int, int, bool], ...]] = {
+            version: tuple((length, bits - length, i < len(lengths) - 1) for i, length in enumerate(lengths))
+            for version, (bits, lengths) in self.levels.items()
+        }
+        self._roots: Dict[int, Dict[int, SubnetNode]] = {4: {}, 6: {}}
+        self._nodes: int = 0
+        self._pruned: int = 0
+        self._prunes: int = 0
+
+    # -------------------------
+    # Updates
+    # -------------------------
+
+    def observe(self, ip: str, ts: float) -> Tuple[SubnetNode, ...]:
+        """
+        Count one request from `ip` at every configured prefix. Returns the
+        nodes, most specific first (empty for unparseable addresses).
+        """
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return ()
+        version, n = parsed
+        epoch = int(ts // self.window_s)
+        children: Any = self._roots[version]
+        path: List[SubnetNode] = []
+        for length, host_bits, inner in self._plan[version]:
+            key = n >> host_bits
+            node = children.get(key)
+            if node is None:
+                node = children[key] = SubnetNode(key, length, host_bits, ts, epoch)
+                self._nodes += 1
+                if inner:
+                    node.children = {}
+            elif ts > node.last_s:
+                f = 0.5 ** ((ts - node.last_s) / self.half_life_s)
+                node.requests *= f
+                node.failures *= f
+                node.enumeration *= f
+                node.last_s = ts
+            node.total += 1
+            node.requests += 1.0
+            if epoch != node.epoch:
+                node.prev_sources = node.sources if epoch == node.epoch + 1 else 0
+                node.sources = 0
+                node.epoch = epoch
+            node.sources |= 1 << _host_slot(n & ((1 << host_bits) - 1), host_bits)
+            path.append(node)
+            children = node.children
+        if self._nodes > self.max_nodes:
+            self.prune(ts)
+        path.reverse()
+        return tuple(path)
+
+    def prune(self, now_s: float) -> int:
+        """
+        Drop most specific prefixes whose decayed request count is under
+        `min_requests` or among the weakest, down to 75% of `max_nodes`;
+        then prefixes left without children.
+        """
+        h = self.half_life_s
+        leaves = [
+            (node.requests * 0.5 ** ((now_s - node.last_s) / h), parent, key) for parent, key, node in self._leaves()
+        ]
+        cutoff = self.min_requests
+        excess = self._nodes - self.max_nodes * 3 // 4
+        if excess > 0 and leaves:
+            scores = sorted(score for score, _parent, _key in leaves)
+            cutoff = max(cutoff, scores[min(excess, len(scores)) - 1])
+        removed = 0
+        for score, parent, key in leaves:
+            if score < cutoff or (excess > removed and score == cutoff):
+                del parent[key]
+                removed += 1
+        for root in self._roots.values():
+            removed += _drop_empty(root)
+        self._nodes -= removed
+        self._pruned += removed
+        self._prunes += 1
+        return removed
+
+    def _leaves(self) -> Iterator[Tuple[Dict[int, SubnetNode], int, SubnetNode]]:
+        stack = list(self._roots.values())
+        while stack:
+            children = stack.pop()
+            for key, node in children.items():
+                if node.children is None:
+                    yield children, key, node
+                elif node.children:
+                    stack.append(node.children)
+
+    def shard_key(self, ip: str) -> str:
+        """Shortest configured prefix of `ip`: sharding by it keeps subnets whole."""
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return ip
+        version, n = parsed
+        bits, lengths = self.levels[version]
+        return f"{version}/{n >> (bits - lengths[0])}" if lengths else ip
+
+    # -------------------------
+    # Reads
+    # -------------------------
+
+    def find(self, cidr: str) -> Optional[SubnetNode]:
+        """Node of a tracked prefix, e.g. "203.0.113.0/24" (None if unknown)."""
+        try:
+            net = ipaddress.ip_network(cidr.strip(), strict=False)
+        except ValueError:
+            return None
+        version, n, length = net.version, int(net.network_address), net.prefixlen
+        if version == 6 and n >> 32 == 0xFFFF and length >= 96:
+            version, n, length = 4, n & 0xFFFFFFFF, length - 96  # IPv4-mapped
+        bits, lengths = self.levels[version]
+        if length not in lengths:
+            return None
+        children: Optional[Dict[int, SubnetNode]] = self._roots[version]
+        for level in lengths:
+            node = children.get(n >> (bits - level)) if children else None
+            if node is None or level == length:
+                return node
+            children = node.children
+        return None
+
+    def profile(self, node: SubnetNode, now_s: float, children: int = 10) -> Dict[str, Any]:
+        h = self.half_life_s
+        out = _summary(node, now_s, h)
+        out.update(
+            {
+                "firstSeen": datetime.fromtimestamp(node.first_seen_s, timezone.utc).isoformat(),
+                "lastSeen": datetime.fromtimestamp(node.last_s, timezone.utc).isoformat(),
+                "halfLifeS": h,
+            }
+        )
+        if node.children is not None:
+            top = heapq.nlargest(children, node.children.values(), key=lambda c: c.decayed(c.requests, now_s, h))
+            out["children"] = [_summary(c, now_s, h) for c in top]
+        return out
+
+    def hottest(self, now_s: float, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most specific prefixes by recent failed logins, then recent requests."""
+        h = self.half_life_s
+        leaves = (node for _parent, _key, node in self._leaves())
+        top = heapq.nlargest(
+            limit, leaves, key=lambda c: (c.decayed(c.failures, now_s, h), c.decayed(c.requests, now_s, h))
+        )
+        return [_summary(c, now_s, h) for c in top]
+
+    def __len__(self) -> int:
+        return self._nodes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "nodes": self._nodes,
+            "maxNodes": self.max_nodes,
+            "ipv4Prefixes": list(self.levels[4][1]),
+            "ipv6Prefixes": list(self.levels[6][1]),
+            "halfLifeS": self.half_life_s,
+            "pruned": self._pruned,
+            "prunes": self._prunes,
+        }
+
+
+def _host_slot(host: int, host_bits: int) -> int:
+    if host_bits <= 8:
+        return host
+    # Fibonacci hashing of the host part (folded to 64 bits): top 8 bits.
+    return (((host ^ (host >> 64)) * _GOLDEN64) & _U64) >> 56
+
+
+def _drop_empty(children: Dict[int, SubnetNode]) -> int:
+    """Remove inner prefixes whose children were all pruned; returns the count."""
+    removed = 0
+    for key in list(children):
+        node = children[key]
+        if node.children is None:
+            continue
+        removed += _drop_empty(node.children)
+        if not node.children:
+            del children[key]
+            removed += 1
+    return removed
+
+
+def _cidr(node: SubnetNode) -> str:
+    address = node.key << node.host_bits
+    if node.length + node.host_bits == 32:
+        return str(ipaddress.IPv4Network((address, node.length)))
+    return str(ipaddress.IPv6Network((address, node.length)))
+
+
+def _summary(node: SubnetNode, now_s: float, half_life_s: float) -> Dict[str, Any]:
+    return {
+        "cidr": _cidr(node),
+        "totalRequests": node.total,
+        # Decayed: roughly the last 1.44 half-lives.
+        "recentRequests": round(node.decayed(node.requests, now_s, half_life_s), 2),
+        "recentFailedLogins": round(node.decayed(node.failures, now_s, half_life_s), 2),
+        "recentEnumeration": round(node.decayed(node.enumeration, now_s, half_life_s), 2),
+        "sources": node.source_count(),
+        "flaggedRequests": node.flagged,
+    }
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+from app.core.log_reader import log_end_offset, read_batch
+from app.services.detection_engine import DetectionEngine
+
+
+class LogTailer:
+    """
+    Lifespan-managed background ingestion from the request log.
+
+    Live events normally reach the engine through the writer's flush
+    listener; the tailer picks up everything else (offset gaps, events
+    written by other processes, anything appended while listeners failed)
+    so dashboard routes never read the log themselves.
+
+    - File I/O and JSON parsing run in a worker thread; only rule
+      evaluation runs on the event loop, in slices, yielding in between.
+    - Each iteration reads at most `budget` events. A full budget means
+      we are behind: poll again right away. An empty read doubles the poll
+      interval up to `max_interval_s`; new data resets it.
+    - Backpressure: while `pressure()` is true (e.g. the log writer queue
+      is filling up) the tailer stands back for `max_interval_s` so the
+      request path keeps the loop.
+    - No new reads while the engine's ingestion is paused (a snapshot is
+      being taken); slices already read are queued by the engine, in order.
+    """
+
+    def __init__(
+        self,
+        engine: DetectionEngine,
+        source: Union[str, Any],
+        budget: int = 2000,
+        slice_size: int = 256,
+        min_interval_s: float = 0.05,
+        max_interval_s: float = 2.0,
+        pressure: Optional[Callable[[], bool]] = None,
+        queued: Optional[Callable[[], int]] = None,
+    ) -> None:
+        self.engine = engine
+        self.source = source
+        self.budget = max(1, budget)
+        self.slice_size = max(1, slice_size)
+        self.min_interval_s = min_interval_s
+        self.max_interval_s = max(min_interval_s, max_interval_s)
+        self._pressure = pressure
+        self._queued = queued
+
+        self._task: Optional[asyncio.Task] = None
+        self._interval: float = min_interval_s
+
+        self._iterations: int = 0
+        self._events_read: int = 0
+        self._events_applied: int = 0
+        self._budget_exhausted: int = 0
+        self._backoffs: int = 0
+        self._errors: int = 0
+        self._last_poll_s: float = 0.0
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="log-tailer")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    # -------------------------
+    # Loop
+    # -------------------------
+
+    async def _run(self) -> None:
+        while True:
+            if self._pressure is not None and self._pressure():
+                self._backoffs += 1
+                await asyncio.sleep(self.max_interval_s)
+                continue
+            try:
+                n = await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._errors += 1
+                n = 0
+            if n >= self.budget:
+                self._budget_exhausted += 1
+                self._interval = self.min_interval_s
+                await asyncio.sleep(0)
+                continue
+            if n:
+                self._interval = self.min_interval_s
+            else:
+                self._interval = min(self.max_interval_s, self._interval * 2)
+            await asyncio.sleep(self._interval)
+
+    async def poll_once(self) -> int:
+        """One bounded iteration. Returns the number of records read."""
+        self._iterations += 1
+        self._last_poll_s = time.time()
+        if self.engine.ingest_paused or log_end_offset(self.source) <= self.engine.log_offset:
+            return 0
+        records = await asyncio.to_thread(read_batch, self.source, self.engine.log_offset, self.budget)
+        self._events_read += len(records)
+        for i in range(0, len(records), self.slice_size):
+            self._events_applied += self.engine.apply_records(records[i : i + self.slice_size])
+            await asyncio.sleep(0)
+        return len(records)
+
+    # -------------------------
+    # Introspection
+    # -------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        queued = self._queued() if self._queued is not None else 0
+        out = self.engine.ingestion_lag(log_end_offset(self.source), queued)
+        out.update(
+            {
+                "running": self._task is not None,
+                "pollIntervalS": self._interval,
+                "iterations": self._iterations,
+                "eventsRead": self._events_read,
+                "eventsApplied": self._events_applied,
+                "budget": self.budget,
+                "budgetExhausted": self._budget_exhausted,
+                "backoffs": self._backoffs,
+                "errors": self._errors,
+                "lastPollAgeS": round(time.time() - self._last_poll_s, 3) if self._last_poll_s else None,
+            }
+        )
+        return out
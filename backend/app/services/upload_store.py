@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Optional
+
+
+class UploadStore:
+    """
+    Streaming, content-addressed store for honeypot uploads.
+
+    - Uploads are copied to disk in fixed-size chunks while being hashed
+      (SHA-256); the whole payload is never held in memory.
+    - Blobs live at `blobs/<aa>/<sha256>`, so a webshell re-uploaded
+      thousands of times is stored once.
+    - `index.jsonl` maps request_id + original filename (+ IP) to the hash.
+    - Per-IP and global quotas cap the bytes of *new* blobs on disk. Over
+      quota, the upload is still hashed and indexed but not kept.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        chunk_size: int = 1024 * 1024,
+        per_ip_quota_bytes: Optional[int] = 100 * 1024 * 1024,
+        global_quota_bytes: Optional[int] = 5 * 1024 * 1024 * 1024,
+    ) -> None:
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.index_path = os.path.join(root, "index.jsonl")
+        self.chunk_size = max(4096, chunk_size)
+        self.per_ip_quota_bytes = per_ip_quota_bytes
+        self.global_quota_bytes = global_quota_bytes
+
+        self._global_bytes: int = 0
+        self._ip_bytes: Dict[str, int] = defaultdict(int)
+        self._loaded = False
+        # Uploads are stored from worker threads; guards usage and the index.
+        self._lock = threading.Lock()
+
+        self._uploads: int = 0
+        self._dedup_hits: int = 0
+        self._quota_rejections: int = 0
+
+    # -------------------------
+    # Public API
+    # -------------------------
+
+    async def save(self, fileobj: BinaryIO, filename: str, ip: str, request_id: Optional[str]) -> Dict[str, Any]:
+        """Stream `fileobj` into the store (in a worker thread) and index it."""
+        return await asyncio.to_thread(self._save_blocking, fileobj, filename, ip, request_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "uploads": self._uploads,
+            "dedupHits": self._dedup_hits,
+            "quotaRejections": self._quota_rejections,
+            "storedBytes": self._global_bytes,
+            "globalQuotaBytes": self.global_quota_bytes,
+            "perIpQuotaBytes": self.per_ip_quota_bytes,
+        }
+
+    # -------------------------
+    # Helpers
+    # -------------------------
+
+    def _load(self) -> None:
+        """Rebuild quota usage from the index (blob sizes counted once, by first uploader)."""
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except Exception:
+                        continue
+                    if entry.get("newBlob"):
+                        size = int(entry.get("bytes") or 0)
+                        self._global_bytes += size
+                        self._ip_bytes[str(entry.get("ip"))] += size
+        self._loaded = True
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _remaining(self, ip: str) -> Optional[int]:
+        limits = []
+        if self.global_quota_bytes is not None:
+            limits.append(self.global_quota_bytes - self._global_bytes)
+        if self.per_ip_quota_bytes is not None:
+            limits.append(self.per_ip_quota_bytes - self._ip_bytes[ip])
+        return max(0, min(limits)) if limits else None
+
+    def _save_blocking(self, fileobj: BinaryIO, filename: str, ip: str, request_id: Optional[str]) -> Dict[str, Any]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            budget = self._remaining(ip)
+
+        hasher = hashlib.sha256()
+        size = 0
+        tmp_path: Optional[str] = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+        tmp = open(tmp_path, "wb")
+        try:
+            while True:
+                chunk = fileobj.read(self.chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                size += len(chunk)
+                if tmp is not None:
+                    if budget is not None and size > budget:
+                        # Over quota: keep hashing for the index, stop keeping bytes.
+                        tmp.close()
+                        os.remove(tmp_path)
+                        tmp, tmp_path = None, None
+                    else:
+                        tmp.write(chunk)
+        except BaseException:
+            # Client went away / disk full: never leave the partial file behind.
+            if tmp is not None:
+                tmp.close()
+                tmp = None
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            raise
+        finally:
+            if tmp is not None:
+                tmp.close()
+
+        digest = hasher.hexdigest()
+        dest = self._blob_path(digest)
+        with self._lock:
+            new_blob = False
+            stored = os.path.exists(dest)
+            if stored:
+                self._dedup_hits += 1
+            elif tmp_path is not None:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.replace(tmp_path, dest)
+                tmp_path = None
+                new_blob = stored = True
+                self._global_bytes += size
+                self._ip_bytes[ip] += size
+            else:
+                self._quota_rejections += 1
+            if tmp_path is not None:
+                os.remove(tmp_path)
+
+            self._uploads += 1
+            entry = {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "request_id": request_id,
+                "ip": ip,
+                "filename": filename,
+                "sha256": digest,
+                "bytes": size,
+                "newBlob": new_blob,
+                "stored": stored,
+            }
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from array import array
+from typing import Any, Iterator, List, Optional, Tuple
+
+
+# Distinct buckets a window keeps as (bucket, count) pairs before it
+# switches to the dense ring.
+_SPARSE_MAX = 4
+
+
+class SlidingWindowCounter:
+    """
+    Event counter over a sliding time window made of fixed-width buckets.
+
+    - `buckets` x `bucket_s` seconds, stored in a ring (`array('I')`).
+    - O(1) `add` and O(1) `total` (a running sum is kept; advancing the ring
+      clears at most `buckets` slots, amortized O(1) per call).
+    - Fixed memory per window regardless of the event rate.
+    - Starts sparse: up to `_SPARSE_MAX` (bucket, count) pairs, and only
+      allocates the ring past that. Most IPs send a handful of requests, and
+      every attacker carries several windows (rates, profile series).
+
+    Granularity is one bucket: the window covers the current (partial)
+    bucket plus the `buckets - 1` before it.
+    """
+
+    __slots__ = ("bucket_s", "_n", "_counts", "_pairs", "_head", "_sum")
+
+    def __init__(self, buckets: int, bucket_s: float) -> None:
+        self.bucket_s = bucket_s
+        self._n = max(1, buckets)
+        self._counts: Optional[array] = None  # dense ring, once allocated
+        self._pairs: Optional[List[int]] = None  # sparse: [bucket, count, ...]
+        self._head = -1  # absolute index of the newest bucket (-1: empty)
+        self._sum = 0
+
+    @property
+    def buckets(self) -> int:
+        return self._n
+
+    def add(self, ts: float, n: int = 1) -> None:
+        b = int(ts // self.bucket_s)
+        self._advance(b)
+        if b <= self._head - self._n:
+            return  # older than the window
+        self._sum += n
+        counts = self._counts
+        if counts is not None:
+            counts[b % self._n] += n
+            return
+        pairs = self._pairs
+        if pairs is None:
+            self._pairs = [b, n]
+            return
+        for i in range(0, len(pairs), 2):
+            if pairs[i] == b:
+                pairs[i + 1] += n
+                return
+        if len(pairs) < 2 * _SPARSE_MAX:
+            pairs += (b, n)
+            return
+        self._counts = self._dense()
+        self._pairs = None
+        self._counts[b % self._n] += n
+
+    def total(self, now: float) -> int:
+        self._advance(int(now // self.bucket_s))
+        return self._sum
+
+    def series(self, now: float) -> List[int]:
+        """Bucket counts, oldest first, for the window ending at `now`."""
+        self._advance(int(now // self.bucket_s))
+        n = self._n
+        start = self._head + 1
+        counts = self._counts if self._counts is not None else self._dense()
+        return [counts[(start + i) % n] for i in range(n)]
+
+    def _dense(self) -> array:
+        counts = array("I", bytes(4 * self._n))
+        pairs = self._pairs or ()
+        for i in range(0, len(pairs), 2):
+            counts[pairs[i] % self._n] += pairs[i + 1]
+        return counts
+
+    def _advance(self, b: int) -> None:
+        head = self._head
+        if b <= head:
+            return
+        self._head = b
+        if self._sum == 0:
+            self._pairs = None  # nothing to clear (the common case for quiet IPs)
+            return
+        counts = self._counts
+        n = self._n
+        if counts is None:
+            # Sparse: drop the buckets that left the window.
+            oldest = b - n
+            pairs = self._pairs or []
+            if pairs[0] > oldest and all(pairs[i] > oldest for i in range(2, len(pairs), 2)):
+                return
+            kept: List[int] = []
+            for i in range(0, len(pairs), 2):
+                if pairs[i] > oldest:
+                    kept += (pairs[i], pairs[i + 1])
+                else:
+                    self._sum -= pairs[i + 1]
+            self._pairs = kept or None
+        elif head < 0 or b - head >= n:
+            self._counts = array("I", bytes(4 * n))
+            self._sum = 0
+        else:
+            # Clear the buckets we moved past with slice ops (C speed).
+            lo = (head + 1) % n
+            hi = lo + (b - head)
+            if hi <= n:
+                self._clear(lo, hi)
+            else:
+                self._clear(lo, n)
+                self._clear(0, hi - n)
+
+    def _clear(self, lo: int, hi: int) -> None:
+        counts = self._counts
+        assert counts is not None
+        self._sum -= sum(counts[lo:hi])
+        counts[lo:hi] = array("I", bytes(4 * (hi - lo)))
+
+    def to_compact(self) -> Tuple[Any, ...]:
+        """(bucket_s, head, counts) when dense, (bucket_s, head, buckets, pairs) while sparse."""
+        if self._counts is not None:
+            return (self.bucket_s, self._head, self._counts.tolist())
+        return (self.bucket_s, self._head, self._n, list(self._pairs or ()))
+
+    @classmethod
+    def from_compact(cls, t: Tuple[Any, ...]) -> "SlidingWindowCounter":
+        if len(t) == 4:
+            bucket_s, head, n, pairs = t
+            w = cls(n, bucket_s)
+            w._pairs = list(pairs) or None
+            w._sum = sum(pairs[1::2])
+        else:
+            bucket_s, head, counts = t
+            w = cls(len(counts), bucket_s)
+            w._counts = array("I", counts)
+            w._sum = sum(counts)
+        w._head = head
+        return w
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._counts if self._counts is not None else self._dense())
+
+
+class MultiResolutionSeries:
+    """
+    Per-attacker request time series at three resolutions, bounded memory:
+    - minute buckets for the last hour,
+    - hour buckets for the last week,
+    - day buckets for the last `days` days.
+
+    Each resolution is a `SlidingWindowCounter`, so reads never touch raw
+    timestamps and memory is fixed (60 + 168 + `days` counters).
+    """
+
+    __slots__ = ("minutes", "hours", "days")
+
+    def __init__(self, days: int = 90) -> None:
+        self.minutes = SlidingWindowCounter(60, 60.0)
+        self.hours = SlidingWindowCounter(24 * 7, 3600.0)
+        self.days = SlidingWindowCounter(max(1, days), 86400.0)
+
+    def add(self, ts: float, n: int = 1) -> None:
+        self.minutes.add(ts, n)
+        self.hours.add(ts, n)
+        self.days.add(ts, n)
+
+    def to_compact(self) -> Tuple[Any, ...]:
+        return (self.minutes.to_compact(), self.hours.to_compact(), self.days.to_compact())
+
+    @classmethod
+    def from_compact(cls, t: Tuple[Any, ...]) -> "MultiResolutionSeries":
+        s = cls.__new__(cls)
+        s.minutes = SlidingWindowCounter.from_compact(t[0])
+        s.hours = SlidingWindowCounter.from_compact(t[1])
+        s.days = SlidingWindowCounter.from_compact(t[2])
+        return s
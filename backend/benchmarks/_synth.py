@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import json
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator
+
+
+_ENDPOINTS = ["/health", "/login", "/api/users/1", "/api/upload", "/api/admin/stats", "/.env", "/wp-admin"]
+_AGENTS = ["Mozilla/5.0", "curl/8.4.0", "python-requests/2.31", "sqlmap/1.7", "Nmap Scripting Engine"]
+
+
+def synthetic_events(n: int, ips: int = 2000, seed: int = 1, rate_per_s: float = 50.0) -> Iterator[Dict[str, Any]]:
+    """Quick mixed request stream for benchmarks (log schema, ISO timestamps)."""
+    rnd = random.Random(seed)
+    pool = [f"10.{i // 62500}.{(i // 250) % 250}.{i % 250 + 1}" for i in range(max(1, ips))]
+    t = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    step = timedelta(seconds=1.0 / rate_per_s)
+    for i in range(n):
+        t += step
+        ep = rnd.choice(_ENDPOINTS)
+        if ep == "/api/users/1":
+            ep = f"/api/users/{i % 50}"
+        yield {
+            "timestamp": t.isoformat(),
+            "ip": rnd.choice(pool),
+            "endpoint": ep,
+            "method": "POST" if ep == "/login" else "GET",
+            "status_code": 404 if ep in ("/.env", "/wp-admin") else 200,
+            "auth_success": (rnd.random() < 0.05) if ep == "/login" else None,
+            "response_time_ms": rnd.randrange(5),
+            "payload_size": rnd.randrange(200),
+            "user_agent": rnd.choice(_AGENTS),
+            "request_id": str(uuid.UUID(int=rnd.getrandbits(128))),
+        }
+
+
+def write_synthetic_log(path: str, n: int, **kwargs: Any) -> int:
+    with open(path, "w", encoding="utf-8") as f:
+        for ev in synthetic_events(n, **kwargs):
+            f.write(json.dumps(ev) + "\n")
+    return n
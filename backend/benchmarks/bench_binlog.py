@@ -0,0 +1,84 @@
+"""
+JSONL vs binary (.hpb) request log: size and replay speed.
+
+    python -m benchmarks.bench_binlog --events 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from app.core.binlog import BinaryLogReader, jsonl_to_binary
+from app.services.detection_engine import DetectionEngine, _parse_ts
+from benchmarks._synth import write_synthetic_log
+
+
+def _decode_jsonl(path: str) -> float:
+    # What tail_once pays per line before any rule runs.
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        for line in f:
+            _parse_ts(json.loads(line).get("timestamp")).timestamp()
+    return time.perf_counter() - t0
+
+
+def _decode_binary(path: str) -> float:
+    t0 = time.perf_counter()
+    for _ in BinaryLogReader(path).read_from(0):
+        pass
+    return time.perf_counter() - t0
+
+
+def _replay(path: str) -> float:
+    t0 = time.perf_counter()
+    DetectionEngine().tail_once(path)
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--events", type=int, default=200000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        jsonl = os.path.join(d, "requests.jsonl")
+        binary = os.path.join(d, "requests.hpb")
+        write_synthetic_log(jsonl, args.events)
+
+        t0 = time.perf_counter()
+        jsonl_to_binary(jsonl, binary)
+        convert_s = time.perf_counter() - t0
+
+        jsonl_bytes = os.path.getsize(jsonl)
+        binary_bytes = os.path.getsize(binary)
+        jsonl_decode_s = _decode_jsonl(jsonl)
+        binary_decode_s = _decode_binary(binary)
+        jsonl_s = _replay(jsonl)
+        binary_s = _replay(binary)
+
+    print(
+        json.dumps(
+            {
+                "events": args.events,
+                "jsonlBytes": jsonl_bytes,
+                "binaryBytes": binary_bytes,
+                "sizeRatio": round(jsonl_bytes / max(1, binary_bytes), 2),
+                "convertS": round(convert_s, 3),
+                "jsonlDecodeS": round(jsonl_decode_s, 3),
+                "binaryDecodeS": round(binary_decode_s, 3),
+                "decodeSpeedup": round(jsonl_decode_s / max(1e-9, binary_decode_s), 2),
+                "jsonlReplayS": round(jsonl_s, 3),
+                "binaryReplayS": round(binary_s, 3),
+                "replaySpeedup": round(jsonl_s / max(1e-9, binary_s), 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+GeoIP range index: load time, memory footprint and lookup latency.
+
+Writes a synthetic database of `--v4` IPv4 and `--v6` IPv6 ranges
+(contiguous, like the real exports), loads it with `GeoIPIndex.load`, then
+times lookups:
+
+- uncached: random addresses, straight to the bisect path.
+- cached:   a hot set of `--hot` addresses through the LRU cache.
+- miss:     addresses outside every range.
+
+    python -m benchmarks.bench_geoip --v4 3000000 --v6 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import socket
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from app.services.geoip import GeoIPIndex
+
+_COUNTRIES = ("US", "CN", "RU", "DE", "NL", "BR", "IN", "FR", "GB", "KR", "VN", "SG")
+
+
+def write_db(path: str, v4: int, v6: int, seed: int = 1, asns: int = 80_000) -> int:
+    rnd = random.Random(seed)
+    # A realistic label set: ~80k ASNs, each with one country and name.
+    labels = [f"{rnd.choice(_COUNTRIES)},{a},ISP {a}" for a in range(1, asns + 1)]
+    # Evenly spread ranges over 1.0.0.0-223.255.255.255 and 2000::/4.
+    v4_lo, v4_hi = 1 << 24, 224 << 24
+    v6_lo, v6_hi = 0x2 << 124, 0x3 << 124
+    step4 = (v4_hi - v4_lo) // max(1, v4)
+    step6 = (v6_hi - v6_lo) // max(1, v6)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# start,end,country,asn,isp\n")
+        for i in range(v4):
+            start = v4_lo + i * step4
+            f.write(f"{_ntoa4(start)},{_ntoa4(start + step4 - 2)},{rnd.choice(labels)}\n")
+        for i in range(v6):
+            start = v6_lo + i * step6
+            f.write(f"{_ntoa6(start)},{_ntoa6(start + step6 - 2)},{rnd.choice(labels)}\n")
+    return os.path.getsize(path)
+
+
+def _ntoa4(n: int) -> str:
+    return socket.inet_ntop(socket.AF_INET, n.to_bytes(4, "big"))
+
+
+def _ntoa6(n: int) -> str:
+    return socket.inet_ntop(socket.AF_INET6, n.to_bytes(16, "big"))
+
+
+def _rss_bytes() -> int:
+    # Current (not peak) resident set size; Linux only, 0 elsewhere.
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _per_op_ns(fn: Callable[[str], Any], ips: List[str]) -> float:
+    t0 = time.perf_counter_ns()
+    for ip in ips:
+        fn(ip)
+    return round((time.perf_counter_ns() - t0) / len(ips), 1)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--v4", type=int, default=3_000_000)
+    ap.add_argument("--v6", type=int, default=1_000_000)
+    ap.add_argument("--lookups", type=int, default=200_000)
+    ap.add_argument("--hot", type=int, default=5_000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "geoip.csv")
+        t0 = time.perf_counter()
+        db_bytes = write_db(path, args.v4, args.v6, args.seed)
+        gen_s = time.perf_counter() - t0
+
+        rss0 = _rss_bytes()
+        t0 = time.perf_counter()
+        index = GeoIPIndex.load(path, lookup_cache=max(1, args.hot * 2))
+        load_s = time.perf_counter() - t0
+        rss1 = _rss_bytes()
+
+    v4 = [_ntoa4(rnd.randrange(1 << 24, 224 << 24)) for _ in range(args.lookups // 2)]
+    v6 = [_ntoa6(rnd.randrange(0x2 << 124, 0x3 << 124)) for _ in range(args.lookups // 2)]
+    hot = v4[: args.hot // 2] + v6[: args.hot // 2]
+    hot_stream = [rnd.choice(hot) for _ in range(args.lookups)]
+    misses = [_ntoa4(rnd.randrange(240 << 24, 1 << 32)) for _ in range(args.lookups // 2)]
+    for ip in hot:
+        index.lookup(ip)  # warm the cache
+
+    found = sum(1 for ip in v4 + v6 if index._lookup(ip)[0] != "Unknown")
+    results: Dict[str, Any] = {
+        "ranges": len(index),
+        "dbBytes": db_bytes,
+        "generateSeconds": round(gen_s, 2),
+        "loadSeconds": round(load_s, 2),
+        "indexBytes": index.memory_bytes(),
+        "indexBytesPerRange": round(index.memory_bytes() / max(1, len(index)), 1),
+        # Whole-process RSS growth: arrays, labels and allocator slack.
+        "rssGrowthBytes": rss1 - rss0,
+        "hitRate": round(found / max(1, len(v4) + len(v6)), 4),
+        "lookupNs": {
+            "ipv4Uncached": _per_op_ns(index._lookup, v4),
+            "ipv6Uncached": _per_op_ns(index._lookup, v6),
+            "cachedHot": _per_op_ns(index.lookup, hot_stream),
+            "miss": _per_op_ns(index._lookup, misses),
+        },
+        "labels": index.stats()["labels"],
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
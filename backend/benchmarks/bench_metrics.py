@@ -0,0 +1,142 @@
+"""
+Cost of metrics recording on the hot path.
+
+1. Per-operation cost of the primitives (counter, labelled counter,
+   histogram) next to the `perf_counter` calls needed to time anything.
+2. DetectionEngine throughput with its metrics live vs. swapped for no-ops
+   (alternating runs, best of `--repeat`).
+3. The telemetry middleware driven directly as an ASGI callable (no
+   server), with vs. without its histograms. Needs `starlette`; skipped
+   when it is not installed.
+
+    python -m benchmarks.bench_metrics --events 100000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+import timeit
+from typing import Any, Dict, List
+
+from app.core.metrics import MetricsRegistry
+from benchmarks._synth import synthetic_events
+
+
+class _NullMetric:
+    def labels(self, *values: str) -> "_NullMetric":
+        return self
+
+    def inc(self, n: float = 1) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+def _primitives(n: int) -> Dict[str, float]:
+    reg = MetricsRegistry()
+    c = reg.counter("c", "c")
+    lc = reg.counter("lc", "lc", ("k",))
+    child = lc.labels("x")
+    h = reg.histogram("h", "h")
+    pc = time.perf_counter
+    cases = {
+        "counterInc": lambda: c.inc(),
+        "labelledCounterBoundInc": lambda: child.inc(),
+        "labelledCounterLookupInc": lambda: lc.labels("x").inc(),
+        "histogramObserve": lambda: h.observe(0.00042),
+        "perfCounterPair": lambda: pc() - pc(),
+        "emptyCall": lambda: None,
+    }
+    return {k: round(min(timeit.repeat(fn, number=n, repeat=3)) / n * 1e9, 1) for k, fn in cases.items()}
+
+
+def _engine_eps(events: List[Dict[str, Any]], instrumented: bool) -> float:
+    import app.services.detection_engine as de
+
+    saved = (de._EVENT_SECONDS, de._ATTACK_EVENTS)
+    if not instrumented:
+        de._EVENT_SECONDS = de._ATTACK_EVENTS = _NullMetric()  # type: ignore[assignment]
+    try:
+        engine = de.DetectionEngine()
+        t0 = time.perf_counter()
+        for e in events:
+            engine.process_request_event(e)
+        return len(events) / (time.perf_counter() - t0)
+    finally:
+        de._EVENT_SECONDS, de._ATTACK_EVENTS = saved
+
+
+def _middleware_rps(n: int, instrumented: bool) -> float:
+    import app.core.logging_middleware as lm
+
+    class _Writer:
+        async def write(self, event: Dict[str, Any]) -> None:
+            pass
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    saved = (lm._REQUEST_SECONDS, lm._MIDDLEWARE_SECONDS)
+    if not instrumented:
+        lm._REQUEST_SECONDS = lm._MIDDLEWARE_SECONDS = _NullMetric()  # type: ignore[assignment]
+    mw = lm.StructuredRequestLoggingMiddleware(app, writer=_Writer())  # type: ignore[arg-type]
+
+    async def run() -> float:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            scope = {"type": "http", "method": "GET", "path": "/health", "headers": [], "client": ("10.0.0.1", 1)}
+            await mw(scope, receive, send)
+        return n / (time.perf_counter() - t0)
+
+    try:
+        return asyncio.run(run())
+    finally:
+        lm._REQUEST_SECONDS, lm._MIDDLEWARE_SECONDS = saved
+
+
+def _compare(fn, repeat: int) -> Dict[str, Any]:
+    on: List[float] = []
+    off: List[float] = []
+    for _ in range(repeat):
+        off.append(fn(False))
+        on.append(fn(True))
+    best_on, best_off = max(on), max(off)
+    return {
+        "withMetricsPerS": round(best_on),
+        "withoutMetricsPerS": round(best_off),
+        "overheadPct": round((best_off - best_on) / best_off * 100, 2),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--events", type=int, default=100000)
+    ap.add_argument("--requests", type=int, default=50000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    results: Dict[str, Any] = {"primitivesNs": _primitives(200000)}
+    events = list(synthetic_events(args.events))
+    results["engine"] = _compare(lambda on: _engine_eps(events, on), args.repeat)
+    try:
+        import starlette  # noqa: F401
+    except ImportError:
+        results["middleware"] = "skipped (starlette not installed)"
+    else:
+        results["middleware"] = _compare(lambda on: _middleware_rps(args.requests, on), args.repeat)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Telemetry middleware: legacy BaseHTTPMiddleware (buffers the body) vs pure ASGI.
+
+Each variant runs in its own subprocess so peak RSS is measured separately.
+Needs `httpx` (in-process ASGI client) on top of the app requirements.
+
+    python -m benchmarks.bench_middleware --body-mb 32 --requests 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict
+
+VARIANTS = ("legacy", "asgi")
+
+
+def _build_app(variant: str, log_path: str):
+    from fastapi import FastAPI, Request
+    from starlette.middleware.base import BaseHTTPMiddleware
+
+    from app.core.log_writer import LogWriter
+    from app.core.logging_middleware import StructuredRequestLoggingMiddleware
+
+    writer = LogWriter(log_path)
+    app = FastAPI()
+
+    @app.post("/sink")
+    async def sink(request: Request) -> Dict[str, Any]:
+        # Stream the body through without keeping it (like a well-behaved handler).
+        n = 0
+        async for chunk in request.stream():
+            n += len(chunk)
+        return {"bytes": n}
+
+    if variant == "asgi":
+        app.add_middleware(StructuredRequestLoggingMiddleware, writer=writer)
+    else:
+        # The pre-ASGI implementation: read the whole body to measure it.
+        async def legacy(request: Request, call_next):
+            start = time.perf_counter()
+            body = await request.body()
+            response = await call_next(request)
+            await writer.write(
+                {
+                    "timestamp": None,
+                    "ip": request.client.host if request.client else "unknown",
+                    "endpoint": request.url.path,
+                    "method": request.method,
+                    "status_code": response.status_code,
+                    "auth_success": None,
+                    "response_time_ms": int((time.perf_counter() - start) * 1000),
+                    "payload_size": len(body),
+                    "user_agent": request.headers.get("user-agent", ""),
+                    "request_id": str(uuid.uuid4()),
+                }
+            )
+            return response
+
+        app.add_middleware(BaseHTTPMiddleware, dispatch=legacy)
+    return app, writer
+
+
+async def _run_variant(variant: str, body_mb: int, requests: int) -> Dict[str, Any]:
+    import httpx
+
+    chunk = b"A" * (64 * 1024)
+    chunks = max(1, body_mb * 1024 * 1024 // len(chunk))
+
+    async def body():
+        for _ in range(chunks):
+            yield chunk
+
+    with tempfile.TemporaryDirectory() as d:
+        app, writer = _build_app(variant, os.path.join(d, "requests.jsonl"))
+        await writer.start()
+        latencies = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(requests):
+                t0 = time.perf_counter()
+                r = await client.post("/sink", content=body())
+                latencies.append((time.perf_counter() - t0) * 1000)
+                r.raise_for_status()
+        await writer.stop()
+
+    latencies.sort()
+    return {
+        "variant": variant,
+        "bodyMb": body_mb,
+        "requests": requests,
+        "p50Ms": round(statistics.median(latencies), 2),
+        "p95Ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        # ru_maxrss is KiB on Linux, bytes on macOS.
+        "peakRssMb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1
+        ),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--body-mb", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=20)
+    ap.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.variant:
+        print(json.dumps(asyncio.run(_run_variant(args.variant, args.body_mb, args.requests))))
+        return
+
+    results = []
+    for variant in VARIANTS:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_middleware", "--variant", variant,
+             "--body-mb", str(args.body_mb), "--requests", str(args.requests)],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Cold replay vs snapshot restore.
+
+    python -m benchmarks.bench_snapshot --events 500000 --tail 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from app.services.detection_engine import DetectionEngine
+from app.services.snapshots import restore_engine, save_snapshot
+from benchmarks._synth import synthetic_events, write_synthetic_log
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--events", type=int, default=200000)
+    ap.add_argument("--tail", type=int, default=2000, help="events appended after the snapshot")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        log_path = os.path.join(d, "requests.jsonl")
+        snap_path = os.path.join(d, "engine.snapshot")
+        write_synthetic_log(log_path, args.events)
+
+        t0 = time.perf_counter()
+        cold = DetectionEngine()
+        cold.tail_once(log_path)
+        cold_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        snap_bytes = save_snapshot(cold, snap_path)
+        save_s = time.perf_counter() - t0
+
+        # Simulate traffic that arrived after the last snapshot.
+        with open(log_path, "a", encoding="utf-8") as f:
+            for ev in synthetic_events(args.tail, seed=2):
+                f.write(json.dumps(ev) + "\n")
+
+        warm = DetectionEngine()
+        info = restore_engine(warm, snap_path, log_path)
+
+        result = {
+            "events": args.events,
+            "tailEvents": args.tail,
+            "logBytes": os.path.getsize(log_path),
+            "snapshotBytes": snap_bytes,
+            "coldReplayS": round(cold_s, 3),
+            "snapshotSaveS": round(save_s, 3),
+            "snapshotRestoreS": round(info["elapsedMs"] / 1000, 3),
+            "replayedTail": info["replayedEvents"],
+            "speedup": round(cold_s / max(1e-9, info["elapsedMs"] / 1000), 1),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
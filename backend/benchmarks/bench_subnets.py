@@ -0,0 +1,112 @@
+"""
+Subnet trie under an address spray: memory and per-event cost.
+
+Feeds `--ips` distinct random IPv4 addresses (one failed login each, like
+a credential spray from a botnet or rotating proxies) to:
+
+- the `SubnetTrie` on its own (capped at `--max-nodes`), and
+- the per-IP attacker table of a `DetectionEngine` (capped at
+  `--max-attackers`, no spill), fed the first `--engine-ips` addresses.
+
+and reports the resident-set growth per tracked entry and per event, then
+checks that a /24 hit by many addresses is still flagged by the subnet rule.
+
+    python -m benchmarks.bench_subnets --ips 2000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict
+
+from app.services.detection_engine import DetectionEngine
+from app.services.subnets import SubnetTrie
+from benchmarks.bench_geoip import _ntoa4, _rss_bytes
+
+
+def _event(ip: str, i: int) -> Dict[str, Any]:
+    return {
+        "request_id": f"r{i}",
+        "ip": ip,
+        "endpoint": "/login",
+        "method": "POST",
+        "status_code": 401,
+        "auth_success": False,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--ips", type=int, default=2_000_000)
+    ap.add_argument("--max-nodes", type=int, default=200_000)
+    ap.add_argument("--engine-ips", type=int, default=100_000)
+    ap.add_argument("--max-attackers", type=int, default=100_000)
+    ap.add_argument("--rate", type=float, default=5000.0, help="spray events per second (event time)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    ips = [_ntoa4(rnd.randrange(1 << 24, 224 << 24)) for _ in range(args.ips)]
+    t_base = 1_700_000_000.0
+    step = 1.0 / args.rate
+
+    rss0 = _rss_bytes()
+    trie = SubnetTrie(max_nodes=args.max_nodes)
+    t0 = time.perf_counter()
+    for i, ip in enumerate(ips):
+        trie.observe(ip, t_base + i * step)
+    trie_s = time.perf_counter() - t0
+    trie_rss = _rss_bytes() - rss0
+    trie_stats = trie.stats()
+    del trie
+
+    rss0 = _rss_bytes()
+    engine = DetectionEngine(max_attackers=args.max_attackers, attacker_idle_ttl_s=None, dedupe_window=1)
+    engine.clock = lambda: engine.last_event_s
+    n = min(args.engine_ips, len(ips))
+    t0 = time.perf_counter()
+    for i in range(n):
+        ts = t_base + i * step
+        engine.process_request_event(_event(ips[i], i), ts_s=ts)
+    engine_s = time.perf_counter() - t0
+    engine_rss = _rss_bytes() - rss0
+
+    # A /24 spraying slowly (under every per-IP threshold) is still caught.
+    ts = t_base + len(ips) * step
+    for i in range(200):
+        ts += 0.25
+        engine.process_request_event(_event(f"198.51.100.{i + 1}", 10_000_000 + i), ts_s=ts)
+    flagged = sum(a["attackType"] == "Distributed Brute Force" for a in engine.get_recent_attacks(500))
+
+    print(
+        json.dumps(
+            {
+                "sprayIps": len(ips),
+                "trie": {
+                    "nodes": trie_stats["nodes"],
+                    "pruned": trie_stats["pruned"],
+                    "prunes": trie_stats["prunes"],
+                    "rssGrowthBytes": trie_rss,
+                    "bytesPerNode": round(trie_rss / max(1, trie_stats["nodes"])),
+                    "usPerEvent": round(trie_s / len(ips) * 1e6, 2),
+                },
+                "attackerTable": {
+                    "ips": n,
+                    "attackers": engine.attacker_count,
+                    "rssGrowthBytes": engine_rss,
+                    "bytesPerAttacker": round(engine_rss / max(1, engine.attacker_count)),
+                    "usPerEvent": round(engine_s / max(1, n) * 1e6, 2),
+                },
+                "distributedBruteForceFlagged": flagged,
+                "subnet": engine.get_subnet_profile("198.51.100.0/24"),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Throughput benchmark suite (JSON results for regression tracking).
+
+- engine:  DetectionEngine.process_request_event, events/s on a generated mix.
+- replay:  cold `tail_once` over a log of `--replay-mb` (generated, or an
+           existing `--keep-log`), MB/s and events/s. Use GB-sized logs for
+           the numbers that matter in production.
+- e2e:     requests/s through the real FastAPI app (middleware, log writer,
+           ingestion) via an in-process ASGI client. Needs `fastapi` and
+           `httpx`; skipped otherwise.
+
+    python -m benchmarks.harness --out results.json
+    python -m benchmarks.harness --only replay --replay-mb 4096 --keep-log /data/bench.jsonl
+    python -m benchmarks.harness --compare baseline.json --tolerance 0.1
+
+With `--compare`, every throughput metric that dropped by more than
+`--tolerance` is listed under "regressions" and the exit code is 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.traffic import TrafficMix, generate, to_http, write_log
+
+SCHEMA_VERSION = 1
+SUITES = ("engine", "replay", "e2e")
+
+
+def _best(fn: Callable[[], Dict[str, Any]], repeat: int, key: str) -> Dict[str, Any]:
+    runs = [fn() for _ in range(max(1, repeat))]
+    best = max(runs, key=lambda r: r[key])
+    best["runs"] = [r[key] for r in runs]
+    return best
+
+
+# -------------------------
+# Suites
+# -------------------------
+
+
+def bench_engine(mix: TrafficMix, events: int, repeat: int) -> Dict[str, Any]:
+    from app.services.detection_engine import DetectionEngine
+
+    batch = list(generate(mix, events))
+
+    def run() -> Dict[str, Any]:
+        engine = DetectionEngine()
+        t0 = time.perf_counter()
+        for e in batch:
+            engine.process_request_event(e)
+        elapsed = time.perf_counter() - t0
+        return {"events": len(batch), "seconds": round(elapsed, 3), "eventsPerS": round(len(batch) / elapsed)}
+
+    return _best(run, repeat, "eventsPerS")
+
+
+def bench_replay(mix: TrafficMix, size_mb: float, log: Optional[str], fmt: str) -> Dict[str, Any]:
+    from app.services.detection_engine import DetectionEngine
+
+    tmp = None
+    if log is None or not os.path.exists(log):
+        path = log
+        if path is None:
+            tmp = tempfile.TemporaryDirectory()
+            path = os.path.join(tmp.name, "requests" + (".hpb" if fmt == "binary" else ".jsonl"))
+        t0 = time.perf_counter()
+        write_log(path, mix, size_bytes=int(size_mb * 1024 * 1024))
+        gen_s = time.perf_counter() - t0
+    else:
+        path, gen_s = log, 0.0
+    try:
+        size = os.path.getsize(path)
+        engine = DetectionEngine()
+        t0 = time.perf_counter()
+        n = engine.tail_once(path)
+        elapsed = time.perf_counter() - t0
+        return {
+            "log": path if tmp is None else None,
+            "format": "binary" if path.endswith(".hpb") else "jsonl",
+            "bytes": size,
+            "events": n,
+            "generateSeconds": round(gen_s, 3),
+            "seconds": round(elapsed, 3),
+            "mbPerS": round(size / 1024 / 1024 / elapsed, 2),
+            "eventsPerS": round(n / elapsed),
+        }
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+
+def bench_e2e(mix: TrafficMix, requests: int, concurrency: int) -> Dict[str, Any]:
+    try:
+        import httpx  # noqa: F401
+        import fastapi  # noqa: F401
+    except ImportError as exc:
+        return {"skipped": f"missing dependency: {exc.name}"}
+
+    # The app reads its data directory at import time.
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["HONEYPOT_DATA_DIR"] = d
+        return asyncio.run(_e2e(mix, requests, concurrency))
+
+
+async def _e2e(mix: TrafficMix, requests: int, concurrency: int) -> Dict[str, Any]:
+    import httpx
+
+    from app.main import ENGINE, LOG_WRITER, app
+
+    calls = [to_http(e) for e in generate(mix, requests)]
+    latencies: List[float] = []
+    errors = 0
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            queue: asyncio.Queue = asyncio.Queue()
+            for c in calls:
+                queue.put_nowait(c)
+
+            async def worker() -> None:
+                nonlocal errors
+                while not queue.empty():
+                    kwargs = queue.get_nowait()
+                    t0 = time.perf_counter()
+                    try:
+                        await client.request(**kwargs)
+                    except Exception:
+                        errors += 1
+                    latencies.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+            elapsed = time.perf_counter() - t0
+            # Ingestion is part of the pipeline being measured.
+            await LOG_WRITER.drain()
+            drained = time.perf_counter() - t0
+
+    latencies.sort()
+    pct = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)  # noqa: E731
+    return {
+        "requests": len(calls),
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requestsPerS": round(len(calls) / elapsed),
+        "withDrainRequestsPerS": round(len(calls) / drained),
+        "p50Ms": pct(0.50),
+        "p99Ms": pct(0.99),
+        "ingestedOffset": ENGINE.log_offset,
+    }
+
+
+# -------------------------
+# Results
+# -------------------------
+
+# Throughput keys compared against a baseline (higher is better).
+_THROUGHPUT = {"engine": "eventsPerS", "replay": "eventsPerS", "e2e": "requestsPerS"}
+
+
+def _environment() -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        rev = ""
+    return {
+        "git": rev or None,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    regressions = []
+    for suite, key in _THROUGHPUT.items():
+        new = results.get("suites", {}).get(suite, {}).get(key)
+        old = baseline.get("suites", {}).get(suite, {}).get(key)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        if change < -tolerance:
+            regressions.append({"suite": suite, "metric": key, "baseline": old, "current": new, "change": round(change, 4)})
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", choices=SUITES, action="append", help="run only these suites (repeatable)")
+    ap.add_argument("--events", type=int, default=200000, help="engine suite: events per run")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--replay-mb", type=float, default=256.0)
+    ap.add_argument("--replay-format", choices=("jsonl", "binary"), default="jsonl")
+    ap.add_argument("--keep-log", help="replay suite: reuse (or create and keep) this log")
+    ap.add_argument("--requests", type=int, default=5000, help="e2e suite: total requests")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write JSON results here (stdout otherwise)")
+    ap.add_argument("--compare", help="baseline results JSON")
+    ap.add_argument("--tolerance", type=float, default=0.1, help="allowed relative throughput drop")
+    args = ap.parse_args()
+
+    mix = TrafficMix(seed=args.seed)
+    suites = args.only or list(SUITES)
+    results: Dict[str, Any] = {
+        "schema": SCHEMA_VERSION,
+        "startedAt": datetime.now(timezone.utc).isoformat(),
+        "environment": _environment(),
+        "suites": {},
+    }
+    if "engine" in suites:
+        results["suites"]["engine"] = bench_engine(mix, args.events, args.repeat)
+    if "replay" in suites:
+        results["suites"]["replay"] = bench_replay(mix, args.replay_mb, args.keep_log, args.replay_format)
+    if "e2e" in suites:
+        results["suites"]["e2e"] = bench_e2e(mix, args.requests, args.concurrency)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+
+    out = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    print(out)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
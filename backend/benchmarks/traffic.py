@@ -0,0 +1,236 @@
+"""
+Synthetic honeypot traffic: a time-ordered mix of attacker profiles.
+
+Actors (each with its own IP and Poisson arrival rate):
+- scanner:      recon / traversal probes, mostly 404s, scanner user agents.
+- bruteforcer:  failed POST /login in a tight loop.
+- enumerator:   sequential GET /api/users/<n> (IDOR walk).
+- benign:       browsing, the odd successful login or upload.
+
+Events use the request-log schema, so they can be fed to the engine,
+written as a log, or turned into HTTP requests (`to_http`).
+
+    python -m benchmarks.traffic --events 1000000 --out /tmp/requests.jsonl
+    python -m benchmarks.traffic --size-mb 2048 --out /tmp/big.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import ipaddress
+import json
+import os
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.binlog import BINARY_SUFFIX, SEGMENTS_SUFFIX, BinaryLogEncoder
+
+_RECON_PATHS = (
+    "/.env", "/wp-admin", "/wp-admin/admin-ajax.php", "/../../etc/passwd", "/.git/config",
+    "/phpmyadmin/", "/admin", "/api/admin/stats", "/static/../../../windows/win.ini", "/server-status",
+)
+# Usernames tried by bruteforcers (shared across IPs, as in real stuffing lists).
+_TARGET_USERS = ("admin", "root", "alice", "test", "user", "administrator")
+_BENIGN_PATHS = ("/health", "/api/users/1", "/api/users/2", "/api/users/3", "/api/analytics")
+_UA = {
+    "scanner": ("sqlmap/1.7.2#stable", "Nmap Scripting Engine", "Nikto/2.5.0", "masscan/1.3"),
+    "bruteforcer": ("python-requests/2.31.0", "Hydra", "Go-http-client/1.1"),
+    "enumerator": ("curl/8.4.0", "python-httpx/0.27.0"),
+    "benign": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 Version/17.4 Safari/605.1.15",
+    ),
+}
+# Requests per second per IP (mean of the exponential inter-arrival time).
+DEFAULT_RATES = {"scanner": 4.0, "bruteforcer": 2.0, "enumerator": 1.0, "benign": 0.05}
+ACTOR_KINDS = tuple(DEFAULT_RATES)
+
+
+@dataclass
+class _Actor:
+    kind: str
+    ip: str
+    rate: float
+    user_agent: str
+    cursor: int = 0  # enumerator position / scanner path index
+
+
+@dataclass
+class TrafficMix:
+    """How many IPs of each kind, their rates, and the simulated start time."""
+
+    scanners: int = 200
+    bruteforcers: int = 50
+    enumerators: int = 50
+    benign: int = 2000
+    rate_scale: float = 1.0
+    seed: int = 1
+    start_s: float = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "scanner": self.scanners,
+            "bruteforcer": self.bruteforcers,
+            "enumerator": self.enumerators,
+            "benign": self.benign,
+        }
+
+
+def _ip(kind: str, i: int) -> str:
+    # Disjoint ranges per kind keep profiles easy to tell apart in dashboards.
+    # One address per actor index (i < 2**24) inside the kind's /8.
+    first = {"scanner": 45, "bruteforcer": 185, "enumerator": 103, "benign": 192}[kind]
+    return str(ipaddress.IPv4Address((first << 24) + i))
+
+
+def generate(mix: TrafficMix, n: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Yield `n` events (forever if None) in timestamp order."""
+    rnd = random.Random(mix.seed)
+    actors: List[_Actor] = []
+    for kind, count in mix.counts().items():
+        for i in range(count):
+            actors.append(
+                _Actor(
+                    kind=kind,
+                    ip=_ip(kind, len(actors) + 1),
+                    rate=DEFAULT_RATES[kind] * mix.rate_scale,
+                    user_agent=rnd.choice(_UA[kind]),
+                    cursor=rnd.randrange(1, 10_000),
+                )
+            )
+    if not actors:
+        return
+    heap: List[Tuple[float, int]] = [(mix.start_s + rnd.expovariate(a.rate), i) for i, a in enumerate(actors)]
+    heapq.heapify(heap)
+
+    emitted = 0
+    while n is None or emitted < n:
+        ts, i = heapq.heappop(heap)
+        actor = actors[i]
+        yield _event(rnd, actor, ts)
+        emitted += 1
+        heapq.heappush(heap, (ts + rnd.expovariate(actor.rate), i))
+
+
+def _event(rnd: random.Random, a: _Actor, ts: float) -> Dict[str, Any]:
+    method, status, auth, payload = "GET", 200, None, 0
+    username: Optional[str] = None
+    if a.kind == "scanner":
+        endpoint = _RECON_PATHS[a.cursor % len(_RECON_PATHS)]
+        a.cursor += 1
+        status = 200 if endpoint == "/api/admin/stats" else 404
+    elif a.kind == "bruteforcer":
+        endpoint, method, auth, payload = "/login", "POST", False, rnd.randint(40, 80)
+        username = rnd.choice(_TARGET_USERS)
+    elif a.kind == "enumerator":
+        endpoint = f"/api/users/{a.cursor}"
+        a.cursor += 1
+    else:
+        roll = rnd.random()
+        if roll < 0.05:
+            endpoint, method, auth, payload = "/login", "POST", True, rnd.randint(40, 80)
+            username = "alice"
+        elif roll < 0.07:
+            endpoint, method, payload = "/api/upload", "POST", rnd.randint(1_000, 200_000)
+        else:
+            endpoint = rnd.choice(_BENIGN_PATHS)
+    event = {
+        "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+        "ip": a.ip,
+        "endpoint": endpoint,
+        "method": method,
+        "status_code": status,
+        "auth_success": auth,
+        "response_time_ms": rnd.randint(0, 12),
+        "payload_size": payload,
+        "user_agent": a.user_agent,
+        "request_id": str(uuid.UUID(int=rnd.getrandbits(128), version=4)),
+    }
+    if username is not None:
+        event["username"] = username
+    return event
+
+
+def to_http(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Keyword arguments for an httpx request that reproduces `event`."""
+    kwargs: Dict[str, Any] = {
+        "method": event["method"],
+        "url": event["endpoint"],
+        "headers": {"x-forwarded-for": event["ip"], "user-agent": event["user_agent"]},
+    }
+    if event["endpoint"] == "/login":
+        ok = bool(event.get("auth_success"))
+        kwargs["data"] = {"username": event.get("username", "alice"), "password": "password123" if ok else "hunter2"}
+    elif event["endpoint"] == "/api/upload":
+        kwargs["files"] = {"file": ("note.txt", b"x" * min(int(event.get("payload_size") or 0), 4096))}
+    return kwargs
+
+
+def write_log(
+    path: str,
+    mix: TrafficMix,
+    events: Optional[int] = None,
+    size_bytes: Optional[int] = None,
+    batch: int = 4096,
+) -> Tuple[int, int]:
+    """
+    Write a request log (JSONL, or binary for `.hpb` paths) until `events`
+    or `size_bytes` is reached. Returns (events, bytes).
+    """
+    if events is None and size_bytes is None:
+        raise ValueError("need events or size_bytes")
+    encoder = BinaryLogEncoder() if path.endswith(BINARY_SUFFIX) else None
+    n = 0
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path + SEGMENTS_SUFFIX):
+        os.remove(path + SEGMENTS_SUFFIX)
+    with open(path, "wb") as f:
+        pending: List[Dict[str, Any]] = []
+        for ev in generate(mix, events):
+            pending.append(ev)
+            if len(pending) < batch:
+                continue
+            f.write(_encode(encoder, pending, f.tell()))
+            n += len(pending)
+            pending = []
+            if size_bytes is not None and f.tell() >= size_bytes:
+                break
+        if pending:
+            f.write(_encode(encoder, pending, f.tell()))
+            n += len(pending)
+        size = f.tell()
+    if encoder is not None:
+        encoder.written(path)
+    return n, size
+
+
+def _encode(encoder: Optional[BinaryLogEncoder], events: List[Dict[str, Any]], offset: int) -> bytes:
+    if encoder is not None:
+        return encoder.encode(events, offset)
+    return "".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in events).encode("utf-8")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", required=True, help="log path (.jsonl or .hpb)")
+    ap.add_argument("--events", type=int)
+    ap.add_argument("--size-mb", type=float)
+    ap.add_argument("--scanners", type=int, default=200)
+    ap.add_argument("--bruteforcers", type=int, default=50)
+    ap.add_argument("--enumerators", type=int, default=50)
+    ap.add_argument("--benign", type=int, default=2000)
+    ap.add_argument("--rate-scale", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    mix = TrafficMix(args.scanners, args.bruteforcers, args.enumerators, args.benign, args.rate_scale, args.seed)
+    size = int(args.size_mb * 1024 * 1024) if args.size_mb else None
+    n, written = write_log(args.out, mix, events=args.events, size_bytes=size)
+    print(json.dumps({"events": n, "bytes": written, "path": args.out}))
+
+
+if __name__ == "__main__":
+    main()
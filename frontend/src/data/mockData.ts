@@ -31,6 +31,8 @@ export interface AttackerProfile {
   lastSeen: Date;
   totalRequests: number;
   requestsPerMinute: number[];
+  requestsPerHour?: number[];
+  requestsPerDay?: number[];
   attackTimeline: Attack[];
   targetedEndpoints: { endpoint: string; count: number }[];
   country?: string;
@@ -11,6 +11,9 @@ type AnalyticsDTO = {
   attackTypeDistribution: { name: string; value: number }[];
   topEndpoints: { endpoint: string; attacks: number }[];
   hourlyAttackVolume: { hour: string; attacks: number }[];
+  totalAttacks?: number;
+  allTimeAttacks?: number;
+  windowHours?: number;
 };
 
 const API_BASE =
@@ -36,6 +39,28 @@ export async function getAttacks(limit = 50): Promise<Attack[]> {
   return (data.attacks || []).map((a) => ({ ...a, timestamp: toDate(a.timestamp) }));
 }
 
+/**
+ * Subscribe to newly emitted attacks (server-sent events).
+ * EventSource reconnects on its own and resumes from the last event id.
+ * Returns an unsubscribe function.
+ */
+export function subscribeAttacks(
+  onAttack: (attack: Attack) => void,
+  onDropped?: (count: number) => void,
+  onError?: () => void,
+): () => void {
+  const source = new EventSource(`${API_BASE}/api/attacks/stream`);
+  source.addEventListener('attack', (ev) => {
+    const a = JSON.parse((ev as MessageEvent).data) as AttackDTO;
+    onAttack({ ...a, timestamp: toDate(a.timestamp) });
+  });
+  source.addEventListener('dropped', (ev) => {
+    onDropped?.(JSON.parse((ev as MessageEvent).data).dropped ?? 0);
+  });
+  if (onError) source.onerror = onError;
+  return () => source.close();
+}
+
 export async function getAttackerProfile(ip: string): Promise<AttackerProfile> {
   const data = await fetchJson<AttackerProfileDTO>(`/api/attacker/${encodeURIComponent(ip)}`);
   return {
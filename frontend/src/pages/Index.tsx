@@ -4,7 +4,22 @@ import { StatCard } from '@/components/dashboard/StatCard';
 import { AttackTable } from '@/components/dashboard/AttackTable';
 import { LiveIndicator } from '@/components/dashboard/LiveIndicator';
 import { getAttackStats, type Attack } from '@/data/mockData';
-import { getAttacks } from '@/lib/api';
+import { getAttacks, subscribeAttacks } from '@/lib/api';
+
+const FEED_SIZE = 50;
+
+// Newest first, one entry per attack id, at most FEED_SIZE.
+function mergeFeed(newer: Attack[], older: Attack[]): Attack[] {
+  const seen = new Set<string>();
+  const out: Attack[] = [];
+  for (const a of [...newer, ...older]) {
+    if (seen.has(a.id)) continue;
+    seen.add(a.id);
+    out.push(a);
+    if (out.length >= FEED_SIZE) break;
+  }
+  return out;
+}
 
 const Index = () => {
   const [attacks, setAttacks] = useState<Attack[]>([]);
@@ -18,29 +33,64 @@ const Index = () => {
   useEffect(() => {
     let cancelled = false;
 
+    // Live updates are pushed; polling is only the fallback when the
+    // browser has no EventSource.
+    if (typeof EventSource === 'undefined') {
+      const load = async () => {
+        try {
+          const latest = await getAttacks(FEED_SIZE);
+          if (cancelled) return;
+          setAttacks(latest);
+        } catch {
+          // If backend is down, keep UI stable (no hard crash).
+        }
+      };
+      void load();
+      const interval = setInterval(() => {
+        void load();
+      }, 5000);
+      return () => {
+        cancelled = true;
+        clearInterval(interval);
+      };
+    }
+
+    // Subscribe before the first fetch so nothing emitted in between is
+    // lost; pushed attacks are held (oldest first) until the fetch is in.
+    let pending: Attack[] | null = [];
+    const unsubscribe = subscribeAttacks((attack) => {
+      if (cancelled) return;
+      if (pending) {
+        pending.push(attack);
+        return;
+      }
+      setAttacks((prev) => mergeFeed([attack], prev));
+    });
+
     const load = async () => {
+      let latest: Attack[] = [];
       try {
-        const latest = await getAttacks(50);
-        if (cancelled) return;
-        setAttacks(latest);
-        setStats(getAttackStats(latest));
+        latest = await getAttacks(FEED_SIZE);
       } catch {
         // If backend is down, keep UI stable (no hard crash).
       }
+      if (cancelled) return;
+      const live = (pending ?? []).reverse();
+      pending = null;
+      setAttacks((prev) => mergeFeed(live, mergeFeed(latest, prev)));
     };
-
     void load();
 
-    const interval = setInterval(() => {
-      void load();
-    }, 5000);
-
     return () => {
       cancelled = true;
-      clearInterval(interval);
+      unsubscribe();
     };
   }, []);
 
+  useEffect(() => {
+    setStats(getAttackStats(attacks));
+  }, [attacks]);
+
   return (
     <DashboardLayout>
       {/* Header */}